@@ -0,0 +1,63 @@
+"""Daemon-wide cache for state which is expensive to rebuild, such as
+parsed specs, the Docker environment and the VM's IP. The daemon lives
+for days, so rather than rebuilding this state for every command we keep
+it in memory along with a cheap fingerprint of whatever it was built from
+(file sizes and mtimes, the VM's current boot). An entry is rebuilt as
+soon as its fingerprint changes."""
+
+import os
+import glob
+import threading
+from copy import deepcopy
+from functools import wraps
+
+_entries = {}
+_lock = threading.Lock()
+
+def cached(fingerprint, copy=False):
+    """Decorator for functions of no arguments. The result is reused for
+    as long as `fingerprint()` returns the same value. A fingerprint of
+    None means the inputs cannot be checked, so nothing is cached. Pass
+    `copy=True` if callers may mutate the result, to hand each caller
+    its own copy."""
+    def decorator(fn):
+        key = '{}.{}'.format(fn.__module__, fn.__name__)
+        @wraps(fn)
+        def wrapper():
+            current_fingerprint = fingerprint()
+            if current_fingerprint is None:
+                return fn()
+            with _lock:
+                entry = _entries.get(key)
+            if entry is None or entry[0] != current_fingerprint:
+                entry = (current_fingerprint, fn())
+                with _lock:
+                    _entries[key] = entry
+            return deepcopy(entry[1]) if copy else entry[1]
+        wrapper.invalidate = lambda: invalidate(key)
+        return wrapper
+    return decorator
+
+def invalidate(key):
+    with _lock:
+        _entries.pop(key, None)
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+def path_fingerprint(path):
+    """Changes whenever the file at `path` is replaced, written to or
+    removed. Returns None if the file does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+def glob_fingerprint(*patterns):
+    """Changes whenever a file matching any of the glob `patterns` is
+    added, removed or modified."""
+    return tuple((path, path_fingerprint(path))
+                 for pattern in patterns
+                 for path in sorted(glob.glob(pattern)))
@@ -4,13 +4,16 @@ Usage:
   dusty [options] [<command>] [<args>...]
 
 Commands:
+  attach     Follow the output of a command running in the daemon
   bundles    Manage which sets of applications to run
   config     Get or set Dusty config variables
   cp         Copy files between local filesystem and containers
   disk       Manage and inspect the boot2docker VM's disk usage
   dump       Print diagnostic information for bug reports
+  jobs       List commands the daemon is running or has recently run
   logs       Tail logs for a Dusty-managed service
   repos      Manage Git repos used for running Dusty applications
+  reset-once Run an app's once command again on its next start
   restart    Restart Dusty-managed containers
   scripts    Execute predefined scripts inside running containers
   setup      Configure Dusty after installation
@@ -29,6 +32,7 @@ For help on a specific command, provide the '-h' flag to the command, e.g. 'dust
 """
 
 import sys
+import time
 import socket
 
 from docopt import docopt
@@ -36,19 +40,23 @@ from docopt import docopt
 from ..daemon import main as run_daemon
 from ..config import get_config_value
 from ..log import configure_client_logging, log_to_client
-from ..payload import Payload
-from . import (bundles, config, cp, dump, disk, logs, repos, restart, script, shell, stop,
-               sync, up, validate, setup, test, status)
+from ..payload import Payload, AttachPayload
+from .. import protocol
+from . import (attach, bundles, config, cp, dump, disk, jobs, logs, repos, reset_once, restart, script, shell,
+               stop, sync, up, validate, setup, test, status)
 from .. import constants
 
 MODULE_MAP = {
+    'attach': attach,
     'bundles': bundles,
     'config': config,
     'cp': cp,
     'disk': disk,
     'dump': dump,
+    'jobs': jobs,
     'logs': logs,
     'repos': repos,
+    'reset-once': reset_once,
     'restart': restart,
     'scripts': script,
     'setup': setup,
@@ -61,23 +69,70 @@ MODULE_MAP = {
     'validate': validate,
 }
 
-def _run_command(sock, command):
-    error_response = False
-    sock.sendall(command)
+def _print_messages(sock, job_ids, deadline=None):
+    """Print the messages the daemon sends for a job until the job
+    finishes, recording its ID in `job_ids`. Returns True if the job
+    failed. If a `deadline` is given, raises socket.timeout once it passes."""
     while True:
-        data = sock.recv(65535)
-        if data:
-            stripped = data.decode('utf-8').replace(constants.SOCKET_TERMINATOR, '').replace(constants.SOCKET_ERROR_TERMINATOR, '')
-            sys.stdout.write(stripped)
-            if data.endswith(constants.SOCKET_TERMINATOR):
-                break
-            elif data.endswith(constants.SOCKET_ERROR_TERMINATOR):
-                error_response = True
-                break
-        else:
-            break
+        if deadline is not None:
+            sock.settimeout(max(deadline - time.time(), 0.01))
+        try:
+            kind, body = protocol.recv_message(sock)
+        except protocol.ConnectionClosed:
+            return True
+        if kind == protocol.JOB:
+            job_ids.append(body)
+        elif kind in (protocol.LOG, protocol.PROGRESS, protocol.WARNING):
+            sys.stdout.write('{}\n'.format(body))
+        elif kind == protocol.ERROR:
+            sys.stdout.write('ERROR: {}\n'.format(body))
+            return True
+        elif kind == protocol.RESULT:
+            return False
+
+def _cancel_job(sock, job_ids):
+    """Ask the daemon to cancel the job we are following, and print what
+    it sends back while the job stops, for at most CLIENT_CANCEL_TIMEOUT."""
+    print "Dusty Client cancelling the command on KeyboardInterrupt..."
+    try:
+        protocol.send_message(sock, protocol.CANCEL)
+        _print_messages(sock, job_ids, deadline=time.time() + constants.CLIENT_CANCEL_TIMEOUT)
+    except (socket.timeout, KeyboardInterrupt):
+        if job_ids:
+            print "-----Dusty Daemon is still stopping job {0}. Use `dusty attach {0}` to follow it-----".format(job_ids[0])
+    except socket.error:
+        pass
+    return True
+
+def _print_job_output(sock):
+    """Print the messages the daemon sends for a job until the job
+    finishes. Returns True if the job failed or was cancelled."""
+    job_ids = []
+    try:
+        return _print_messages(sock, job_ids)
+    except KeyboardInterrupt:
+        return _cancel_job(sock, job_ids)
 
-    return error_response
+def _run_command(sock, command):
+    """Send a serialized command to the daemon, then print its output
+    until it finishes. Returns True if the command failed."""
+    protocol.send_message(sock, protocol.COMMAND, command)
+    return _print_job_output(sock)
+
+def _run_detached_command(sock, command):
+    """Start a serialized command in the background and return without
+    waiting for it. Returns True if the daemon refused the command."""
+    protocol.send_message(sock, protocol.DETACH, command)
+    kind, body = protocol.recv_message(sock)
+    if kind != protocol.JOB:
+        sys.stdout.write('ERROR: {}\n'.format(body))
+        return True
+    sys.stdout.write('Started job {0}. Use `dusty attach {0}` to follow its output\n'.format(body))
+    return False
+
+def _attach_to_job(sock, job_id):
+    protocol.send_message(sock, protocol.ATTACH, job_id)
+    return _print_job_output(sock)
 
 def _connect_to_daemon():
     sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
@@ -85,7 +140,7 @@ def _connect_to_daemon():
     try:
         sock.connect(constants.SOCKET_PATH)
     except:
-        print 'Couldn\'t connect to dusty\'s socket; make sure the daemon is running, and that it\'s not connected to another client'
+        print 'Couldn\'t connect to dusty\'s socket; make sure the daemon is running'
         sys.exit(1)
     sock.settimeout(None)
     return sock
@@ -114,9 +169,12 @@ def main():
     result = MODULE_MAP[command].main(command_args)
     if isinstance(result, Payload):
         sock = _connect_to_daemon()
-        try:
+        if result.run_detached:
+            errored = _run_detached_command(sock, result.serialize())
+        else:
             errored = _run_command(sock, result.serialize())
-        except KeyboardInterrupt:
-            print "Dusty Client stopping on KeyboardInterrupt..."
-            print "-----Dusty Daemon is still processing your last command!-----"
+        sys.exit(1 if errored else 0)
+    elif isinstance(result, AttachPayload):
+        sock = _connect_to_daemon()
+        errored = _attach_to_job(sock, result.job_id)
         sys.exit(1 if errored else 0)
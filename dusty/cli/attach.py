@@ -0,0 +1,17 @@
+"""Follow the output of a command running in the Dusty daemon.
+
+Every command the daemon runs is given a job ID. Use `dusty jobs`
+to find the ID of a running command. Attaching replays everything
+the command has output so far, then follows it until it finishes.
+
+Usage:
+  attach <job_id>
+"""
+
+from docopt import docopt
+
+from ..payload import AttachPayload
+
+def main(argv):
+    args = docopt(__doc__, argv)
+    return AttachPayload(args['<job_id>'])
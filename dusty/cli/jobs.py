@@ -0,0 +1,16 @@
+"""List commands the Dusty daemon is running or has recently run.
+
+Use `dusty attach <job_id>` to follow the output of any of them.
+
+Usage:
+  jobs
+"""
+
+from docopt import docopt
+
+from ..payload import Payload
+from ..commands.jobs import list_jobs
+
+def main(argv):
+    docopt(__doc__, argv)
+    return Payload(list_jobs)
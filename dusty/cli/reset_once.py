@@ -0,0 +1,24 @@
+"""Make an app run its `once` command again.
+
+Dusty records that an app has run its `commands.once` spec key in
+the VM's persistent storage, so the command is not run again when the
+app's container is recreated. It is only run again when the command
+or the app's image changes, or after this command.
+
+Usage:
+  reset-once <app>
+
+Example:
+  To re-run the once command of an app named `website`:
+    dusty reset-once website
+    dusty restart website
+"""
+
+from docopt import docopt
+
+from ..payload import Payload
+from ..commands.run import reset_once
+
+def main(argv):
+    args = docopt(__doc__, argv)
+    return Payload(reset_once, args['<app>'])
@@ -7,10 +7,16 @@ prior to restarting.
 
 Usage:
   restart [--no-sync] [<services>...]
+  restart [--no-sync] --affected-by=<repo-or-lib>
 
 Options:
   --no-sync    If provided, Dusty will not sync repos used by
                services being restarted prior to the restart.
+  --affected-by=<repo-or-lib>
+               Restart only the active apps which use code from
+               the given app, lib or repo, either directly or
+               through their libs or linked apps. Only that repo
+               is synced.
   <services>   If provided, Dusty will only restart the given
                services. Otherwise, all currently running
                services are restarted.
@@ -19,8 +25,10 @@ Options:
 from docopt import docopt
 
 from ..payload import Payload
-from ..commands.run import restart_apps_or_services
+from ..commands.run import restart_apps_or_services, restart_apps_affected_by
 
 def main(argv):
     args = docopt(__doc__, argv)
+    if args['--affected-by']:
+        return Payload(restart_apps_affected_by, args['--affected-by'], sync=not args['--no-sync'])
     return Payload(restart_apps_or_services, args['<services>'], sync=not args['--no-sync'])
@@ -6,14 +6,20 @@ nginx, initializes your boot2docker VM and prepares it for
 use by Dusty, and starts any containers specified by your
 currently activated bundles.
 
+Only containers whose config changed since the last `up`, and
+containers linking to them, are recreated. Everything else is
+left running. Up prints the plan it follows before applying it.
+
 Usage:
-  up [--no-recreate] [--no-pull]
+  up [--no-recreate] [--no-pull] [--detach]
 
 Options:
-  --no-recreate   If a container already exists, do not recreate
-                  it from scratch. This is faster, but containers
-                  may get out of sync over time.
+  --no-recreate   Do not recreate containers whose config changed.
+                  This is faster, but containers may get out of
+                  sync with your specs.
   --no-pull       Do not pull dusty managed repos from remotes.
+  --detach        Start in the background and return immediately.
+                  Use `dusty attach` to follow the output later.
 """
 
 from docopt import docopt
@@ -23,5 +29,7 @@ from ..commands.run import start_local_env
 
 def main(argv):
     args = docopt(__doc__, argv)
-    return Payload(start_local_env, recreate_containers=not args['--no-recreate'],
-                   pull_repos=not args['--no-pull'])
+    payload = Payload(start_local_env, recreate_containers=not args['--no-recreate'],
+                      pull_repos=not args['--no-pull'])
+    payload.run_detached = args['--detach']
+    return payload
@@ -1,7 +1,17 @@
 """Validates specs to ensure that they're consistent with specifications
 
+The results of each validation are saved, so the next validation of the
+same specs only checks the specs which changed and the specs which
+reference them.
+
 Usage:
-  validate [<specs-path>]
+  validate [--changed-since=<git-ref>] [<specs-path>]
+
+Options:
+  --changed-since=<git-ref>
+               Only check the specs which differ from the given git
+               ref, and the specs which reference them. Uncommitted
+               and untracked spec files count as changed.
 """
 
 from docopt import docopt
@@ -12,6 +22,6 @@ from ..commands.validate import validate_specs, validate_specs_from_path
 def main(argv):
     args = docopt(__doc__, argv)
     if args.get('<specs-path>'):
-        return validate_specs_from_path(args['<specs-path>'])
+        return validate_specs_from_path(args['<specs-path>'], changed_since=args['--changed-since'])
     else:
-        return Payload(validate_specs)
+        return Payload(validate_specs, changed_since=args['--changed-since'])
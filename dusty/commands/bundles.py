@@ -3,8 +3,10 @@ from prettytable import PrettyTable
 from ..config import get_config_value, save_config_value
 from ..compiler.spec_assembler import get_specs
 from ..log import log_to_client
+from ..payload import read_only
 from .. import constants
 
+@read_only
 def list_bundles():
     specs, activated_bundles = get_specs(), get_config_value(constants.CONFIG_BUNDLES_KEY)
     table = PrettyTable(["Name", "Description", "Enabled?"])
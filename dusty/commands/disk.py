@@ -3,8 +3,10 @@ import logging
 import docker
 
 from ..log import log_to_client
+from ..payload import read_only, deadline
 from ..systems.docker.cleanup import remove_exited_dusty_containers, remove_images
 from ..systems.virtualbox import get_docker_vm_disk_info
+from .. import constants
 
 def cleanup_inactive_containers():
     log_to_client("Cleaning up exited containers:")
@@ -16,6 +18,8 @@ def cleanup_images():
     images = remove_images()
     log_to_client("Done removing {} images".format(len(images)))
 
+@read_only
+@deadline(constants.VM_COMMAND_TIMEOUT + 10)
 def inspect_vm_disk():
     log_to_client("Boot2Docker VM Disk Usage:")
     log_to_client(get_docker_vm_disk_info())
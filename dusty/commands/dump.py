@@ -2,6 +2,7 @@ import subprocess
 
 from .. import constants
 from ..log import log_to_client
+from ..payload import read_only
 from ..subprocess import check_output_demoted
 from ..warnings import daemon_warnings
 
@@ -24,6 +25,7 @@ DIAGNOSTIC_DUSTY_COMMANDS = [
     ('Daemon Warnings', daemon_warnings.pretty)
 ]
 
+@read_only
 def dump_diagnostics():
     for title, fn in DIAGNOSTIC_DUSTY_COMMANDS:
         log_to_client('COMMAND: {}'.format(title))
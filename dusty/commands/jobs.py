@@ -0,0 +1,22 @@
+import time
+
+from prettytable import PrettyTable
+
+from ..jobs import daemon_jobs
+from ..log import log_to_client
+from ..payload import read_only
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return '{}m{:02d}s'.format(minutes, seconds)
+
+@read_only
+def list_jobs():
+    table = PrettyTable(['ID', 'Command', 'Status', 'Started', 'Duration'])
+    for job in daemon_jobs.all():
+        table.add_row([job.id,
+                       job.description,
+                       job.status,
+                       time.strftime('%H:%M:%S', time.localtime(job.started_at)),
+                       _format_duration(job.duration)])
+    log_to_client(table.get_string())
@@ -5,12 +5,14 @@ from prettytable import PrettyTable
 from ..config import get_config, save_config_value, refresh_config_warnings
 from .. import constants
 from ..log import log_to_client
+from ..payload import read_only
 
 def _eligible_config_keys_for_setting():
      config = get_config()
      return [key for key in sorted(constants.CONFIG_SETTINGS.keys())
              if key not in config or isinstance(config[key], basestring)]
 
+@read_only
 def list_config():
      config = get_config()
      table = PrettyTable(['Key', 'Description', 'Value'])
@@ -20,6 +22,7 @@ def list_config():
                          '\n'.join(textwrap.wrap(str(config.get(key)), 80))])
      log_to_client(table.get_string(sortby='Key'))
 
+@read_only
 def list_config_values():
      log_to_client(get_config())
 
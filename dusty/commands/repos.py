@@ -6,8 +6,10 @@ from ..config import get_config_value, save_config_value
 from ..compiler.spec_assembler import get_specs, get_specs_repo, get_all_repos, get_assembled_specs
 from ..source import Repo
 from ..log import log_to_client
+from ..payload import read_only
 from .. import constants
 
+@read_only
 def list_repos():
     repos, overrides = get_all_repos(), get_config_value(constants.CONFIG_REPO_OVERRIDES_KEY)
     table = PrettyTable(['Full Name', 'Short Name', 'Local Override'])
@@ -1,13 +1,37 @@
-import os
-
-from ..compiler import (compose as compose_compiler, nginx as nginx_compiler,
+from ..compiler import (artifacts, compose as compose_compiler, nginx as nginx_compiler,
                         port_spec as port_spec_compiler, spec_assembler)
-from ..systems import docker, hosts, nginx, virtualbox, rsync
-from ..systems.docker import compose
-from ..log import log_to_client
+from ..compiler.compose import plan as compose_plan
+from ..systems import dns, docker, hosts, nginx, virtualbox, rsync
+from ..systems.docker import compose, lib_installs
+from ..log import log_to_client, log_progress_to_client
+from ..source import Repo
 from .repos import update_managed_repos
 from .. import constants
 
+def _compile_outputs(assembled_spec, docker_ip, lib_installs_images, image_ids):
+    log_progress_to_client("Compiling the port specs")
+    port_spec = port_spec_compiler.get_port_spec_document(assembled_spec, docker_ip)
+    log_progress_to_client("Compiling the nginx config")
+    nginx_config = nginx_compiler.get_nginx_configuration_spec(port_spec)
+    log_progress_to_client("Compiling docker-compose config")
+    compose_config = compose_compiler.get_compose_dict(assembled_spec, port_spec, lib_installs_images, image_ids)
+    return {'port_spec': port_spec, 'nginx_config': nginx_config, 'compose_config': compose_config}
+
+def _compiled_outputs_applied(compiled):
+    """Returns whether the hosts file, nginx config and Composefile on disk
+    are still the ones written from these compiled outputs. The hosts file
+    is not used when the DNS responder is on."""
+    return ((dns.dns_responder_enabled() or hosts.hosts_file_matches_port_spec(compiled['port_spec'])) and
+            nginx.nginx_config_matches(compiled['nginx_config']) and
+            compose.composefile_matches(compiled['compose_config'], constants.COMPOSEFILE_PATH))
+
+def _log_up_plan(plan):
+    lines = compose_plan.describe_up_plan(plan)
+    if not plan['create'] and not plan['recreate'] and not plan['remove']:
+        lines.insert(0, "No containers need to be created, recreated or removed")
+    for line in lines:
+        log_to_client(line)
+
 def start_local_env(recreate_containers=True, pull_repos=True):
     """This command will use the compilers to get compose specs
     will pass those specs to the systems that need them. Those
@@ -17,32 +41,59 @@ def start_local_env(recreate_containers=True, pull_repos=True):
     if not assembled_spec[constants.CONFIG_BUNDLES_KEY]:
         raise RuntimeError('No bundles are activated. Use `dusty bundles` to activate bundles before running `dusty up`.')
 
-    log_to_client("Ensuring virtualbox vm is running")
+    log_progress_to_client("Ensuring virtualbox vm is running")
     virtualbox.initialize_docker_vm()
     docker_ip = virtualbox.get_docker_vm_ip()
 
-    # Stop will fail if we've never written a Composefile before
-    if os.path.exists(constants.COMPOSEFILE_PATH):
-        stop_apps_or_services()
-    log_to_client("Compiling together the assembled specs")
+    log_progress_to_client("Compiling together the assembled specs")
     if pull_repos:
         update_managed_repos()
     active_repos = spec_assembler.get_all_repos(active_only=True, include_specs_repo=False)
-    log_to_client("Compiling the port specs")
-    port_spec = port_spec_compiler.get_port_spec_document(assembled_spec, docker_ip)
-    log_to_client("Compiling the nginx config")
-    nginx_config = nginx_compiler.get_nginx_configuration_spec(port_spec)
-    log_to_client("Compiling docker-compose config")
-    compose_config = compose_compiler.get_compose_dict(assembled_spec, port_spec)
-
-    log_to_client("Saving port forwarding to hosts file")
-    hosts.update_hosts_file_from_port_spec(port_spec)
-    log_to_client("Syncing local repos to the VM")
+    log_progress_to_client("Syncing local repos to the VM")
     rsync.sync_repos(active_repos)
-    log_to_client("Saving nginx config and ensure nginx is running")
-    nginx.update_nginx_from_config(nginx_config)
-    log_to_client("Saving docker-compose config and starting all containers")
-    compose.update_running_containers_from_spec(compose_config, recreate_containers=recreate_containers)
+    log_progress_to_client("Ensuring app images are in the VM")
+    image_ids = docker.get_app_image_ids(assembled_spec)
+    log_progress_to_client("Baking lib installs into app images")
+    lib_installs_images = lib_installs.ensure_lib_installs_images(assembled_spec)
+    fingerprint = artifacts.compilation_fingerprint(assembled_spec, docker_ip, lib_installs_images, image_ids)
+    compiled = artifacts.load_compiled_outputs(fingerprint)
+    unchanged = compiled is not None and _compiled_outputs_applied(compiled)
+    if unchanged:
+        log_progress_to_client("Port specs, nginx config and docker-compose config are unchanged")
+    else:
+        compiled = _compile_outputs(assembled_spec, docker_ip, lib_installs_images, image_ids)
+    previous_compose_config = compose.read_composefile(constants.COMPOSEFILE_PATH)
+    outdated_images = []
+    if recreate_containers and previous_compose_config is not None:
+        outdated_images = compose.services_with_outdated_images(compiled['compose_config'])
+    plan = compose_plan.get_up_plan(previous_compose_config, compiled['compose_config'], recreate_containers,
+                                    outdated_images)
+    _log_up_plan(plan)
+
+    if dns.dns_responder_enabled():
+        log_progress_to_client("Updating host names in the DNS responder")
+        dns.update_dns_from_port_spec(compiled['port_spec'])
+        hosts.remove_dusty_hosts_config()
+    else:
+        dns.stop_dns_responder()
+        if not unchanged:
+            log_progress_to_client("Saving port forwarding to hosts file")
+            hosts.update_hosts_file_from_port_spec(compiled['port_spec'])
+    if unchanged:
+        log_progress_to_client("Ensuring nginx is running")
+        nginx.ensure_nginx_running()
+        log_progress_to_client("Starting containers")
+    else:
+        log_progress_to_client("Saving nginx config and ensure nginx is running")
+        nginx.update_nginx_from_config(compiled['nginx_config'])
+        log_progress_to_client("Saving docker-compose config and starting containers")
+    if previous_compose_config is None:
+        # With no Composefile to compare against, fall back to recreating everything
+        compose.update_running_containers_from_spec(compiled['compose_config'], recreate_containers=recreate_containers)
+    else:
+        compose.update_running_containers_from_plan(compiled['compose_config'], plan, write=not unchanged)
+    if not unchanged:
+        artifacts.save_compiled_outputs(fingerprint, compiled)
 
     log_to_client("Your local environment is now started!")
     log_to_client("Use `dusty logs` to track your containers")
@@ -60,6 +111,16 @@ def stop_apps_or_services(app_or_service_names=None, rm_containers=False):
     if rm_containers:
         compose.rm_containers(app_or_service_names)
 
+def reset_once(app_name):
+    """Make the app run its `once` command again the next time its
+    container starts, as if it had never run it"""
+    specs = spec_assembler.get_specs()
+    if app_name not in specs['apps']:
+        raise KeyError('No app found named {}'.format(app_name))
+    virtualbox.remove_once_markers(app_name)
+    log_to_client("{} will run its once command the next time its container starts. "
+                  "Use `dusty restart {}` to run it now.".format(app_name, app_name))
+
 def restart_apps_or_services(app_or_service_names=None, sync=True):
     """Restart any containers associated with Dusty, or associated with
     the provided app_or_service_names."""
@@ -77,3 +138,40 @@ def restart_apps_or_services(app_or_service_names=None, sync=True):
             rsync.sync_repos(spec_assembler.get_all_repos(active_only=True, include_specs_repo=False))
 
     compose.restart_running_services(app_or_service_names)
+
+def _apps_affected_by(repo_or_lib_name):
+    """Returns the repo named by repo_or_lib_name, which can be an app, a lib
+    or a repo, and the active apps whose containers use code from that repo:
+    apps in the repo, apps which depend on a lib in the repo, and apps which
+    link to any of those apps."""
+    specs = spec_assembler.get_specs()
+    if repo_or_lib_name in specs['apps'] or repo_or_lib_name in specs['libs']:
+        repo = Repo(specs.get_app_or_lib(repo_or_lib_name)['repo'])
+    else:
+        repo = Repo.resolve(spec_assembler.get_all_repos(include_specs_repo=False), repo_or_lib_name)
+
+    graph = spec_assembler.get_dependency_graph(specs)
+    affected_apps = set()
+    for spec_type in ['apps', 'libs']:
+        for name, spec in specs[spec_type].iteritems():
+            if Repo(spec['repo']) != repo:
+                continue
+            if spec_type == 'apps':
+                affected_apps.add(name)
+            affected_apps.update(graph.dependents(spec_type, name, 'apps'))
+    for app_name in list(affected_apps):
+        affected_apps.update(graph.dependents('apps', app_name, 'apps'))
+    active_apps = spec_assembler.get_assembled_specs()['apps']
+    return repo, sorted(app_name for app_name in affected_apps if app_name in active_apps)
+
+def restart_apps_affected_by(repo_or_lib_name, sync=True):
+    """Restart only the containers of active apps which use code from the
+    given app, lib or repo, and sync only that repo."""
+    repo, app_names = _apps_affected_by(repo_or_lib_name)
+    if not app_names:
+        log_to_client("No active apps are affected by {}".format(repo.remote_path))
+        return
+    log_to_client("Restarting the following apps affected by {}: {}".format(repo.remote_path, ', '.join(app_names)))
+    if sync:
+        rsync.sync_repos([repo])
+    compose.restart_running_services(app_names)
@@ -2,10 +2,12 @@ import textwrap
 from prettytable import PrettyTable
 
 from ..log import log_to_client
+from ..payload import read_only
 from ..compiler.spec_assembler import get_specs
 from . import utils
 from ..systems.docker import get_dusty_container_name
 
+@read_only
 def script_info_for_app(app_name):
     app_specs = get_specs()['apps'].get(app_name)
     if not app_specs:
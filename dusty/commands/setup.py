@@ -5,7 +5,7 @@ from os.path import isfile, isdir
 from os import mkdir
 
 from ..payload import Payload
-from ..config import save_config_value, get_config_value, verify_mac_username, refresh_config_warnings
+from ..config import update_config, get_config_value, verify_mac_username, refresh_config_warnings
 from ..log import log_to_client
 from .. import constants
 from .repos import update_managed_repos
@@ -85,9 +85,7 @@ def setup_dusty_config(mac_username=None, specs_repo=None, nginx_includes_dir=No
     return Payload(complete_setup, config_dictionary)
 
 def complete_setup(config):
-    for key, value in config.iteritems():
-        save_config_value(key, value)
-    save_config_value(constants.CONFIG_SETUP_KEY, True)
+    update_config(**dict(config, **{constants.CONFIG_SETUP_KEY: True}))
     refresh_config_warnings()
     update_managed_repos()
     log_to_client('Initial setup completed. You should now be able to use Dusty!')
@@ -4,6 +4,6 @@ from ..systems.docker import get_dusty_container_name
 
 def execute_shell(app_or_service_name):
     specs = get_specs()
-    if app_or_service_name not in [spec.name for spec in specs.get_apps_and_services()]:
+    if app_or_service_name not in specs['apps'] and app_or_service_name not in specs['services']:
         raise KeyError('No app or service found named {}'.format(app_or_service_name))
     utils.exec_docker('exec', '-ti', get_dusty_container_name(app_or_service_name), '/bin/bash')
@@ -2,6 +2,7 @@ from prettytable import PrettyTable
 
 from ..compiler.spec_assembler import get_assembled_specs
 from ..log import log_to_client
+from ..payload import read_only
 from ..systems.docker import get_dusty_containers
 
 def _has_active_container(spec_type, service_name):
@@ -9,6 +10,7 @@ def _has_active_container(spec_type, service_name):
         return False
     return get_dusty_containers([service_name]) != []
 
+@read_only
 def get_dusty_status():
     assembled_specs = get_assembled_specs()
     table = PrettyTable(["Name", "Type", "Has Active Container"])
@@ -12,7 +12,9 @@ from ..systems.docker.compose import write_composefile, compose_up
 from ..systems.rsync import sync_repos_by_specs
 from ..systems.virtualbox import initialize_docker_vm
 from ..log import log_to_client
+from ..payload import read_only
 
+@read_only
 def test_info_for_app_or_lib(app_or_lib_name):
     expanded_specs = get_expanded_libs_specs()
     spec = expanded_specs.get_app_or_lib(app_or_lib_name)
@@ -1,57 +1,177 @@
-from copy import copy
-import logging
 import os
+import cPickle
+import logging
 
+import git
 from schemer import ValidationException
 
-from ..compiler.spec_assembler import get_specs_path, get_specs_from_path
+from ..compiler.spec_assembler import get_specs_path, get_specs_from_path, get_dependency_graph
+from ..schemas.base_schema_class import spec_fingerprints
+from ..schemas.dependency_graph import DependencyGraph
 from ..log import log_to_client
-from ..schemas import app_schema, bundle_schema, lib_schema
+from ..path import atomic_write, parent_dir, validation_state_path
 from .. import constants
 
+SPEC_TYPES = ['bundles', 'apps', 'libs', 'services']
+
 def _check_bare_minimum(specs):
     if not specs.get('bundles'):
         raise ValidationException("No Bundles found - exiting")
 
-def _validate_app_references(app, specs):
+def _missing_references(spec_type, name, referenced_type, references, spec_names):
+    return ["{} {} references {} {}, which does not exist".format(spec_type, name, referenced_type, reference)
+            for reference in references if reference not in spec_names[referenced_type]]
+
+def _app_reference_errors(app_name, app, spec_names):
+    errors = []
     for spec_type in ['apps', 'libs', 'services']:
-        dependent = app['depends'][spec_type]
+        errors += _missing_references('apps', app_name, spec_type, app['depends'][spec_type], spec_names)
         if spec_type in ['apps', 'services']:
-            dependent += app['conditional_links'][spec_type]
-        assert(all(spec_name in specs[spec_type].keys() for spec_name in dependent))
-
-def _validate_bundle_references(bundle, specs):
-    for app in bundle['apps']:
-        assert(app in specs['apps'].keys())
-
-def _validate_lib_references(lib, specs):
-    for lib in lib['depends']['libs']:
-        assert(lib in specs['libs'].keys())
-
-def _validate_spec_names(specs):
-    for app in specs['apps'].values():
-        _validate_app_references(app, specs)
-    for bundle in specs['bundles'].values():
-        _validate_bundle_references(bundle, specs)
-    for lib in specs['libs'].values():
-        _validate_lib_references(lib, specs)
-
-def _cycle_check(spec, specs, upstream):
-    for dependent in spec['depends'][spec.spec_type]:
-        print dependent
-        if dependent in upstream:
-            raise ValidationException("Cycle found for {0} {1}.  Upstream {0}: {2}".format(spec.spec_type, spec.name, upstream))
-        else:
-            new_upstream = copy(upstream)
-            new_upstream.add(dependent)
-            _cycle_check(specs[spec.spec_type][dependent], specs, new_upstream)
-
-def _validate_cycle_free(specs):
-    for spec_type in ['apps', 'libs']:
-        for spec in specs[spec_type].values():
-            _cycle_check(spec, specs, set([spec.name]))
-
-def validate_specs_from_path(specs_path):
+            errors += _missing_references('apps', app_name, spec_type, app['conditional_links'][spec_type], spec_names)
+    return errors
+
+def _bundle_reference_errors(bundle_name, bundle, spec_names):
+    return _missing_references('bundles', bundle_name, 'apps', bundle['apps'], spec_names)
+
+def _lib_reference_errors(lib_name, lib, spec_names):
+    return _missing_references('libs', lib_name, 'libs', lib['depends']['libs'], spec_names)
+
+def _reference_errors(spec_type, name, spec, spec_names):
+    if spec_type == 'apps':
+        return _app_reference_errors(name, spec, spec_names)
+    elif spec_type == 'bundles':
+        return _bundle_reference_errors(name, spec, spec_names)
+    elif spec_type == 'libs':
+        return _lib_reference_errors(name, spec, spec_names)
+    return []
+
+def _spec_names(specs):
+    return dict((spec_type, set(specs.get(spec_type, {}))) for spec_type in SPEC_TYPES)
+
+def _spec_name_errors(specs):
+    spec_names = _spec_names(specs)
+    errors = []
+    for spec_type in SPEC_TYPES:
+        for name, spec in specs.get(spec_type, {}).iteritems():
+            errors += _reference_errors(spec_type, name, spec, spec_names)
+    return errors
+
+def _references(spec_type, spec):
+    """Returns the (spec type, name) of every spec directly referenced by a spec"""
+    if spec_type == 'bundles':
+        return [('apps', app) for app in spec['apps']]
+    references = [('libs', lib) for lib in spec['depends']['libs']]
+    if spec_type == 'apps':
+        for referenced_type in ['apps', 'services']:
+            references += [(referenced_type, name) for name in spec['depends'][referenced_type]]
+            references += [(referenced_type, name) for name in spec['conditional_links'][referenced_type]]
+    return references
+
+def _referrers(specs):
+    referrers = {}
+    for spec_type in ['bundles', 'apps', 'libs']:
+        for name, spec in specs.get(spec_type, {}).iteritems():
+            for reference in _references(spec_type, spec):
+                referrers.setdefault(reference, set()).add((spec_type, name))
+    return referrers
+
+def _cycle_message(cycle):
+    return "Cycle found between {}: {}".format(cycle[0][0], ', '.join(name for _, name in cycle))
+
+def _cycle_errors(specs):
+    return [_cycle_message(cycle) for cycle in get_dependency_graph(specs).cycles]
+
+def _check_specs(specs, changed=None, previous_results=None):
+    """Checks references and cycles, returning the errors found for each spec
+    and every cycle. If `changed` is given, only those specs and the specs which
+    reference them are checked; the results for every other spec are taken
+    from `previous_results`."""
+    spec_names = _spec_names(specs)
+    if changed is None:
+        to_check = set((spec_type, name) for spec_type in SPEC_TYPES for name in spec_names[spec_type])
+        errors = {}
+        cycles = get_dependency_graph(specs).cycles
+    else:
+        previous_results = previous_results or {'errors': {}, 'cycles': []}
+        referrers = _referrers(specs)
+        to_check = set(key for key in changed if key[1] in spec_names[key[0]])
+        for key in changed:
+            to_check |= referrers.get(key, set())
+        errors = dict((key, key_errors) for key, key_errors in previous_results['errors'].iteritems()
+                      if key not in to_check and key[1] in spec_names[key[0]])
+        cycles = [cycle for cycle in previous_results['cycles'] if not changed.intersection(cycle)]
+        roots = [key for key in to_check if key[0] in ['apps', 'libs']]
+        cycles += [cycle for cycle in DependencyGraph(specs, roots=sorted(roots)).cycles if cycle not in cycles]
+    logging.info('Checking references of {} specs'.format(len(to_check)))
+    for spec_type, name in to_check:
+        key_errors = _reference_errors(spec_type, name, specs[spec_type][name], spec_names)
+        if key_errors:
+            errors[(spec_type, name)] = key_errors
+    return {'errors': errors, 'cycles': cycles}
+
+def _report(results):
+    errors = sorted(error for key_errors in results['errors'].values() for error in key_errors)
+    errors += [_cycle_message(cycle) for cycle in sorted(results['cycles'])]
+    for error in errors:
+        log_to_client(error)
+    if errors:
+        raise ValidationException("Found {} problem{} with your specs".format(len(errors), '' if len(errors) == 1 else 's'))
+
+def _validate_specs(specs):
+    """Runs every check against the loaded specs, reports all of the
+    problems found to the client, then raises a single ValidationException"""
+    _check_bare_minimum(specs)
+    _report(_check_specs(specs))
+
+def _load_validation_state(specs_path):
+    """Returns the fingerprints and results saved by the last validation of
+    specs_path, or None if it hasn't been validated by this version of Dusty"""
+    try:
+        with open(validation_state_path(specs_path), 'rb') as f:
+            state = cPickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(state, dict) or state.get('version') != constants.VERSION or state.get('specs_path') != specs_path:
+        return None
+    return state
+
+def _save_validation_state(specs_path, fingerprints, results):
+    state = {'version': constants.VERSION, 'specs_path': specs_path,
+             'fingerprints': fingerprints, 'results': results}
+    state_path = validation_state_path(specs_path)
+    try:
+        if not os.path.exists(parent_dir(state_path)):
+            os.makedirs(parent_dir(state_path))
+        atomic_write(state_path, cPickle.dumps(state, cPickle.HIGHEST_PROTOCOL))
+    except (IOError, OSError) as e:
+        log_to_client('Could not save validation results to {}, so the next validation will check '
+                      'every spec again: {}'.format(state_path, e))
+
+def _specs_changed_from_state(state, fingerprints):
+    if state is None:
+        return None
+    previous = state['fingerprints']
+    return set(key for key in set(fingerprints) | set(previous) if fingerprints.get(key) != previous.get(key))
+
+def _specs_changed_since(specs_path, git_ref):
+    """Returns the (spec type, name) of every spec file under specs_path which
+    differs from git_ref, including uncommitted and untracked files"""
+    try:
+        repo = git.Repo(specs_path, search_parent_directories=True)
+        paths = repo.git.diff('--name-only', git_ref).splitlines()
+        paths += repo.git.ls_files('--others', '--exclude-standard').splitlines()
+    except (git.exc.GitCommandError, git.exc.InvalidGitRepositoryError) as e:
+        raise RuntimeError('Could not find specs changed since {}: {}'.format(git_ref, e))
+    specs_path = os.path.realpath(specs_path)
+    changed = set()
+    for path in paths:
+        relative_path = os.path.relpath(os.path.realpath(os.path.join(repo.working_tree_dir, path)), specs_path)
+        parts = relative_path.split(os.sep)
+        if len(parts) == 2 and parts[0] in SPEC_TYPES and parts[1].endswith('.yml'):
+            changed.add((parts[0], os.path.splitext(parts[1])[0]))
+    return changed
+
+def validate_specs_from_path(specs_path, changed_since=None):
     """
     Validates Dusty specs at the given path. The following checks are performed:
         -That the given path exists
@@ -59,20 +179,35 @@ def validate_specs_from_path(specs_path):
         -That the fields in the specs match those allowed in our schemas
         -That references to apps, libs, and services point at defined specs
         -That there are no cycles in app and lib dependencies
+    Results are saved, so the next validation of the same path only checks the
+    specs which changed since, and the specs which reference them. If changed_since
+    is a git ref, only specs which differ from that ref are checked, and nothing
+    is saved.
     """
     # Validation of fields with schemer is now down implicitly through get_specs_from_path
     # We are dealing with Dusty_Specs class in this file
     log_to_client("Validating specs at path {}".format(specs_path))
     if not os.path.exists(specs_path):
         raise RuntimeError("Specs path not found: {}".format(specs_path))
-    specs = get_specs_from_path(specs_path)
+    specs_path = os.path.realpath(specs_path)
+    specs = get_specs_from_path(specs_path).load()
     _check_bare_minimum(specs)
-    _validate_spec_names(specs)
-    _validate_cycle_free(specs)
+    fingerprints = spec_fingerprints(specs_path)
+    state = _load_validation_state(specs_path)
+    if changed_since is not None:
+        changed = _specs_changed_since(specs_path, changed_since)
+    else:
+        changed = _specs_changed_from_state(state, fingerprints)
+    results = _check_specs(specs, changed, state['results'] if state else None)
+    if changed_since is None:
+        # A run against a git ref doesn't check the specs which match the ref,
+        # so its results can't stand in for them on the next validation
+        _save_validation_state(specs_path, fingerprints, results)
+    _report(results)
     log_to_client("Validation Complete!")
 
-def validate_specs():
+def validate_specs(changed_since=None):
     """
     Validates specs using the path configured in Dusty's configuration
     """
-    validate_specs_from_path(get_specs_path())
+    validate_specs_from_path(get_specs_path(), changed_since=changed_since)
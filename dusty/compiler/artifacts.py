@@ -0,0 +1,55 @@
+"""The compiler outputs of the last successful `dusty up`: the port spec,
+nginx config and compose config. They are saved next to the Composefile
+along with a fingerprint of everything they were compiled from, so the
+next `dusty up` with the same inputs can skip compiling and writing them."""
+
+import json
+import cPickle
+import hashlib
+import logging
+
+from ..config import get_config_value
+from ..path import atomic_write
+from ..schemas.base_schema_class import thaw
+from .. import constants
+
+def compilation_fingerprint(assembled_specs, docker_ip, lib_installs_images=None, image_ids=None):
+    """Changes whenever the assembled specs, the repo overrides, the VM's
+    IP, the apps' images or the images their libs are baked into change,
+    or Dusty is upgraded"""
+    inputs = {'version': constants.VERSION,
+              'assembled_specs': thaw(assembled_specs),
+              'repo_overrides': get_config_value(constants.CONFIG_REPO_OVERRIDES_KEY),
+              'docker_ip': docker_ip,
+              'lib_installs_images': lib_installs_images or {},
+              'image_ids': image_ids or {}}
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True)).hexdigest()
+
+def _load_saved():
+    try:
+        with open(constants.COMPILED_OUTPUTS_PATH, 'rb') as f:
+            saved = cPickle.load(f)
+    except Exception:
+        return None
+    return saved if isinstance(saved, dict) and 'outputs' in saved else None
+
+def load_compiled_outputs(fingerprint):
+    """Returns the outputs saved by save_compiled_outputs, if they were
+    compiled from inputs with the given fingerprint, and None otherwise"""
+    saved = _load_saved()
+    if saved is None or saved.get('fingerprint') != fingerprint:
+        return None
+    return saved['outputs']
+
+def load_last_compiled_outputs():
+    """Returns the outputs of the last `dusty up`, whatever they were
+    compiled from, or None if there aren't any"""
+    saved = _load_saved()
+    return saved['outputs'] if saved is not None else None
+
+def save_compiled_outputs(fingerprint, outputs):
+    try:
+        atomic_write(constants.COMPILED_OUTPUTS_PATH,
+                     cPickle.dumps({'fingerprint': fingerprint, 'outputs': outputs}, cPickle.HIGHEST_PROTOCOL))
+    except (IOError, OSError) as e:
+        logging.debug('Could not save compiled outputs: {}'.format(e))
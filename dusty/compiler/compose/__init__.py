@@ -1,24 +1,28 @@
+import json
+import hashlib
 import logging
-import copy
 import yaml
 
-from ..spec_assembler import get_assembled_specs
-from ...path import vm_cp_path
+from ..spec_assembler import get_assembled_specs, get_dependency_graph
+from ...schemas.base_schema_class import thaw
+from ...path import vm_cp_path, vm_once_markers_path
 from ...source import Repo
 from ... import constants
 
-def get_compose_dict(assembled_specs, port_specs):
+def get_compose_dict(assembled_specs, port_specs, lib_installs_images=None, image_ids=None):
     """ This function returns a dictionary representation of a docker-compose.yml file, based on assembled_specs from
-    the spec_assembler, and port_specs from the port_spec compiler """
+    the spec_assembler, and port_specs from the port_spec compiler. lib_installs_images maps app names to the
+    tagged images their libs were baked into; apps missing from it run from their own image. image_ids maps app
+    names to the ID of their image, which the `once` command markers are named after """
     compose_dict = {}
     for app_name in assembled_specs['apps'].keys():
-        compose_dict[app_name] = _composed_app_dict(app_name, assembled_specs, port_specs)
+        compose_dict[app_name] = _composed_app_dict(app_name, assembled_specs, port_specs, lib_installs_images, image_ids)
     for service_spec in assembled_specs['services'].values():
         compose_dict[service_spec.name] = _composed_service_dict(service_spec)
     return compose_dict
 
 def get_testing_compose_dict(service_name, base_compose_spec, command=None, volumes=None, testing_image_identifier=None, net_container_identifier=None):
-    app_compose_dict = copy.deepcopy(base_compose_spec)
+    app_compose_dict = thaw(base_compose_spec)
     if command is not None:
         app_compose_dict['command'] = command
     if volumes is not None:
@@ -44,24 +48,23 @@ def _conditional_links(assembled_specs, app_name):
             link_to_apps.append(potential_link)
     return link_to_apps
 
-def _composed_app_dict(app_name, assembled_specs, port_specs):
+def _composed_app_dict(app_name, assembled_specs, port_specs, lib_installs_images=None, image_ids=None):
     """ This function returns a dictionary of the docker-compose.yml specifications for one app """
     logging.info("Compose Compiler: Compiling dict for app {}".format(app_name))
     app_spec = assembled_specs['apps'][app_name]
-    compose_dict = app_spec["compose"]
+    compose_dict = thaw(app_spec["compose"])
     if 'image' in app_spec and 'build' in app_spec:
         raise RuntimeError("image and build are both specified in the spec for {}".format(app_name))
     elif 'image' in app_spec:
-        logging.info
-        compose_dict['image'] = app_spec['image']
+        compose_dict['image'] = (lib_installs_images or {}).get(app_name, app_spec['image'])
     elif 'build' in app_spec:
         compose_dict['build'] = app_spec['build']
     else:
         raise RuntimeError("Neither image nor build was specified in the spec for {}".format(app_name))
-    compose_dict['command'] = _compile_docker_command(app_name, assembled_specs)
+    compose_dict['command'] = _compile_docker_command(app_name, assembled_specs, (image_ids or {}).get(app_name))
     logging.info("Compose Compiler: compiled command {}".format(compose_dict['command']))
-    compose_dict['links'] = app_spec['depends']['services'] + \
-                            app_spec['depends']['apps'] + \
+    compose_dict['links'] = list(app_spec['depends']['services']) + \
+                            list(app_spec['depends']['apps']) + \
                             _conditional_links(assembled_specs, app_name)
     logging.info("Compose Compiler: links {}".format(compose_dict['links']))
     compose_dict['volumes'] = compose_dict['volumes'] + _get_compose_volumes(app_name, assembled_specs)
@@ -87,25 +90,43 @@ def _get_ports_list(app_name, port_specs):
     return ["{}:{}".format(port_spec['mapped_host_port'], port_spec['in_container_port'])
             for port_spec in port_specs['docker_compose'][app_name]]
 
-def _compile_docker_command(app_name, assembled_specs):
+def _compile_docker_command(app_name, assembled_specs, image_id=None):
     """ This is used to compile the command that will be run when the docker container starts
     up. This command has to install any libs that the app uses, run the `always` command, and
-    run the `once` command if the container is being launched for the first time """
+    run the `once` command if it has not succeeded since it or the app's image last changed. Libs
+    baked into the app's image are only installed again if their code has changed since. """
     app_spec = assembled_specs['apps'][app_name]
-    first_run_file = constants.FIRST_RUN_FILE_PATH
+    once_marker = once_marker_path(app_spec, image_id)
+    baked_libs = libs_to_bake(app_name, assembled_specs)
     command = []
-    command += _lib_install_commands_for_app(app_name, assembled_specs)
+    if baked_libs:
+        command += [_changed_lib_install_command(lib, assembled_specs['libs'][lib]) for lib in baked_libs]
+    else:
+        command += _lib_install_commands_for_app(app_name, assembled_specs)
     command.append("cd {}".format(container_code_path(app_spec)))
     command.append("export PATH=$PATH:{}".format(container_code_path(app_spec)))
-    command.append("if [ ! -f {} ]".format(first_run_file))
+    command.append("if [ ! -f {} ]".format(once_marker))
     once_command = app_spec['commands']["once"]
-    command.append("then mkdir -p {}; touch {}".format(constants.RUN_DIR, first_run_file))
-    if once_command:
-        command.append(once_command)
+    mark_once = "rm -f {}/* && touch {}".format(constants.CONTAINER_ONCE_MARKERS_DIR, once_marker)
+    command.append("then {} && {}".format(once_command, mark_once) if once_command else "then {}".format(mark_once))
     command.append("fi")
     command.append(app_spec['commands']['always'])
     return "sh -c \"{}\"".format('; '.join(command))
 
+def once_marker_path(app_spec, image_id=None):
+    """ The marker the app's container leaves once the `once` command has succeeded. It lives in
+    the VM's persistent storage, so it outlasts the container, and is named after the command
+    and the app's image so changing either runs the command again. The image's ID is used when
+    it is known, so pulling a new image under the same name counts as a change. """
+    image = image_id or app_spec.get('image')
+    fingerprint = hashlib.sha1(json.dumps([app_spec['commands']['once'], image, app_spec.get('build')]))
+    return '{}/{}'.format(constants.CONTAINER_ONCE_MARKERS_DIR, fingerprint.hexdigest()[:12])
+
+def _libs_for(spec_type, name, assembled_specs):
+    """ Returns every lib the given app or lib needs, directly or indirectly, with each lib
+    after the libs it depends on so they are installed in order """
+    return get_dependency_graph(assembled_specs).dependencies(spec_type, name, 'libs')
+
 def _lib_install_commands_for_libs(assembled_specs, libs):
     commands = []
     for lib in libs:
@@ -118,13 +139,13 @@ def _lib_install_commands_for_libs(assembled_specs, libs):
 def _lib_install_commands_for_app(app_name, assembled_specs):
     """ This returns a list of all the commands that will install libraries for a
     given app """
-    libs = assembled_specs['apps'][app_name]['depends']['libs']
+    libs = _libs_for('apps', app_name, assembled_specs)
     return _lib_install_commands_for_libs(assembled_specs, libs)
 
 def _lib_install_commands_for_lib(app_name, assembled_specs):
     """ This returns a list of all the commands that will install libraries for a
     given lib """
-    libs = assembled_specs['libs'][app_name]['depends']['libs']
+    libs = _libs_for('libs', app_name, assembled_specs)
     return _lib_install_commands_for_libs(assembled_specs, libs)
 
 def lib_install_commands_for_app_or_lib(app_or_lib_name, assembled_specs):
@@ -138,21 +159,51 @@ def _lib_install_command(lib_spec):
         return ''
     return "cd {} && {}".format(lib_spec['mount'], lib_spec['install'])
 
+def libs_to_bake(app_name, assembled_specs):
+    """ Returns the libs, in install order, whose installs are baked into a derived image of
+    the app's image instead of running every time its container starts. Apps built from a
+    Dockerfile keep installing their libs on start. """
+    if 'image' not in assembled_specs['apps'][app_name]:
+        return []
+    return [lib for lib in _libs_for('apps', app_name, assembled_specs) if assembled_specs['libs'][lib]['install']]
+
+def lib_installs_image_name(app_name):
+    return '{}{}'.format(constants.LIB_INSTALLS_IMAGE_PREFIX, app_name)
+
+def lib_install_marker_path(lib_name):
+    return '{}/{}'.format(constants.CONTAINER_LIB_INSTALLS_DIR, lib_name)
+
+def lib_install_and_mark_command(lib_name, lib_spec):
+    """ Installs a lib, then records when it was installed so later starts can tell whether
+    its code has changed since """
+    return "{} && mkdir -p {} && touch {}".format(_lib_install_command(lib_spec), constants.CONTAINER_LIB_INSTALLS_DIR,
+                                                   lib_install_marker_path(lib_name))
+
+def _changed_lib_install_command(lib_name, lib_spec):
+    """ Re-runs a baked lib install only if a file in the lib has changed since it was last installed """
+    marker = lib_install_marker_path(lib_name)
+    return "if [ ! -f {0} ] || [ -n \\\"$(find {1} -newer {0} | head -n 1)\\\" ]; then {2}; fi".format(
+        marker, lib_spec['mount'], lib_install_and_mark_command(lib_name, lib_spec))
+
 def _get_compose_volumes(app_name, assembled_specs):
     """ This returns formatted volume specifications for a docker-compose app. We mount the app
     as well as any libs it needs so that local code is used in our container, instead of whatever
     code was in the docker image.
 
     Additionally, we create a volume for the /cp directory used by Dusty to facilitate
-    easy file transfers using `dusty cp`."""
+    easy file transfers using `dusty cp`, and one for the app's `once` command markers."""
     volumes = []
     volumes.append(_get_cp_volume_mount(app_name))
+    volumes.append(_get_once_markers_volume_mount(app_name))
     volumes += get_app_volume_mounts(app_name, assembled_specs)
     return volumes
 
 def _get_cp_volume_mount(app_name):
     return "{}:{}".format(vm_cp_path(app_name), constants.CONTAINER_CP_DIR)
 
+def _get_once_markers_volume_mount(app_name):
+    return "{}:{}".format(vm_once_markers_path(app_name), constants.CONTAINER_ONCE_MARKERS_DIR)
+
 def get_volume_mounts(app_or_lib_name, assembled_specs):
     if app_or_lib_name in assembled_specs['apps']:
         return get_app_volume_mounts(app_or_lib_name, assembled_specs)
@@ -172,7 +223,7 @@ def get_app_volume_mounts(app_name, assembled_specs):
 def get_lib_volume_mounts(base_lib_name, assembled_specs):
     """ Returns a list of the formatted volume specs for a lib"""
     volumes = [_get_lib_repo_volume_mount(assembled_specs['libs'][base_lib_name])]
-    for lib_name in assembled_specs['libs'][base_lib_name]['depends']['libs']:
+    for lib_name in _libs_for('libs', base_lib_name, assembled_specs):
         lib_spec = assembled_specs['libs'][lib_name]
         volumes.append(_get_lib_repo_volume_mount(lib_spec))
     return volumes
@@ -195,7 +246,7 @@ def container_code_path(spec):
 def _get_app_libs_volume_mounts(app_name, assembled_specs):
     """ Returns a list of the formatted volume mounts for all libs that an app uses """
     volumes = []
-    for lib_name in assembled_specs['apps'][app_name]['depends']['libs']:
+    for lib_name in _libs_for('apps', app_name, assembled_specs):
         lib_spec = assembled_specs['libs'][lib_name]
         volumes.append("{}:{}".format(Repo(lib_spec['repo']).vm_path, container_code_path(lib_spec)))
     return volumes
@@ -0,0 +1,75 @@
+"""Works out what `dusty up` has to do to go from the compose config it
+applied last time to a newly compiled one, so it only recreates the
+containers whose config changed."""
+
+def _linked_services(service_config):
+    """Links are either `service` or `service:alias`"""
+    return set(link.split(':')[0] for link in service_config.get('links', []))
+
+def _changed_keys(previous_service_config, service_config):
+    keys = set(previous_service_config) | set(service_config)
+    return sorted(key for key in keys if previous_service_config.get(key) != service_config.get(key))
+
+def _dependents(compose_config, service_names):
+    """Returns the services which link to any of service_names, directly
+    or through other services, along with the service they link to"""
+    dependents = {}
+    to_visit = list(service_names)
+    while to_visit:
+        linked_service = to_visit.pop()
+        for name, service_config in compose_config.iteritems():
+            if name in service_names or name in dependents:
+                continue
+            if linked_service in _linked_services(service_config):
+                dependents[name] = linked_service
+                to_visit.append(name)
+    return dependents
+
+def get_up_plan(previous_compose_config, compose_config, recreate_containers=True, outdated_images=()):
+    """Compares the compose config `dusty up` last applied with a new one.
+    Returns a dictionary of lists of service names:
+        create:    services which are new in compose_config
+        recreate:  services whose config changed, and services which link
+                   to them, which have to be stopped, removed and created again
+        remove:    services which are no longer in compose_config
+        keep:      services which can be left running
+    `changes` maps each recreated service to the keys of its config which
+    changed, or to why else it is recreated. Services in outdated_images
+    run a container created from an older image than their image name now
+    points to, so they are recreated even if their config is unchanged.
+    With recreate_containers=False, changed services are kept instead."""
+    if previous_compose_config is None:
+        previous_compose_config = {}
+    changes = {}
+    if recreate_containers:
+        for name, service_config in compose_config.iteritems():
+            if name in previous_compose_config:
+                changed_keys = _changed_keys(previous_compose_config[name], service_config)
+                if changed_keys:
+                    changes[name] = changed_keys
+                elif name in outdated_images:
+                    changes[name] = 'image was updated'
+        for name, linked_service in _dependents(compose_config, set(changes)).iteritems():
+            if name in previous_compose_config:
+                changes[name] = 'links to {}'.format(linked_service)
+    return {'create': sorted(name for name in compose_config if name not in previous_compose_config),
+            'recreate': sorted(changes),
+            'remove': sorted(name for name in previous_compose_config if name not in compose_config),
+            'keep': sorted(name for name in compose_config if name in previous_compose_config and name not in changes),
+            'changes': changes}
+
+def describe_up_plan(plan):
+    """Returns the lines to show the user for an up plan"""
+    def _describe_change(name):
+        change = plan['changes'][name]
+        return '{} ({})'.format(name, change if isinstance(change, basestring) else ', '.join(change))
+    lines = []
+    if plan['create']:
+        lines.append('Create: {}'.format(', '.join(plan['create'])))
+    if plan['recreate']:
+        lines.append('Recreate: {}'.format(', '.join(_describe_change(name) for name in plan['recreate'])))
+    if plan['remove']:
+        lines.append('Remove: {}'.format(', '.join(plan['remove'])))
+    if plan['keep']:
+        lines.append('Leave running: {}'.format(', '.join(plan['keep'])))
+    return lines
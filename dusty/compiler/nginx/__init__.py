@@ -1,13 +1,70 @@
-from ...constants import NGINX_MAX_FILE_SIZE
+import re
+from collections import OrderedDict
+
+from ...constants import (NGINX_MAX_FILE_SIZE, NGINX_UPSTREAM_KEEPALIVE, NGINX_PROXY_CONNECT_TIMEOUT,
+                          NGINX_PROXY_READ_TIMEOUT, NGINX_PROXY_BUFFER_SIZE, NGINX_PROXY_BUFFERS, NGINX_GZIP_TYPES,
+                          NGINX_HASH_MAX_SIZE, NGINX_HASH_BUCKET_SIZE)
+
+def _proxy_settings(port_spec):
+    """The proxy settings for a port spec: Dusty's defaults, overridden by
+    anything under `nginx` in the spec of the app it forwards to"""
+    settings = {'keepalive': NGINX_UPSTREAM_KEEPALIVE,
+                'client_max_body_size': NGINX_MAX_FILE_SIZE,
+                'proxy_connect_timeout': NGINX_PROXY_CONNECT_TIMEOUT,
+                'proxy_read_timeout': NGINX_PROXY_READ_TIMEOUT,
+                'proxy_buffering': True,
+                'gzip': True}
+    settings.update(port_spec.get('proxy_settings') or {})
+    return settings
+
+def _nginx_upstream_name(port_spec):
+    """Each forwarded port gets its own upstream, named after its app where we know it"""
+    name = 'dusty_{}_{}'.format(port_spec.get('app_name') or 'port', port_spec['proxied_port'])
+    return re.sub(r'[^A-Za-z0-9_]', '_', name)
+
+def _nginx_proxy_host(port_spec):
+    # Apps have always seen the VM's address as the Host, as they did before upstreams
+    return "{}:{}".format(port_spec['boot2docker_ip'], port_spec['proxied_port'])
+
+def _nginx_upstream_spec(port_spec):
+    """This will output the nginx upstream config string for specific port spec. The
+    keepalive pool lets nginx reuse connections to the VM instead of opening one per request"""
+    return ''.join(_nginx_upstream_lines(port_spec, _proxy_settings(port_spec)))
+
+def _nginx_upstream_lines(port_spec, settings):
+    yield "\t upstream {} {{\n".format(_nginx_upstream_name(port_spec))
+    yield "\t \t server {}:{};\n".format(port_spec['boot2docker_ip'], port_spec['proxied_port'])
+    if settings['keepalive']:
+        yield "\t \t keepalive {};\n".format(settings['keepalive'])
+    yield "\t }\n"
+
 def _nginx_proxy_string(port_spec):
-    return "proxy_pass http://{}:{};".format(port_spec['boot2docker_ip'], port_spec['proxied_port'])
+    return "proxy_pass http://{};".format(_nginx_upstream_name(port_spec))
+
+def _nginx_proxy_settings_strings(settings, proxy_host):
+    strings = ["proxy_http_version 1.1;",
+               'proxy_set_header Connection "";',
+               "proxy_set_header Host {};".format(proxy_host),
+               "proxy_connect_timeout {}s;".format(settings['proxy_connect_timeout']),
+               "proxy_read_timeout {}s;".format(settings['proxy_read_timeout'])]
+    if settings['proxy_buffering']:
+        strings += ["proxy_buffer_size {};".format(NGINX_PROXY_BUFFER_SIZE),
+                    "proxy_buffers {};".format(NGINX_PROXY_BUFFERS)]
+    else:
+        strings.append("proxy_buffering off;")
+    return strings
 
 def _nginx_location_spec(port_spec):
     """This will output the nginx location config string for speicfic port spec """
-    location_string_spec = "\t \t location / { \n"
-    location_string_spec += "\t \t \t {} \n".format(_nginx_proxy_string(port_spec))
-    location_string_spec += "\t \t } \n"
-    return location_string_spec
+    return ''.join(_nginx_location_lines(_nginx_proxy_string(port_spec), _proxy_settings(port_spec),
+                                         _nginx_proxy_host(port_spec)))
+
+def _nginx_location_lines(proxy_string, settings, proxy_host):
+    yield "\t \t location / { \n"
+    yield "\t \t \t {} \n".format(proxy_string)
+    for setting_string in _nginx_proxy_settings_strings(settings, proxy_host):
+        yield "\t \t \t {} \n".format(setting_string)
+    yield "\t \t } \n"
 
 def _nginx_listen_string(port_spec):
     return "listen {};".format(port_spec['host_port'])
@@ -15,25 +72,98 @@ def _nginx_listen_string(port_spec):
 def _nginx_server_name_string(port_spec):
     return "server_name {};".format(port_spec['host_address'])
 
-def _nginx_max_file_size_string():
-    return "client_max_body_size {};".format(NGINX_MAX_FILE_SIZE)
+def _nginx_max_file_size_string(settings):
+    return "client_max_body_size {};".format(settings['client_max_body_size'])
+
+def _nginx_gzip_strings(settings):
+    if not settings['gzip']:
+        return []
+    return ["gzip on;", "gzip_proxied any;", "gzip_types {};".format(' '.join(NGINX_GZIP_TYPES))]
 
 def _nginx_server_spec(port_spec):
     """This will output the nginx server config string for speicfic port spec """
-    server_string_spec = "\t server {\n"
-    server_string_spec += "\t \t {}\n".format(_nginx_max_file_size_string())
-    server_string_spec += "\t \t {}\n".format(_nginx_listen_string(port_spec))
-    server_string_spec += "\t \t {}\n".format(_nginx_server_name_string(port_spec))
-    server_string_spec += _nginx_location_spec(port_spec)
-    server_string_spec += "\t }\n"
-    return server_string_spec
+    return ''.join(_nginx_server_lines(_NginxServer(port_spec, _proxy_settings(port_spec), 0)))
+
+class _NginxServer(object):
+    """The port specs served by one server block: those listening on the
+    same host port with the same proxy settings. A server with several host
+    names picks the upstream, and the Host header to send it, from the
+    request's host with a pair of maps."""
+    def __init__(self, port_spec, settings, index):
+        self.host_port = port_spec['host_port']
+        self.settings = settings
+        self.port_specs = [port_spec]
+        self.variable_suffix = '{}_{}'.format(re.sub(r'[^A-Za-z0-9_]', '_', str(self.host_port)), index)
+
+    @property
+    def uses_maps(self):
+        return len(self.port_specs) > 1
+
+def _group_into_servers(port_specs):
+    """Groups port specs into servers in a single pass, keeping the order in
+    which each listen port and group of settings first appears"""
+    servers = OrderedDict()
+    for port_spec in port_specs:
+        settings = _proxy_settings(port_spec)
+        key = (port_spec['host_port'], tuple(sorted(settings.iteritems())))
+        if key in servers:
+            servers[key].port_specs.append(port_spec)
+        else:
+            servers[key] = _NginxServer(port_spec, settings, len(servers))
+    return servers.values()
+
+def _nginx_map_lines(server):
+    """Requests for a host name not in the maps go to the server's first
+    port spec, as they went to the first server block on the port before"""
+    for variable, value_for in [('dusty_upstream', _nginx_upstream_name), ('dusty_proxy_host', _nginx_proxy_host)]:
+        yield "\t map $host ${}_{} {{\n".format(variable, server.variable_suffix)
+        yield "\t \t default {};\n".format(value_for(server.port_specs[0]))
+        for port_spec in server.port_specs:
+            yield "\t \t {} {};\n".format(port_spec['host_address'].lower(), value_for(port_spec))
+        yield "\t }\n"
+
+def _nginx_server_lines(server):
+    first_port_spec = server.port_specs[0]
+    yield "\t server {\n"
+    yield "\t \t {}\n".format(_nginx_max_file_size_string(server.settings))
+    yield "\t \t {}\n".format(_nginx_listen_string(first_port_spec))
+    yield "\t \t server_name {};\n".format(' '.join(port_spec['host_address'] for port_spec in server.port_specs))
+    for gzip_string in _nginx_gzip_strings(server.settings):
+        yield "\t \t {}\n".format(gzip_string)
+    if server.uses_maps:
+        proxy_string = "proxy_pass http://$dusty_upstream_{};".format(server.variable_suffix)
+        proxy_host = "$dusty_proxy_host_{}".format(server.variable_suffix)
+    else:
+        proxy_string, proxy_host = _nginx_proxy_string(first_port_spec), _nginx_proxy_host(first_port_spec)
+    for line in _nginx_location_lines(proxy_string, server.settings, proxy_host):
+        yield line
+    yield "\t }\n"
+
+def _nginx_configuration_lines(port_spec_dict):
+    servers = _group_into_servers(port_spec_dict['nginx'])
+    yield "http { \n"
+    if any(server.uses_maps for server in servers):
+        # The default hash sizes are too small for hundreds of host names
+        yield "\t server_names_hash_max_size {};\n".format(NGINX_HASH_MAX_SIZE)
+        yield "\t server_names_hash_bucket_size {};\n".format(NGINX_HASH_BUCKET_SIZE)
+        yield "\t map_hash_max_size {};\n".format(NGINX_HASH_MAX_SIZE)
+        yield "\t map_hash_bucket_size {};\n".format(NGINX_HASH_BUCKET_SIZE)
+    for server in servers:
+        for port_spec in server.port_specs:
+            for line in _nginx_upstream_lines(port_spec, server.settings):
+                yield line
+    for server in servers:
+        if server.uses_maps:
+            for line in _nginx_map_lines(server):
+                yield line
+    for server in servers:
+        for line in _nginx_server_lines(server):
+            yield line
+    yield "}\n"
 
 def get_nginx_configuration_spec(port_spec_dict):
     """This function will take in a port spec as specified by the port_spec compiler and
     will output an nginx web proxy config string. This string can then be written to a file
-    and used running nginx """
-    nginx_string_spec = "http { \n"
-    for port_spec in port_spec_dict['nginx']:
-        nginx_string_spec += _nginx_server_spec(port_spec)
-    nginx_string_spec += "}\n"
-    return nginx_string_spec
+    and used running nginx. Port specs listening on the same host port, with the same proxy
+    settings, share a single server block."""
+    return ''.join(_nginx_configuration_lines(port_spec_dict))
@@ -1,5 +1,7 @@
 from ...constants import LOCALHOST
+from ...schemas.base_schema_class import thaw
 from ...systems.virtualbox import get_docker_vm_ip
+from .allocations import allocation_key, load_port_allocations, save_port_allocations
 
 class ReusedHostFullAddress(Exception):
     pass
@@ -11,11 +13,13 @@ def _docker_compose_port_spec(host_forwarding_spec, host_port):
     return {'in_container_port': str(host_forwarding_spec['container_port']),
             'mapped_host_port': str(host_port)}
 
-def _nginx_port_spec(host_forwarding_spec, port, boot2docker_ip):
+def _nginx_port_spec(host_forwarding_spec, port, boot2docker_ip, app_name=None, proxy_settings=None):
     return {'proxied_port': str(port),
             'boot2docker_ip': boot2docker_ip,
             'host_address': host_forwarding_spec['host_name'],
-            'host_port': str(host_forwarding_spec['host_port'])}
+            'host_port': str(host_forwarding_spec['host_port']),
+            'app_name': app_name,
+            'proxy_settings': proxy_settings or {}}
 
 def _hosts_file_port_spec(host_forwarding_spec):
     return {'forwarded_ip': LOCALHOST,
@@ -42,26 +46,34 @@ def add_host_names(host_forwarding_spec, port_mappings, host_names):
 def get_port_spec_document(expanded_active_specs, boot2docker_ip):
     """ Given a dictionary containing the expanded dusty DAG specs this function will
     return a dictionary containing the port mappings needed by downstream methods.  Currently
-    this includes docker_compose, virtualbox, nginx and hosts_file."""
-    forwarding_port = 65000
+    this includes docker_compose, virtualbox, nginx and hosts_file. Forwarding ports come from
+    the saved port allocations, so each host_forwarding entry keeps its port between runs."""
     port_spec = {'docker_compose':{}, 'nginx':[], 'hosts_file':[]}
     host_full_addresses = set()
     host_names = set()
+    allocations = load_port_allocations()
     # No matter the order of apps in expanded_active_specs, we want to produce a consistent
     # port_spec with respect to the apps and the ports they are outputted on
-    for app_name in sorted(expanded_active_specs['apps'].keys()):
-        app_spec = expanded_active_specs['apps'][app_name]
-        if 'host_forwarding' not in app_spec:
-            continue
+    forwarding_apps = [(app_name, expanded_active_specs['apps'][app_name])
+                       for app_name in sorted(expanded_active_specs['apps'].keys())
+                       if 'host_forwarding' in expanded_active_specs['apps'][app_name]]
+    # Free the ports of inactive apps first, so new entries can reuse them
+    allocations.release_all_except(set(allocation_key(app_name, host_forwarding_spec)
+                                       for app_name, app_spec in forwarding_apps
+                                       for host_forwarding_spec in app_spec['host_forwarding']))
+    for app_name, app_spec in forwarding_apps:
         port_spec['docker_compose'][app_name] = []
+        proxy_settings = thaw(app_spec['nginx'])
         container_ports = set()
         for host_forwarding_spec in app_spec['host_forwarding']:
             add_full_addresses(host_forwarding_spec, host_full_addresses)
             add_container_ports(host_forwarding_spec, container_ports)
 
+            forwarding_port = allocations.port_for(allocation_key(app_name, host_forwarding_spec))
             port_spec['docker_compose'][app_name].append(_docker_compose_port_spec(host_forwarding_spec, forwarding_port))
-            port_spec['nginx'].append(_nginx_port_spec(host_forwarding_spec, forwarding_port, boot2docker_ip))
+            port_spec['nginx'].append(_nginx_port_spec(host_forwarding_spec, forwarding_port, boot2docker_ip,
+                                                         app_name, proxy_settings))
 
             add_host_names(host_forwarding_spec, port_spec, host_names)
-            forwarding_port += 1
+    save_port_allocations(allocations)
     return port_spec
@@ -0,0 +1,82 @@
+"""The table of VM ports Dusty forwards to each app's host_forwarding
+entries. It is saved at PORT_ALLOCATIONS_PATH, so an app keeps its
+forwarding ports when other apps are added or removed, and the ports
+of apps which are no longer active are handed out again."""
+
+import heapq
+import cPickle
+import logging
+
+from ...path import atomic_write
+from ... import constants
+
+FIRST_FORWARDING_PORT = 65000
+
+def allocation_key(app_name, host_forwarding_spec):
+    return (app_name, host_forwarding_spec['host_name'],
+            host_forwarding_spec['host_port'], host_forwarding_spec['container_port'])
+
+class PortAllocations(object):
+    """Maps allocation keys to forwarding ports and forwarding ports back
+    to keys, so finding a key's port and checking whether a port is taken
+    are both dictionary lookups. Free ports below the highest port handed
+    out are kept in a heap, and the lowest one is always handed out first."""
+    def __init__(self, ports_by_key=None):
+        self.ports_by_key = {}
+        self.keys_by_port = {}
+        self.changed = False
+        for key, port in sorted((ports_by_key or {}).iteritems(), key=lambda item: item[1]):
+            # Each port can only be forwarded to one place; drop any
+            # later claims on it and allocate those keys again
+            if port >= FIRST_FORWARDING_PORT and port not in self.keys_by_port:
+                self._assign(key, port)
+            else:
+                self.changed = True
+        self.next_port = max(self.keys_by_port) + 1 if self.keys_by_port else FIRST_FORWARDING_PORT
+        self.free_ports = [port for port in xrange(FIRST_FORWARDING_PORT, self.next_port) if port not in self.keys_by_port]
+        heapq.heapify(self.free_ports)
+
+    def _assign(self, key, port):
+        self.ports_by_key[key] = port
+        self.keys_by_port[port] = key
+
+    def _free_port(self):
+        while self.free_ports:
+            port = heapq.heappop(self.free_ports)
+            if port not in self.keys_by_port:
+                return port
+        port = self.next_port
+        self.next_port += 1
+        return port
+
+    def port_for(self, key):
+        """Returns the port allocated to key, allocating one if needed"""
+        if key not in self.ports_by_key:
+            self._assign(key, self._free_port())
+            self.changed = True
+        return self.ports_by_key[key]
+
+    def release_all_except(self, keys):
+        """Frees the port of every key not in `keys`"""
+        for key in [key for key in self.ports_by_key if key not in keys]:
+            port = self.ports_by_key.pop(key)
+            del self.keys_by_port[port]
+            heapq.heappush(self.free_ports, port)
+            self.changed = True
+
+def load_port_allocations():
+    try:
+        with open(constants.PORT_ALLOCATIONS_PATH, 'rb') as f:
+            ports_by_key = cPickle.load(f)
+    except Exception:
+        ports_by_key = None
+    return PortAllocations(ports_by_key if isinstance(ports_by_key, dict) else None)
+
+def save_port_allocations(allocations):
+    if not allocations.changed:
+        return
+    try:
+        atomic_write(constants.PORT_ALLOCATIONS_PATH,
+                     cPickle.dumps(allocations.ports_by_key, cPickle.HIGHEST_PROTOCOL))
+    except (IOError, OSError) as e:
+        logging.debug('Could not save port allocations: {}'.format(e))
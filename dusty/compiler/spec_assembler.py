@@ -1,5 +1,7 @@
+import os
 import logging
 
+from ..cache import cached, glob_fingerprint
 from ..config import get_config_value
 from .. import constants
 from ..source import Repo
@@ -7,54 +9,62 @@ from ..schemas.app_schema import app_schema
 from ..schemas.bundle_schema import bundle_schema
 from ..schemas.lib_schema import lib_schema
 from ..schemas.base_schema_class import DustySchema, DustySpecs
+from ..schemas.dependency_graph import DependencyGraph
 
-def _get_dependent(dependent_type, name, specs, root_spec_type):
+def get_dependency_graph(specs):
+    """
+    Returns the DependencyGraph for specs. A loaded DustySpecs builds its graph once and keeps it
+    """
+    if isinstance(specs, DustySpecs):
+        return specs.dependency_graph
+    return DependencyGraph(specs)
+
+def _get_dependent(dependent_type, name, specs, root_spec_type, graph=None):
     """
     Returns everything of type <dependent_type> that <name>, of type <root_spec_type> depends on
     Names only are returned in a set
     """
-    spec = specs[root_spec_type].get(name)
-    if spec is None:
-        raise RuntimeError("{} {} was referenced but not found".format(root_spec_type, name))
-    dependents = spec['depends'][dependent_type]
-    all_dependents = set(dependents)
-    for dep in dependents:
-        all_dependents |= _get_dependent(dependent_type, dep, specs, dependent_type)
-    return all_dependents
+    graph = graph or get_dependency_graph(specs)
+    return set(graph.dependencies(root_spec_type, name, dependent_type))
 
-def _get_active_bundles(specs):
+def _get_active_bundles(specs, graph=None):
     return set(get_config_value(constants.CONFIG_BUNDLES_KEY))
 
-def _get_referenced_apps(specs):
+def _get_referenced_apps(specs, graph=None):
     """
     Returns a set of all apps that are required to run any bundle in specs[constants.CONFIG_BUNDLES_KEY]
     """
-    activated_bundles = specs[constants.CONFIG_BUNDLES_KEY].keys()
+    graph = graph or get_dependency_graph(specs)
     all_active_apps = set()
-    for active_bundle in activated_bundles:
-        bundle_spec = specs[constants.CONFIG_BUNDLES_KEY].get(active_bundle)
+    for bundle_spec in specs[constants.CONFIG_BUNDLES_KEY].values():
         for app_name in bundle_spec['apps']:
             all_active_apps.add(app_name)
-            all_active_apps |= _get_dependent('apps', app_name, specs, 'apps')
+            all_active_apps.update(graph.dependencies('apps', app_name, 'apps'))
     return all_active_apps
 
-def _expand_libs_in_apps(specs):
-    """
-    Expands specs.apps.depends.libs to include any indirectly required libs
-    """
-    for app_name, app_spec in specs['apps'].iteritems():
-        if 'depends' in app_spec and 'libs' in app_spec['depends']:
-            app_spec['depends']['libs'] = _get_dependent('libs', app_name, specs, 'apps')
+def _with_expanded_libs(spec, libs):
+    return spec.evolve(depends=dict(spec['depends'], libs=libs))
 
-def _expand_libs_in_libs(specs):
+def _expand_libs(spec_type, specs, graph=None):
     """
-    Expands specs.libs.depends.libs to include any indirectly required libs
+    Returns specs[spec_type] with depends.libs expanded to include any indirectly required libs,
+    ordered so that each lib comes after the libs it depends on
     """
-    for lib_name, lib_spec in specs['libs'].iteritems():
-        if 'depends' in lib_spec and 'libs' in lib_spec['depends']:
-            lib_spec['depends']['libs'] = _get_dependent('libs', lib_name, specs, 'libs')
+    graph = graph or get_dependency_graph(specs)
+    expanded = {}
+    for name, spec in specs[spec_type].iteritems():
+        if 'depends' in spec and 'libs' in spec['depends']:
+            spec = _with_expanded_libs(spec, graph.dependencies(spec_type, name, 'libs'))
+        expanded[name] = spec
+    return expanded
+
+def _expand_libs_in_apps(specs, graph=None):
+    return _expand_libs('apps', specs, graph)
+
+def _expand_libs_in_libs(specs, graph=None):
+    return _expand_libs('libs', specs, graph)
 
-def _get_referenced_libs(specs):
+def _get_referenced_libs(specs, graph=None):
     """
     Returns all libs that are referenced in specs.apps.depends.libs
     """
@@ -64,7 +74,7 @@ def _get_referenced_libs(specs):
             active_libs.add(lib)
     return active_libs
 
-def _get_referenced_services(specs):
+def _get_referenced_services(specs, graph=None):
     """
     Returns all services that are referenced in specs.apps.depends.services
     """
@@ -74,35 +84,42 @@ def _get_referenced_services(specs):
             active_services.add(service)
     return active_services
 
-def _filter_active(spec_type, specs):
+def _filter_active(spec_type, specs, graph=None):
+    """
+    Returns the specs of the given type which are needed by the activated bundles
+    """
     get_referenced = {
         constants.CONFIG_BUNDLES_KEY: _get_active_bundles,
         'apps': _get_referenced_apps,
         'libs': _get_referenced_libs,
         'services': _get_referenced_services
     }
-    active = get_referenced[spec_type](specs)
-    all_specs = specs[spec_type].keys()
-    for item_name in all_specs:
-        if item_name not in active:
-            del specs[spec_type][item_name]
-    logging.info("Spec Assembler: filtered active {} to {}".format(spec_type, set(specs[spec_type].keys())))
+    active = get_referenced[spec_type](specs, graph)
+    filtered = dict((name, spec) for name, spec in specs[spec_type].iteritems() if name in active)
+    logging.info("Spec Assembler: filtered active {} to {}".format(spec_type, set(filtered.keys())))
+    return filtered
 
 def _get_expanded_active_specs(specs):
     """
-    This function removes any unnecessary bundles, apps, libs, and services that aren't needed by
+    This function returns only the bundles, apps, libs, and services that are needed by
     the activated_bundles.  It also expands inside specs.apps.depends.libs all libs that are needed
-    indirectly by each app
+    indirectly by each app. The given specs are not modified.
     """
-    _filter_active(constants.CONFIG_BUNDLES_KEY, specs)
-    _filter_active('apps', specs)
-    _expand_libs_in_apps(specs)
-    _filter_active('libs', specs)
-    _filter_active('services', specs)
+    graph = get_dependency_graph(specs)
+    expanded = dict(specs)
+    expanded[constants.CONFIG_BUNDLES_KEY] = _filter_active(constants.CONFIG_BUNDLES_KEY, expanded, graph)
+    expanded['apps'] = _filter_active('apps', expanded, graph)
+    expanded['apps'] = _expand_libs_in_apps(expanded, graph)
+    expanded['libs'] = _filter_active('libs', expanded, graph)
+    expanded['services'] = _filter_active('services', expanded, graph)
+    return DustySpecs.view(expanded, graph)
 
 def _get_expanded_libs_specs(specs):
-    _expand_libs_in_apps(specs)
-    _expand_libs_in_libs(specs)
+    graph = get_dependency_graph(specs)
+    expanded = dict(specs)
+    expanded['apps'] = _expand_libs_in_apps(specs, graph)
+    expanded['libs'] = _expand_libs_in_libs(specs, graph)
+    return DustySpecs.view(expanded, graph)
 
 def get_expected_number_of_running_containers():
     """ This will return the number of containers expected to be running based off of
@@ -110,16 +127,22 @@ def get_expected_number_of_running_containers():
     assembled_specs = get_assembled_specs()
     return len(assembled_specs['apps']) + len(assembled_specs['services'])
 
+def _specs_fingerprint():
+    specs_path = get_specs_path()
+    return (specs_path, glob_fingerprint(*[os.path.join(specs_path, spec_type, '*.yml')
+                                           for spec_type in ['bundles', 'apps', 'libs', 'services']]))
+
+def _assembled_specs_fingerprint():
+    return (_specs_fingerprint(), sorted(get_config_value(constants.CONFIG_BUNDLES_KEY)))
+
+@cached(_assembled_specs_fingerprint)
 def get_assembled_specs():
     logging.info("Spec Assembler: running...")
-    specs = get_specs()
-    _get_expanded_active_specs(specs)
-    return specs
+    return _get_expanded_active_specs(get_specs())
 
+@cached(_specs_fingerprint)
 def get_expanded_libs_specs():
-    specs = get_specs()
-    _get_expanded_libs_specs(specs)
-    return specs
+    return _get_expanded_libs_specs(get_specs())
 
 def get_specs_repo():
     return Repo(get_config_value(constants.CONFIG_SPECS_REPO_KEY))
@@ -127,6 +150,7 @@ def get_specs_repo():
 def get_specs_path():
     return get_specs_repo().local_path
 
+@cached(_specs_fingerprint)
 def get_specs():
     specs_path = get_specs_path()
     return get_specs_from_path(specs_path)
@@ -1,6 +1,11 @@
 """Module for handling the daemon config file stored at CONFIG_PATH.
 This file determines the bundles the user currently wants active, as well
-as the location of the Dusty specifications on disk."""
+as the location of the Dusty specifications on disk.
+
+The parsed config is cached until the file changes on disk. All writes
+go through `update_config`, which holds a lock for its read-modify-write
+and replaces the file atomically, so concurrent commands never see or
+produce a half-written config."""
 
 from __future__ import absolute_import
 
@@ -10,10 +15,14 @@ import pwd
 import subprocess
 import yaml
 import platform
+import threading
+from copy import deepcopy
 
 import psutil
 
 from . import constants
+from .cache import cached, path_fingerprint
+from .path import atomic_write
 from .warnings import daemon_warnings
 
 def _load(filepath):
@@ -23,6 +32,8 @@ def _load(filepath):
 def _dump(doc):
     return yaml.dump(doc, default_flow_style=False)
 
+_config_lock = threading.RLock()
+
 def write_default_config():
     default_config = {constants.CONFIG_BUNDLES_KEY: [],
                       constants.CONFIG_REPO_OVERRIDES_KEY: {},
@@ -30,25 +41,37 @@ def write_default_config():
                       constants.CONFIG_SETUP_KEY: False}
     save_config(default_config)
 
-def get_config():
+def _config_fingerprint():
+    return (constants.CONFIG_PATH, path_fingerprint(constants.CONFIG_PATH))
+
+@cached(_config_fingerprint)
+def _cached_config():
     return _load(constants.CONFIG_PATH)
 
+def get_config():
+    return deepcopy(_cached_config())
+
 def save_config(config):
-    with open(constants.CONFIG_PATH, 'w') as f:
-        f.write(_dump(config))
+    with _config_lock:
+        atomic_write(constants.CONFIG_PATH, _dump(config))
+        _cached_config.invalidate()
 
 def get_config_value(key):
-    return get_config().get(key)
-
-def save_config_value(key, value):
-    current_config = get_config()
-    current_config[key] = value
-    if key == constants.CONFIG_MAC_USERNAME_KEY:
-        verify_mac_username(value)
+    return deepcopy(_cached_config().get(key))
+
+def update_config(**values):
+    """Set several config keys at once with a single write of the config file."""
+    if constants.CONFIG_MAC_USERNAME_KEY in values:
+        verify_mac_username(values[constants.CONFIG_MAC_USERNAME_KEY])
+    with _config_lock:
+        current_config = get_config()
+        current_config.update(values)
         save_config(current_config)
+    if constants.CONFIG_MAC_USERNAME_KEY in values:
         check_and_load_ssh_auth()
-    else:
-        save_config(current_config)
+
+def save_config_value(key, value):
+    update_config(**{key: value})
 
 def refresh_config_warnings():
     daemon_warnings.clear_namespace('config')
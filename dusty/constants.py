@@ -2,35 +2,88 @@ import os
 
 VERSION = '0.1.1'
 
-SOCKET_TERMINATOR = '\0\0'
-SOCKET_ERROR_TERMINATOR = '\0\1'
-
 LOCALHOST = "127.0.0.1"
 
 SOCKET_LOGGER_NAME = 'socket_logger'
 
+DAEMON_WORKER_THREADS = 8
+DAEMON_SOCKET_BACKLOG = 32
+DAEMON_MAX_FINISHED_JOBS = 20
+
+# Seconds a daemon command may run before it is cancelled, unless the
+# command sets its own deadline with dusty.payload.deadline
+DAEMON_COMMAND_DEADLINE = 60 * 60
+DAEMON_READ_ONLY_COMMAND_DEADLINE = 5 * 60
+# Seconds a cancelled subprocess gets to exit after SIGTERM before
+# its process group is sent SIGKILL
+SUBPROCESS_KILL_GRACE_PERIOD = 0.5
+# Seconds the client waits for a cancelled command to stop
+CLIENT_CANCEL_TIMEOUT = 1
+# Seconds a single command run inside the VM over `boot2docker ssh` may take
+VM_COMMAND_TIMEOUT = 120
+
 RUN_DIR = '/var/run/dusty'
 SOCKET_PATH = os.path.join(RUN_DIR, 'dusty.sock')
-FIRST_RUN_FILE_PATH = os.path.join(RUN_DIR, 'docker_first_time_started')
 
 CONFIG_DIR = '/etc/dusty'
 CONFIG_PATH = os.path.join(CONFIG_DIR, 'config.yml')
 REPOS_DIR = os.path.join(CONFIG_DIR, 'repos')
 COMPOSE_DIR = os.path.join(CONFIG_DIR, 'compose')
 COMPOSEFILE_PATH = os.path.join(COMPOSE_DIR, 'docker-compose.yml')
+COMPILED_OUTPUTS_PATH = os.path.join(COMPOSE_DIR, 'compiled_outputs.pickle')
+SPECS_CACHE_PATH = os.path.join(CONFIG_DIR, 'specs_cache.pickle')
+# Kept per user, since `dusty validate <path>` runs in the unprivileged client
+VALIDATION_STATE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                                    'dusty', 'validation_state')
+PORT_ALLOCATIONS_PATH = os.path.join(CONFIG_DIR, 'port_allocations.pickle')
+# Spec files are parsed in parallel when at least this many need parsing at once
+SPECS_PARALLEL_LOAD_THRESHOLD = 200
+SPECS_PARALLEL_POLL_INTERVAL = 0.1
 
 NGINX_MAX_FILE_SIZE = "500M"
+# Defaults for the proxy settings an app can override under `nginx` in its spec
+NGINX_UPSTREAM_KEEPALIVE = 16
+NGINX_PROXY_CONNECT_TIMEOUT = 5
+NGINX_PROXY_READ_TIMEOUT = 300
+NGINX_PROXY_BUFFER_SIZE = "16k"
+NGINX_PROXY_BUFFERS = "32 16k"
+NGINX_GZIP_TYPES = ['text/plain', 'text/css', 'text/xml', 'application/javascript', 'application/json',
+                    'application/xml', 'image/svg+xml']
+# Hash sizes for the server_name and map tables, once servers route several host names
+NGINX_HASH_MAX_SIZE = 4096
+NGINX_HASH_BUCKET_SIZE = 128
+
+VM_NAME = 'boot2docker-vm'
 
 VM_PERSIST_DIR = '/persist'
 VM_REPOS_DIR = os.path.join(VM_PERSIST_DIR, 'repos')
 
 VM_CP_DIR = '/cp'
+# Records which `once` commands each app has run, so they aren't run again
+# when its container is recreated
+VM_ONCE_MARKERS_DIR = os.path.join(VM_PERSIST_DIR, 'once_markers')
+CONTAINER_ONCE_MARKERS_DIR = '/var/lib/dusty/once'
 CONTAINER_CP_DIR = '/cp'
 
+# Each app's image with the installs of its libs baked in, and the markers
+# inside it recording when each lib was last installed
+LIB_INSTALLS_IMAGE_PREFIX = 'dusty/lib_installs_'
+CONTAINER_LIB_INSTALLS_DIR = '/var/lib/dusty/lib_installs'
+# Directories left out when fingerprinting a lib's code to decide whether
+# its install needs to be baked again
+LIB_FINGERPRINT_IGNORED_DIRS = ['.git', '.hg', '.svn', 'node_modules', 'bower_components',
+                                '__pycache__', '.tox', '.venv', 'venv']
+
 GIT_USER = 'git'
 
 HOSTS_PATH = '/etc/hosts'
 
+DNS_RESPONDER_PORT = 53
+# Answers are never cached, so routing changes are picked up immediately
+DNS_RESPONDER_TTL = 0
+DNS_RESPONDER_POLL_INTERVAL = 0.5
+DNS_RESPONDER_MAX_QUERY_SIZE = 4096
+
 VIRTUALBOX_RULE_PREFIX = 'dusty'
 
 SYSTEM_DEPENDENCY_VERSIONS = {
@@ -49,6 +102,7 @@ CONFIG_MAC_USERNAME_KEY = 'mac_username'
 CONFIG_SPECS_REPO_KEY = 'specs_repo'
 CONFIG_NGINX_DIR_KEY = 'nginx_includes_dir'
 CONFIG_SETUP_KEY = 'setup_has_run'
+CONFIG_DNS_RESPONDER_KEY = 'dns_responder_address'
 
 CONFIG_SETTINGS = {
     CONFIG_BUNDLES_KEY: 'All currently activated bundles. These are the bundles that Dusty will set up for you when you run "dusty up".',
@@ -56,7 +110,8 @@ CONFIG_SETTINGS = {
     CONFIG_MAC_USERNAME_KEY: 'The user on the host OS who will own and be able to access the boot2docker VM. Dusty runs all VirtualBox, boot2docker, Docker, and Docker Compose commands as this user.',
     CONFIG_SPECS_REPO_KEY: 'This repository is used for storing the specs used by Dusty.  It is managed the same way as other repos',
     CONFIG_NGINX_DIR_KEY: 'This is the location that your nginx config will import extra files from.  Dusty\'s nginx config will be stored here',
-    CONFIG_SETUP_KEY: 'Key indicating if you have run the required command `dusty setup`'
+    CONFIG_SETUP_KEY: 'Key indicating if you have run the required command `dusty setup`',
+    CONFIG_DNS_RESPONDER_KEY: 'If set, e.g. to 127.0.0.1:53, the daemon answers DNS queries for your Dusty host names at this address instead of Dusty adding them to your hosts file. Your resolver must be pointed at this address for the domains you use.'
 }
 
 WARN_ON_MISSING_CONFIG_KEYS = [CONFIG_MAC_USERNAME_KEY, CONFIG_SPECS_REPO_KEY, CONFIG_NGINX_DIR_KEY]
@@ -12,15 +12,28 @@ import os
 import atexit
 import logging
 import socket
+import threading
+import Queue
+from contextlib import contextmanager
 
 from docopt import docopt
 
 from .preflight import preflight_check
-from .log import configure_logging, make_socket_logger, close_socket_logger
-from .constants import SOCKET_PATH, SOCKET_TERMINATOR, SOCKET_ERROR_TERMINATOR
+from .log import configure_logging, make_client_logger, close_client_logger, log_to_client
+from .constants import (SOCKET_PATH, DAEMON_WORKER_THREADS, DAEMON_SOCKET_BACKLOG,
+                        DAEMON_COMMAND_DEADLINE, DAEMON_READ_ONLY_COMMAND_DEADLINE)
 from .payload import Payload
+from .jobs import Job, JobCancelled, daemon_jobs, set_current_job, current_job
+from . import protocol
 from .warnings import daemon_warnings
 from .config import refresh_config_warnings
+from .compiler import artifacts
+from .systems import dns
+
+# Commands which change the Dusty environment (bringing containers up,
+# rewriting config, syncing repos) are run one at a time. Read-only
+# commands skip this lock so they are served while a long command runs.
+_mutating_command_lock = threading.Lock()
 
 def _clean_up_existing_socket(socket_path):
     try:
@@ -29,9 +42,146 @@ def _clean_up_existing_socket(socket_path):
         if os.path.exists(socket_path):
             raise
 
-def _send_warnings_to_client(connection, suppress_warnings):
+def _send_warnings_to_client(job, suppress_warnings):
     if daemon_warnings.has_warnings and not suppress_warnings:
-        connection.sendall("{}\n".format(daemon_warnings.pretty()))
+        job.send_message(protocol.WARNING, daemon_warnings.pretty())
+
+@contextmanager
+def _command_lock(fn):
+    if getattr(fn, 'read_only', False):
+        yield
+        return
+    if not _mutating_command_lock.acquire(False):
+        log_to_client('Waiting for another Dusty command to finish...')
+        job = current_job()
+        while not _mutating_command_lock.acquire(False):
+            if job is not None and job.wait_for_cancel(0.1):
+                raise JobCancelled(job.cancel_reason)
+    try:
+        yield
+    finally:
+        _mutating_command_lock.release()
+
+def _command_deadline(fn):
+    default = DAEMON_READ_ONLY_COMMAND_DEADLINE if getattr(fn, 'read_only', False) else DAEMON_COMMAND_DEADLINE
+    return getattr(fn, 'deadline', default)
+
+def _start_deadline_timer(job, fn):
+    deadline = _command_deadline(fn)
+    timer = threading.Timer(deadline, job.cancel,
+                            args=('Command timed out after {} seconds'.format(deadline),))
+    timer.daemon = True
+    timer.start()
+    return timer
+
+def _finish_cancelled_job(job):
+    logging.info('Job {} cancelled: {}'.format(job.id, job.cancel_reason))
+    job.run_rollbacks()
+    job.finish(Job.CANCELLED, protocol.ERROR, job.cancel_reason)
+
+def _run_job(job, fn, args, kwargs, suppress_warnings):
+    set_current_job(job)
+    make_client_logger(job)
+    deadline_timer = _start_deadline_timer(job, fn)
+    try:
+        _send_warnings_to_client(job, suppress_warnings)
+        with _command_lock(fn):
+            fn(*args, **kwargs)
+    except Exception as e:
+        if job.cancelled:
+            _finish_cancelled_job(job)
+            return
+        logging.exception("Daemon encountered exception while processing command")
+        error_msg = e.message if e.message else str(e)
+        _send_warnings_to_client(job, suppress_warnings)
+        job.finish(Job.FAILED, protocol.ERROR, error_msg)
+    else:
+        job.finish(Job.SUCCEEDED, protocol.RESULT)
+    finally:
+        deadline_timer.cancel()
+        close_client_logger()
+        set_current_job(None)
+
+def _start_job(command, suppress_warnings):
+    fn, args, kwargs = Payload.deserialize(command)
+    logging.info('Received command. fn: {} args: {} kwargs: {}'.format(fn.__name__, args, kwargs))
+    job = daemon_jobs.create(' '.join([fn.__name__] + [str(arg) for arg in args]))
+    job_thread = threading.Thread(target=_run_job,
+                                  args=(job, fn, args, kwargs, suppress_warnings),
+                                  name='DustyJob-{}'.format(job.id))
+    job_thread.daemon = True
+    job_thread.start()
+    return job
+
+def _watch_for_cancel(connection, job):
+    try:
+        kind, body = protocol.recv_message(connection)
+    except (protocol.ConnectionClosed, socket.error):
+        return
+    if kind == protocol.CANCEL:
+        job.cancel('Job cancelled by client')
+    else:
+        logging.warning('Ignoring unexpected message of kind {!r}'.format(kind))
+
+def _stream_job_output(connection, job):
+    """Send the job's output to the client until the job finishes. If the
+    client goes away, the job keeps running and its output stays buffered.
+    If the client sends CANCEL instead, the job is cancelled."""
+    watcher = threading.Thread(target=_watch_for_cancel, args=(connection, job),
+                               name='DustyCancelWatcher-{}'.format(job.id))
+    watcher.daemon = True
+    watcher.start()
+    try:
+        for kind, body in job.follow():
+            protocol.send_message(connection, kind, body)
+    except socket.error:
+        logging.info('Client stopped following job {}'.format(job.id))
+
+def _handle_connection(connection, suppress_warnings):
+    try:
+        kind, body = protocol.recv_message(connection)
+        if kind in (protocol.COMMAND, protocol.DETACH):
+            job = _start_job(body, suppress_warnings)
+        elif kind == protocol.ATTACH:
+            try:
+                job = daemon_jobs.get(body)
+            except KeyError as e:
+                protocol.send_message(connection, protocol.ERROR, e.message)
+                return
+        else:
+            logging.warning('Ignoring unexpected message of kind {!r}'.format(kind))
+            return
+        protocol.send_message(connection, protocol.JOB, job.id)
+        if kind != protocol.DETACH:
+            _stream_job_output(connection, job)
+    except protocol.ConnectionClosed:
+        pass
+    finally:
+        _close_connection(connection)
+
+def _close_connection(connection):
+    # Shutting down wakes up any thread still blocked reading from the connection
+    try:
+        connection.shutdown(socket.SHUT_RDWR)
+    except socket.error:
+        pass
+    connection.close()
+
+def _serve_connections(connection_queue, suppress_warnings):
+    while True:
+        connection = connection_queue.get()
+        try:
+            _handle_connection(connection, suppress_warnings)
+        except:
+            logging.exception('Exception while handling connection')
+
+def _start_worker_threads(connection_queue, suppress_warnings):
+    for i in range(DAEMON_WORKER_THREADS):
+        worker = threading.Thread(target=_serve_connections,
+                                  args=(connection_queue, suppress_warnings),
+                                  name='DustyWorker-{}'.format(i))
+        worker.daemon = True
+        worker.start()
 
 def _listen_on_socket(socket_path, suppress_warnings):
     _clean_up_existing_socket(socket_path)
@@ -39,39 +189,33 @@ def _listen_on_socket(socket_path, suppress_warnings):
     sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     sock.bind(socket_path)
     os.chmod(socket_path, 0777) # don't delete the 0, it makes Python interpret this as octal
-    sock.listen(1)
+    sock.listen(DAEMON_SOCKET_BACKLOG)
     logging.info('Listening on socket at {}'.format(socket_path))
 
+    connection_queue = Queue.Queue()
+    _start_worker_threads(connection_queue, suppress_warnings)
+
     while True:
         try:
             connection, client_address = sock.accept()
-            make_socket_logger(connection)
-            try:
-                while True:
-                    data = connection.recv(1024)
-                    if not data:
-                        break
-                    fn, args, kwargs = Payload.deserialize(data)
-                    logging.info('Received command. fn: {} args: {} kwargs: {}'.format(fn.__name__, args, kwargs))
-                    try:
-                        _send_warnings_to_client(connection, suppress_warnings)
-                        fn(*args, **kwargs)
-                    except Exception as e:
-                        logging.exception("Daemon encountered exception while processing command")
-                        error_msg = e.message if e.message else str(e)
-                        _send_warnings_to_client(connection, suppress_warnings)
-                        connection.sendall('ERROR: {}\n'.format(error_msg).encode('utf-8'))
-                        connection.sendall(SOCKET_ERROR_TERMINATOR)
-                    else:
-                        connection.sendall(SOCKET_TERMINATOR)
-            finally:
-                close_socket_logger()
-                connection.close()
+            connection_queue.put(connection)
         except KeyboardInterrupt:
             break
         except:
             logging.exception('Exception on socket listen')
 
+def _start_dns_responder():
+    """If the DNS responder is on, start it answering for the host
+    names of the last `dusty up`"""
+    try:
+        if not dns.dns_responder_enabled():
+            return
+        outputs = artifacts.load_last_compiled_outputs()
+        dns.update_dns_from_port_spec(outputs['port_spec'] if outputs is not None else {'hosts_file': []})
+    except RuntimeError as e:
+        logging.exception('Could not start the DNS responder')
+        daemon_warnings.warn('dns', e.message)
+
 def main():
     args = docopt(__doc__)
     configure_logging()
@@ -79,6 +223,7 @@ def main():
     if args['--preflight-only']:
         return
     refresh_config_warnings()
+    _start_dns_responder()
     _listen_on_socket(SOCKET_PATH, args['--suppress-warnings'])
 
 if __name__ == '__main__':
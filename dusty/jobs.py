@@ -0,0 +1,180 @@
+"""Commands run by the Dusty daemon are tracked as jobs. Each job
+buffers every message its command sends to the client, so a client
+can detach from a long-running command and reattach later without
+losing any of its output.
+
+Jobs can also be cancelled, either by the client or when they run past
+their deadline. Cancellation is cooperative: the job's subprocesses are
+killed through the cancel handlers they register, and the command stops
+at its next checkpoint (see `raise_if_cancelled`). Any rollbacks the
+command registered are then run to undo its partial changes."""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from . import constants
+
+_local = threading.local()
+
+class JobCancelled(Exception):
+    pass
+
+class Job(object):
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, job_id, description):
+        self.id = job_id
+        self.description = description
+        self.status = self.RUNNING
+        self.started_at = time.time()
+        self.finished_at = None
+        self.cancel_reason = None
+        self._messages = []
+        self._condition = threading.Condition()
+        self._cancelled = threading.Event()
+        self._cancel_handlers = []
+        self._rollbacks = []
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    @property
+    def duration(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def send_message(self, kind, body=''):
+        with self._condition:
+            self._messages.append((kind, body))
+            self._condition.notify_all()
+
+    def finish(self, status, kind, body=''):
+        """Record the job's final message and mark it as finished. Anyone
+        following the job's output receives the final message last."""
+        with self._condition:
+            self.status = status
+            self.finished_at = time.time()
+            self._messages.append((kind, body))
+            self._condition.notify_all()
+
+    def follow(self):
+        """Yield every (kind, body) message the job has sent so far, then
+        block and yield new messages as they arrive until the job finishes."""
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._messages) and not self.finished:
+                    self._condition.wait()
+                messages = self._messages[index:]
+                finished = self.finished and index + len(messages) == len(self._messages)
+            for message in messages:
+                yield message
+            index += len(messages)
+            if finished:
+                return
+
+    def cancel(self, reason='Job cancelled'):
+        with self._condition:
+            if self.finished or self.cancelled:
+                return
+            self.cancel_reason = reason
+            self._cancelled.set()
+            handlers = list(self._cancel_handlers)
+        logging.info('Cancelling job {}: {}'.format(self.id, reason))
+        for handler in handlers:
+            try:
+                handler()
+            except Exception:
+                logging.exception('Exception in cancel handler for job {}'.format(self.id))
+
+    def wait_for_cancel(self, timeout):
+        """Block for up to `timeout` seconds, returning True as soon
+        as the job is cancelled."""
+        self._cancelled.wait(timeout)
+        return self.cancelled
+
+    def add_cancel_handler(self, handler):
+        """Call `handler` if the job is cancelled while it is registered.
+        If the job has already been cancelled, it is called immediately."""
+        with self._condition:
+            if not self.cancelled:
+                self._cancel_handlers.append(handler)
+                return
+        handler()
+
+    def remove_cancel_handler(self, handler):
+        with self._condition:
+            if handler in self._cancel_handlers:
+                self._cancel_handlers.remove(handler)
+
+    def add_rollback(self, rollback):
+        self._rollbacks.append(rollback)
+
+    def run_rollbacks(self):
+        """Undo the job's partial changes, most recent first."""
+        while self._rollbacks:
+            rollback = self._rollbacks.pop()
+            try:
+                rollback()
+            except Exception:
+                logging.exception('Exception rolling back job {}'.format(self.id))
+
+class JobRegistry(object):
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def create(self, description):
+        with self._lock:
+            job = Job(str(self._next_id), description)
+            self._next_id += 1
+            self._jobs[job.id] = job
+            self._prune_finished_jobs()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            if job_id not in self._jobs:
+                raise KeyError('No job found with id {}'.format(job_id))
+            return self._jobs[job_id]
+
+    def all(self):
+        with self._lock:
+            return self._jobs.values()
+
+    def _prune_finished_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.iteritems() if job.finished]
+        for job_id in finished[:max(0, len(finished) - constants.DAEMON_MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+daemon_jobs = JobRegistry()
+
+def set_current_job(job):
+    _local.job = job
+
+def current_job():
+    """Return the job being run by the current thread, or None when
+    running outside of the daemon's jobs (e.g. in the client)."""
+    return getattr(_local, 'job', None)
+
+def raise_if_cancelled():
+    job = current_job()
+    if job is not None and job.cancelled:
+        raise JobCancelled(job.cancel_reason)
+
+def register_rollback(rollback):
+    """Register a function which undoes a change the current job just made.
+    Rollbacks only run if the job is cancelled."""
+    job = current_job()
+    if job is not None:
+        job.add_rollback(rollback)
@@ -1,42 +1,73 @@
 import sys
 import logging
 import logging.handlers
+import threading
+
 from .constants import SOCKET_PATH, SOCKET_LOGGER_NAME
+from .jobs import raise_if_cancelled
+from . import protocol
+
+handlers = {}
 
-handler = None
+class DustyClientHandler(logging.Handler):
+    """Sends log records to the output of a single command, such as a
+    daemon job. The daemon runs many commands at once, so each handler
+    only accepts records emitted by the thread which created it."""
+    def __init__(self, output):
+        super(DustyClientHandler, self).__init__()
+        self.output = output
+        self.thread_ident = threading.current_thread().ident
 
-class DustySocketHandler(logging.Handler):
-    def __init__(self, connection_socket):
-        super(DustySocketHandler, self).__init__()
-        self.connection_socket = connection_socket
+    def filter(self, record):
+        if record.thread != self.thread_ident:
+            return False
+        return super(DustyClientHandler, self).filter(record)
 
     def emit(self, record):
         msg = self.format(record)
-        self.connection_socket.sendall("{}\n".format(msg.encode('utf-8').strip()))
+        self.output.send_message(_message_kind(record), msg.strip())
+
+def _message_kind(record):
+    if getattr(record, 'progress', False):
+        return protocol.PROGRESS
+    if record.levelno >= logging.WARNING:
+        return protocol.WARNING
+    return protocol.LOG
 
 
 def configure_logging():
     logging.basicConfig(stream=sys.stdout,
                         level=logging.INFO,
-                        format='%(asctime)s %(levelname)s:%(name)s %(message)s',
+                        format='%(asctime)s %(levelname)s:%(name)s %(threadName)s %(message)s',
                         datefmt='%Y-%m-%d %H:%M:%S')
     logging.captureWarnings(True)
 
-def make_socket_logger(connection_socket):
-    global handler
+def make_client_logger(output):
+    """Send everything logged to the client by the current thread to
+    `output`, any object with a `send_message(kind, body)` method."""
     logger = logging.getLogger(SOCKET_LOGGER_NAME)
-    handler = DustySocketHandler(connection_socket)
+    handler = DustyClientHandler(output)
+    handlers[handler.thread_ident] = handler
     logger.addHandler(handler)
 
 def log_to_client(message):
     logger = logging.getLogger(SOCKET_LOGGER_NAME)
     logger.info(message)
 
-def close_socket_logger():
-    global handler
+def log_progress_to_client(message):
+    """Log a message marking a step of a long-running command. Clients
+    receive these as progress events rather than plain log lines.
+    Steps are safe points to stop at, so this raises JobCancelled
+    if the current job has been cancelled."""
+    raise_if_cancelled()
+    logger = logging.getLogger(SOCKET_LOGGER_NAME)
+    logger.info(message, extra={'progress': True})
+
+def close_client_logger():
     logger = logging.getLogger(SOCKET_LOGGER_NAME)
-    logger.removeHandler(handler)
-    handler = None
+    handler = handlers.pop(threading.current_thread().ident, None)
+    if handler is not None:
+        logger.removeHandler(handler)
 
 def configure_client_logging():
     logging.basicConfig(stream=sys.stdout,
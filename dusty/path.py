@@ -1,6 +1,8 @@
 import os
+import hashlib
+import tempfile
+
 from . import constants
-from .config import get_config_value
 
 def parent_dir(path):
     """Return the parent directory of a file or directory.
@@ -10,3 +12,35 @@ def parent_dir(path):
 
 def vm_cp_path(app_or_service_name):
     return os.path.join(constants.VM_CP_DIR, app_or_service_name)
+
+def vm_once_markers_path(app_name):
+    return os.path.join(constants.VM_ONCE_MARKERS_DIR, app_name)
+
+def validation_state_path(specs_path):
+    return os.path.join(constants.VALIDATION_STATE_DIR,
+                        '{}.pickle'.format(hashlib.sha1(specs_path).hexdigest()[:16]))
+
+def atomic_write(path, contents, mode=0644):
+    """Replace the file at `path` with `contents`. Readers see either the
+    old file or the new one, never a partially written file. The new file
+    keeps the permissions and, where we are allowed to, the owner of the
+    file it replaces, or gets `mode`."""
+    previous_stat = os.stat(path) if os.path.exists(path) else None
+    if previous_stat is not None:
+        mode = previous_stat.st_mode & 0777
+    fd, temp_path = tempfile.mkstemp(dir=parent_dir(path), prefix='.{}.'.format(os.path.basename(path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(contents)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        if previous_stat is not None:
+            try:
+                os.chown(temp_path, previous_stat.st_uid, previous_stat.st_gid)
+            except OSError:
+                pass
+        os.rename(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
@@ -1,21 +1,47 @@
 import cPickle
 
+def read_only(fn):
+    """Mark a daemon command as read-only. The daemon runs read-only
+    commands as soon as they arrive, even while a command which changes
+    the Dusty environment is still running."""
+    fn.read_only = True
+    return fn
+
+def deadline(seconds):
+    """Set how many seconds the daemon lets a command run before
+    cancelling it, overriding the daemon's default deadline."""
+    def _set_deadline(fn):
+        fn.deadline = seconds
+        return fn
+    return _set_deadline
+
 class Payload(object):
     def __init__(self, fn, *args, **kwargs):
         self.fn = fn
         self.args = args
         self.kwargs = kwargs
+        self.run_detached = False
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
             return self.fn == other.fn and self.args == other.args and self.kwargs == other.kwargs
         return False
 
+    @property
+    def read_only(self):
+        return getattr(self.fn, 'read_only', False)
+
     def serialize(self):
         doc = {'fn': self.fn, 'args': self.args, 'kwargs': sorted(self.kwargs.items())}
-        return cPickle.dumps(doc).encode('string_escape')
+        return cPickle.dumps(doc, cPickle.HIGHEST_PROTOCOL)
 
     @staticmethod
     def deserialize(doc):
-        original_doc = cPickle.loads(doc.decode('string_escape'))
+        original_doc = cPickle.loads(doc)
         return original_doc['fn'], original_doc['args'], dict(original_doc['kwargs'])
+
+class AttachPayload(object):
+    """Returned by the client instead of a Payload to follow the output
+    of a job which the daemon is already running."""
+    def __init__(self, job_id):
+        self.job_id = job_id
@@ -0,0 +1,53 @@
+"""Framed wire protocol spoken between the Dusty client and daemon.
+
+Every message is sent as a frame: a 4-byte big-endian body length,
+a 1-byte message kind, then the body itself. Readers always know how
+many bytes to expect, so bodies of any size and content can be sent
+without scanning the stream for terminators."""
+
+import struct
+
+# Sent by the client: run a command and follow its output, run a
+# command in the background, or follow the output of an existing job.
+# While following a job, the client may send CANCEL to stop it.
+COMMAND = 'C'
+DETACH = 'D'
+ATTACH = 'A'
+CANCEL = 'X'
+
+# Sent by the daemon: the ID of the job being followed, the job's
+# output, and finally exactly one RESULT or ERROR when it finishes
+JOB = 'J'
+LOG = 'L'
+WARNING = 'W'
+PROGRESS = 'P'
+RESULT = 'R'
+ERROR = 'E'
+
+_HEADER = struct.Struct('!Ic')
+_RECV_CHUNK_SIZE = 65536
+
+class ConnectionClosed(Exception):
+    pass
+
+def send_message(sock, kind, body=''):
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
+    sock.sendall(_HEADER.pack(len(body), kind) + body)
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, _RECV_CHUNK_SIZE))
+        if not chunk:
+            raise ConnectionClosed('Connection closed with {} bytes left to read'.format(size))
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+def recv_message(sock):
+    """Read one frame from the socket, returning a (kind, body) tuple.
+    Raises ConnectionClosed if the other side hangs up, including
+    cleanly between frames."""
+    length, kind = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return kind, _recv_exactly(sock, length)
@@ -27,6 +27,15 @@ host_forwarding_schema = Schema({
     'container_port': {'type': int}
     })
 
+app_nginx_schema = Schema({
+    'keepalive': {'type': int},
+    'client_max_body_size': {'type': basestring},
+    'proxy_connect_timeout': {'type': int},
+    'proxy_read_timeout': {'type': int},
+    'proxy_buffering': {'type': bool},
+    'gzip': {'type': bool}
+    })
+
 commands_schema = Schema({
     'always': {'type': basestring, 'required': True, 'default': ''},
     'once': {'type': basestring, 'default': ''}
@@ -47,6 +56,7 @@ app_schema = Schema({
     'depends': {'type': app_depends_schema, 'default': dict},
     'conditional_links': {'type': conditional_links_schema, 'default': dict},
     'host_forwarding': {'type': Array(host_forwarding_schema), 'default': list},
+    'nginx': {'type': app_nginx_schema, 'default': dict},
     'image': {'type': basestring},
     'build': {'type': basestring},
     'mount': {'type': basestring, 'default': '', 'required': True},
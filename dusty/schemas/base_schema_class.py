@@ -1,24 +1,45 @@
 import collections
-from copy import deepcopy
+import cPickle
 import glob
+import hashlib
+import logging
+import multiprocessing
 import os
+import threading
+import time
 import yaml
+from schemer import ValidationException
 
 from . import app_schema, lib_schema, bundle_schema
+from .. import constants
+from ..jobs import raise_if_cancelled
+from ..log import log_to_client
+from ..path import atomic_write
+from .compiled_schema import compile_schema
+from .dependency_graph import DependencyGraph
+
+SPEC_TYPES = ['bundles', 'apps', 'libs', 'services']
+
+# The C YAML parser is much faster, but is only there if PyYAML was built against libyaml
+_YAML_LOADER = getattr(yaml, 'CLoader', yaml.Loader)
+
+class FrozenDict(object):
+    """A read-only mapping. Specs are parsed once and then shared by every
+    command and thread in the daemon, so they must never change after they
+    are loaded. Code which needs a modified version of a spec builds its
+    own copy with `thaw` or `DustySchema.evolve`.
+
+    It is registered as a collections.Mapping rather than inheriting from
+    it, since the ABC classes don't define __slots__ and would give every
+    instance a __dict__."""
+    __slots__ = ('_document',)
 
-class BaseMutable(collections.MutableMapping):
     def __init__(self, document):
         self._document = document
 
     def __getitem__(self, name):
         return self._document[name]
 
-    def __setitem__(self, key, value):
-        self._document[key] = value
-
-    def __delitem__(self, key):
-        del self._document[key]
-
     def __contains__(self, key):
         return key in self._document
 
@@ -28,23 +49,119 @@ class BaseMutable(collections.MutableMapping):
     def __len__(self):
         return len(self._document)
 
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self._document)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.Mapping):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
     def keys(self):
         return self._document.keys()
 
     def values(self):
         return self._document.values()
 
+    def items(self):
+        return self._document.items()
+
+    def iterkeys(self):
+        return iter(self)
+
+    def itervalues(self):
+        return self._document.itervalues()
+
+    def iteritems(self):
+        return self._document.iteritems()
+
     def plain_dict(self):
-        return self._document
+        return thaw(self)
+
+collections.Mapping.register(FrozenDict)
 
+class FrozenList(tuple):
+    """A read-only list. It compares equal to lists and can be concatenated
+    with them, so code reading specs can treat it as the list it was parsed from."""
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if isinstance(other, list):
+            other = tuple(other)
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = tuple.__hash__
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+def freeze(value):
+    """Return a read-only version of a document parsed from YAML."""
+    # Exact type checks, since isinstance checks against collections.Mapping
+    # go through ABCMeta and dominate the cost of loading specs
+    value_type = type(value)
+    if value_type is dict:
+        return FrozenDict(dict((key, freeze(item)) for key, item in value.iteritems()))
+    if value_type is list or value_type is tuple:
+        return FrozenList(freeze(item) for item in value)
+    if value_type is set:
+        return frozenset(value)
+    return value
+
+def thaw(value):
+    """Return a plain, mutable deep copy of a frozen document."""
+    if isinstance(value, collections.Mapping):
+        return dict((key, thaw(item)) for key, item in value.iteritems())
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return set(value)
+    return value
+
+def _freeze_sections(document):
+    return dict((spec_type, specs if isinstance(specs, FrozenDict) else FrozenDict(dict(specs)))
+                for spec_type, specs in document.iteritems())
+
+# Compiled once, since every spec file loaded is checked against one of these
+_COMPILED_SCHEMAS = {'apps': compile_schema(app_schema),
+                     'bundles': compile_schema(bundle_schema),
+                     'libs': compile_schema(lib_schema)}
+
+# Cached specs have the schemas' defaults applied, so they are only good for these schemas
+_SCHEMAS_FINGERPRINT = hashlib.sha1(''.join(_COMPILED_SCHEMAS[spec_type].fingerprint
+                                            for spec_type in sorted(_COMPILED_SCHEMAS))).hexdigest()
 
 def _get_respective_schema(specs_type):
-    if specs_type == 'apps':
-        return app_schema
-    elif specs_type == 'bundles':
-        return bundle_schema
-    elif specs_type == 'libs':
-        return lib_schema
+    if specs_type in _COMPILED_SCHEMAS:
+        return _COMPILED_SCHEMAS[specs_type]
     elif specs_type == 'services':
         return None
     else:
@@ -52,37 +169,317 @@ def _get_respective_schema(specs_type):
 
 
 # This is build on top of Schemer's functionality
-class DustySchema(BaseMutable):
+class DustySchema(FrozenDict):
+    __slots__ = ('name', 'spec_type')
+
     def __init__(self, schema, document, name=None, spec_type=None):
+        """Takes ownership of `document`, which is validated and has
+        defaults applied in place rather than being copied."""
         if schema is not None:
             schema.validate(document)
+            schema.apply_defaults(document)
+        super(DustySchema, self).__init__(freeze(document)._document)
         self.name = name
         self.spec_type = spec_type
-        self._document = deepcopy(document)
-        super(DustySchema, self).__init__(deepcopy(document))
+
+    def evolve(self, **changes):
+        """Return a copy of this spec with the given top-level keys replaced.
+        Everything which is not replaced is shared with this spec."""
+        document = dict(self._document)
+        document.update((key, freeze(value)) for key, value in changes.iteritems())
+        return DustySchema(None, document, self.name, self.spec_type)
+
+def _load_specs_cache():
+    """Return the compiled specs cached at SPECS_CACHE_PATH, keyed by
+    spec file path. The cache is thrown away when Dusty is upgraded or
+    any of the schemas or their defaults change."""
+    try:
+        with open(constants.SPECS_CACHE_PATH, 'rb') as f:
+            cache = cPickle.load(f)
+    except Exception:
+        return {}
+    if (not isinstance(cache, dict) or cache.get('version') != constants.VERSION or
+            cache.get('schemas') != _SCHEMAS_FINGERPRINT):
+        return {}
+    return cache['specs']
+
+def _save_specs_cache(entries):
+    try:
+        atomic_write(constants.SPECS_CACHE_PATH,
+                     cPickle.dumps({'version': constants.VERSION, 'schemas': _SCHEMAS_FINGERPRINT, 'specs': entries},
+                                   cPickle.HIGHEST_PROTOCOL))
+    except (IOError, OSError) as e:
+        # The client runs as a regular user and cannot write to CONFIG_DIR
+        logging.debug('Could not write specs cache: {}'.format(e))
+
+def _stat_matches(cached_entry, stat):
+    # Like git, we don't trust an mtime within a second of when we cached
+    # the file, since the file could have been changed again in that second
+    return ((cached_entry['size'], cached_entry['mtime']) == (stat.st_size, stat.st_mtime)
+            and cached_entry['mtime'] < cached_entry['cached_at'] - 1)
+
+def _compile_spec(schema, spec_path, cached_entry):
+    """Return a cache entry holding the validated spec at `spec_path`
+    with defaults applied. The cached entry is reused if the file's size
+    and mtime are unchanged, or failing that if its contents hash the same."""
+    stat = os.stat(spec_path)
+    if cached_entry is not None and _stat_matches(cached_entry, stat):
+        return cached_entry
+    with open(spec_path, 'r') as f:
+        contents = f.read()
+    digest = hashlib.sha1(contents).hexdigest()
+    if cached_entry is not None and cached_entry['sha1'] == digest:
+        document = cached_entry['document']
+    else:
+        document = yaml.load(contents, Loader=_YAML_LOADER)
         if schema is not None:
-            schema.apply_defaults(self._document)
-
-def get_specs_from_path(specs_path):
-    specs = {}
-    for key in ['bundles', 'apps', 'libs', 'services']:
-        specs[key] = {}
-        schema = _get_respective_schema(key)
-        key_path = os.path.join(specs_path, key)
-        for spec_path in glob.glob('{}/*.yml'.format(key_path)):
-            spec_name = os.path.splitext(os.path.split(spec_path)[-1])[0]
+            schema.validate(document)
+            schema.apply_defaults(document)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': digest,
+            'cached_at': time.time(), 'document': document}
+
+def _spec_paths(specs_path, spec_type):
+    """Returns the path of every spec file of spec_type under specs_path, keyed by name"""
+    return dict((os.path.splitext(os.path.basename(spec_path))[0], spec_path)
+                for spec_path in glob.glob('{}/*.yml'.format(os.path.join(specs_path, spec_type))))
+
+def _spec_files(specs_path):
+    """Yields the type, name and path of every spec file under specs_path"""
+    for key in SPEC_TYPES:
+        for spec_name, spec_path in _spec_paths(specs_path, key).iteritems():
+            yield key, spec_name, spec_path
+
+def _compile_spec_job(job):
+    """Runs _compile_spec in a worker process. Errors are handed back to
+    the parent process so they can be reported for each file."""
+    spec_type, spec_path, cached_entry = job
+    try:
+        return spec_path, _compile_spec(_get_respective_schema(spec_type), spec_path, cached_entry), None
+    except Exception as e:
+        if isinstance(e, ValidationException):
+            # schemer doesn't pass its errors on to Exception, so they would be lost in pickling
+            e.args = (e.errors,)
+        try:
+            # The pool hangs if a result can't be unpickled in the parent
+            cPickle.loads(cPickle.dumps(e, cPickle.HIGHEST_PROTOCOL))
+        except Exception:
+            e = RuntimeError(str(e))
+        return spec_path, None, e
+
+def _compile_specs_in_pool(spec_type, spec_paths, cache, processes):
+    """Compiles spec_paths across a pool of processes, returning the new
+    cache entry for each path which compiled and the error for each which didn't"""
+    jobs = [(spec_type, spec_path, cache.get(spec_path)) for spec_path in spec_paths]
+    pool = multiprocessing.Pool(processes)
+    try:
+        pending = pool.map_async(_compile_spec_job, jobs, chunksize=max(1, len(jobs) // (processes * 4)))
+        while not pending.ready():
+            # Checked between waits so cancelling the job stops the workers too
+            raise_if_cancelled()
+            pending.wait(constants.SPECS_PARALLEL_POLL_INTERVAL)
+        results = pending.get()
+    finally:
+        # The workers are done by now unless we're leaving early, in which case they're stopped
+        pool.terminate()
+        pool.join()
+    entries = dict((spec_path, entry) for spec_path, entry, error in results if error is None)
+    errors = dict((spec_path, error) for spec_path, _, error in results if error is not None)
+    return entries, errors
+
+class _SpecLoader(object):
+    """Compiles the spec files under one specs path as they are needed,
+    sharing a single copy of the specs cache between them.
+
+    When at least SPECS_PARALLEL_LOAD_THRESHOLD files of one load need to
+    be parsed, such as on the first load of a large specs repo, they are
+    parsed and validated in a pool of `processes` processes, which
+    defaults to one per core."""
+    def __init__(self, specs_path, processes=None):
+        self.specs_path = specs_path
+        self.processes = processes or multiprocessing.cpu_count()
+        self.lock = threading.RLock()
+        self._cache = None
+        self._dirty = False
+
+    def _get_cache(self):
+        if self._cache is None:
+            self._cache = _load_specs_cache()
+        return self._cache
+
+    def spec_paths(self, spec_type):
+        """Lists the spec files of spec_type, dropping cache entries for
+        files of that type which have since been removed"""
+        with self.lock:
+            paths = _spec_paths(self.specs_path, spec_type)
+            cache, spec_dir, current = self._get_cache(), os.path.join(self.specs_path, spec_type), set(paths.values())
+            for spec_path in [path for path in cache if os.path.dirname(path) == spec_dir and path not in current]:
+                del cache[spec_path]
+                self._dirty = True
+            return paths
+
+    def _compile_in_parallel(self, spec_type, paths, cache):
+        """Compiles the stale files in `paths` in a process pool if there are
+        enough of them to be worth it, storing the results in the cache.
+        Every file which failed is reported to the client, then the first
+        failure is raised."""
+        if self.processes < 2 or len(paths) < constants.SPECS_PARALLEL_LOAD_THRESHOLD:
+            return
+        stale = sorted(spec_path for spec_path in paths.values()
+                       if spec_path not in cache or not _stat_matches(cache[spec_path], os.stat(spec_path)))
+        if len(stale) < constants.SPECS_PARALLEL_LOAD_THRESHOLD:
+            return
+        entries, errors = _compile_specs_in_pool(spec_type, stale, cache, self.processes)
+        cache.update(entries)
+        self._dirty = self._dirty or bool(entries)
+        for spec_path in sorted(errors):
+            log_to_client('Could not load spec {}: {}'.format(spec_path, errors[spec_path]))
+        if errors:
+            raise errors[min(errors)]
+
+    def load(self, spec_type, paths):
+        """Compiles the spec files in `paths`, a dict of name to path, into
+        DustySchemas. The specs cache is saved once all of them are compiled,
+        or as many as were compiled before one failed validation."""
+        schema = _get_respective_schema(spec_type)
+        specs = {}
+        with self.lock:
+            cache = self._get_cache()
+            try:
+                self._compile_in_parallel(spec_type, paths, cache)
+                for spec_name, spec_path in paths.iteritems():
+                    cached_entry = cache.get(spec_path)
+                    entry = _compile_spec(schema, spec_path, cached_entry)
+                    if entry is not cached_entry:
+                        cache[spec_path] = entry
+                        self._dirty = True
+                    specs[spec_name] = DustySchema(None, entry['document'], spec_name, spec_type)
+            finally:
+                if self._dirty:
+                    _save_specs_cache(cache)
+                    self._dirty = False
+        return specs
+
+class _SpecSection(FrozenDict):
+    """The specs of one type, loaded lazily. Listing the names in a section
+    only reads its directory; looking up one spec parses and validates just
+    that spec's file, and iterating over the specs loads the whole section."""
+    __slots__ = ('_loader', '_spec_type', '_paths', '_complete')
+
+    def __init__(self, loader, spec_type):
+        super(_SpecSection, self).__init__({})
+        self._loader = loader
+        self._spec_type = spec_type
+        self._paths = None
+        self._complete = False
+
+    def _get_paths(self):
+        if self._paths is None:
+            self._paths = self._loader.spec_paths(self._spec_type)
+        return self._paths
+
+    def load(self):
+        """Loads every spec in this section which hasn't been loaded yet"""
+        if not self._complete:
+            with self._loader.lock:
+                paths = self._get_paths()
+                missing = dict((name, path) for name, path in paths.iteritems() if name not in self._document)
+                self._document.update(self._loader.load(self._spec_type, missing))
+                self._complete = True
+        return self._document
+
+    def __getitem__(self, name):
+        if name not in self._document:
+            with self._loader.lock:
+                path = self._get_paths()[name]
+                if name not in self._document:
+                    self._document.update(self._loader.load(self._spec_type, {name: path}))
+        return self._document[name]
+
+    def __contains__(self, name):
+        return name in self._get_paths()
+
+    def __iter__(self):
+        return iter(self._get_paths())
+
+    def __len__(self):
+        return len(self._get_paths())
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.load())
+
+    def keys(self):
+        return self._get_paths().keys()
+
+    def values(self):
+        return self.load().values()
+
+    def items(self):
+        return self.load().items()
+
+    def itervalues(self):
+        return self.load().itervalues()
+
+    def iteritems(self):
+        return self.load().iteritems()
+
+def get_specs_from_path(specs_path, processes=None):
+    """Loads and validates every spec under specs_path"""
+    loader = _SpecLoader(specs_path, processes)
+    return dict((key, loader.load(key, loader.spec_paths(key))) for key in SPEC_TYPES)
+
+def _spec_sections(specs_path):
+    loader = _SpecLoader(specs_path)
+    return dict((key, _SpecSection(loader, key)) for key in SPEC_TYPES)
+
+def spec_fingerprints(specs_path):
+    """Returns the content hash of every spec file under specs_path, keyed
+    by (spec type, name). Hashes are taken from the specs cache for files
+    which haven't changed since they were cached."""
+    cache = _load_specs_cache()
+    fingerprints = {}
+    for key, spec_name, spec_path in _spec_files(specs_path):
+        cached_entry = cache.get(spec_path)
+        if cached_entry is not None and _stat_matches(cached_entry, os.stat(spec_path)):
+            fingerprints[(key, spec_name)] = cached_entry['sha1']
+        else:
             with open(spec_path, 'r') as f:
-                spec = yaml.load(f.read())
-                spec = DustySchema(schema, spec, spec_name, key)
-                specs[key][spec_name] = spec
-    return specs
+                fingerprints[(key, spec_name)] = hashlib.sha1(f.read()).hexdigest()
+    return fingerprints
+
+class DustySpecs(FrozenDict):
+    __slots__ = ('_dependency_graph',)
 
-class DustySpecs(BaseMutable):
     def __init__(self, specs_path):
-        document = get_specs_from_path(specs_path)
-        import logging
-        logging.error(document)
-        super(DustySpecs, self).__init__(document)
+        """Nothing is read from specs_path until it is needed. Each type of
+        spec is listed on first access, and each spec file is parsed and
+        validated the first time that spec, or its whole type, is used."""
+        super(DustySpecs, self).__init__(_freeze_sections(_spec_sections(specs_path)))
+        self._dependency_graph = None
+
+    @classmethod
+    def view(cls, document, dependency_graph=None):
+        """Wrap a dict of spec type to specs, such as a filtered set of
+        specs derived from a loaded DustySpecs, without loading anything.
+        Pass the `dependency_graph` of the specs the view was derived from
+        if the view keeps every dependency of the specs in it."""
+        specs = cls.__new__(cls)
+        FrozenDict.__init__(specs, _freeze_sections(document))
+        specs._dependency_graph = dependency_graph
+        return specs
+
+    def load(self):
+        """Loads and validates every spec which hasn't been loaded yet,
+        raising the first error found"""
+        for section in self._document.values():
+            if isinstance(section, _SpecSection):
+                section.load()
+        return self
+
+    @property
+    def dependency_graph(self):
+        if self._dependency_graph is None:
+            self._dependency_graph = DependencyGraph(self.load())
+        return self._dependency_graph
 
     def get_app_or_lib(self, app_or_lib_name):
         if app_or_lib_name in self._document['apps']:
@@ -0,0 +1,272 @@
+"""Compiles schemer Schemas into specialized validate and apply_defaults
+functions. Schemer interprets a Schema's field specs on every call: it
+looks up each field's spec, works out what kind of type it has, and builds
+the path of every field it visits in case it needs it for an error.
+
+compile_schema instead generates the source of a check function and a
+default-filling function for each Schema, with the checks of every field,
+including the fields of nested Schemas, written out inline, and execs it
+once. The generated code only builds a path when it has an error to report,
+and only copies defaults which are mutable.
+
+Validation errors, and the documents produced by apply_defaults, are the
+same as schemer's. Fields with a dynamic type (a function returning the
+type for each value) are still handed to schemer to check."""
+
+import copy
+import types
+import hashlib
+
+from schemer import Schema, Array, ValidationException
+
+# Defaults of these types are shared rather than deep-copied; deepcopy returns them as is anyway
+_ATOMIC_TYPES = (str, unicode, int, long, float, bool, types.NoneType)
+
+def _append_path(prefix, field):
+    """Same as Schema._append_path"""
+    if prefix:
+        return "{}.{}".format(prefix, field)
+    return field
+
+def _path(prefix):
+    """The generated code passes the path of a nested document around as
+    a (parent prefix, field) tuple, which is only turned into a string here,
+    when there is an error at that path"""
+    if type(prefix) is tuple:
+        parent, field = prefix
+        return _append_path(_path(parent), field)
+    return prefix
+
+def _apply_validations(validations, value, prefix, errors):
+    for validation in validations:
+        error = validation(value)
+        if error:
+            errors[_path(prefix)] = error
+
+def _not_nullable(errors, prefix, field):
+    path = _append_path(_path(prefix), field)
+    errors[path] = "{} is not nullable.".format(path)
+
+def _required(errors, prefix, field):
+    path = _append_path(_path(prefix), field)
+    errors[path] = "{} is required.".format(path)
+
+def _not_embedded(errors, prefix, field, kind):
+    path = _append_path(_path(prefix), field)
+    errors[path] = "{} should be an embedded {}".format(path, kind)
+
+def _incorrect_item(errors, prefix, field, i):
+    path = _append_path(_append_path(_path(prefix), field), i)
+    errors[path] = "Array item at {} is of incorrect type".format(path)
+
+def _as_list(validations):
+    if validations is None:
+        return []
+    return validations if isinstance(validations, list) else [validations]
+
+class _SchemaCompiler(object):
+    """Generates the source of the check and fill functions for a Schema.
+    Nested Schemas are written out inline, so checking a document is a
+    single function call however deeply it nests. Anything which can't be
+    written as a literal is passed to the generated code as a named constant."""
+    def __init__(self):
+        self.lines = []
+        self.namespace = {'isinstance': isinstance, 'enumerate': enumerate, 'dict': dict, 'list': list,
+                          'deepcopy': copy.deepcopy, '_append_path': _append_path, '_path': _path,
+                          '_apply_validations': _apply_validations, '_not_nullable': _not_nullable,
+                          '_required': _required, '_not_embedded': _not_embedded,
+                          '_incorrect_item': _incorrect_item}
+
+    def constant(self, value):
+        name = 'c{}'.format(len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def literal(self, value):
+        if type(value) in (str, unicode, int, long):
+            return repr(value)
+        return self.constant(value)
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def _insert_header(self, position, name, arguments):
+        """Every name in the namespace is bound as a default argument, so
+        the generated code only ever looks up local variables"""
+        arguments = arguments + ['{0}={0}'.format(global_name) for global_name in sorted(self.namespace)]
+        self.lines.insert(position, 'def {}({}):'.format(name, ', '.join(arguments)))
+        self.emit(0, '')
+
+    def emit_check(self, schema):
+        position = len(self.lines)
+        self._emit_document_check(schema, 1, 0, 'instance', 'prefix')
+        self._insert_header(position, 'check', ['instance', 'errors', 'prefix'])
+
+    def emit_fill(self, schema):
+        position = len(self.lines)
+        self.emit(1, 'pass')
+        self._emit_document_fill(schema, 1, 0, 'instance')
+        self._insert_header(position, 'fill', ['instance'])
+
+    def _emit_document_check(self, schema, indent, depth, document, prefix, known_dict=False):
+        """Emits the checks of Schema._validate_instance for the document in
+        the variable `document`. `prefix` is an expression for its path."""
+        if not known_dict:
+            self.emit(indent, 'if not isinstance({}, dict):'.format(document))
+            self.emit(indent + 1, 'errors[_path({})] = "Expected instance of dict to validate against schema."'.format(prefix))
+            self.emit(indent, 'else:')
+            indent += 1
+        self.emit(indent, 'pass')
+        if _as_list(schema._validates):
+            self.emit(indent, '_apply_validations({}, {}, {}, errors)'.format(
+                self.constant(_as_list(schema._validates)), document, prefix))
+        for field, spec in schema.doc_spec.iteritems():
+            self._emit_field_check(schema, field, spec, indent, depth, document, prefix)
+        if schema._strict:
+            allowed = self.constant(frozenset(schema.doc_spec))
+            self.emit(indent, 'if not {}.issuperset({}):'.format(allowed, document))
+            self.emit(indent + 1, 'for field in {}:'.format(document))
+            self.emit(indent + 2, 'if field not in {}:'.format(allowed))
+            self.emit(indent + 3, 'errors[_append_path(_path({}), field)] = "Unexpected document field not present in schema"'.format(prefix))
+
+    def _emit_field_check(self, schema, field, spec, indent, depth, document, prefix):
+        """Emits the checks of Schema._validate_value for one field"""
+        field_literal = self.literal(field)
+        field_type = spec['type']
+        validations = _as_list(spec.get('validates'))
+        value = 'value{}'.format(depth)
+        self.emit(indent, 'if {} in {}:'.format(field_literal, document))
+        self.emit(indent + 1, '{} = {}[{}]'.format(value, document, field_literal))
+        self.emit(indent + 1, 'if {} is None:'.format(value))
+        if spec.get('nullable', not spec.get('required', False)):
+            self.emit(indent + 2, 'pass')
+        else:
+            self.emit(indent + 2, '_not_nullable(errors, {}, {})'.format(prefix, field_literal))
+
+        field_prefix = '({}, {})'.format(prefix, field_literal)
+        if isinstance(field_type, Schema):
+            self.emit(indent + 1, 'elif isinstance({}, dict):'.format(value))
+            self._emit_document_check(field_type, indent + 2, depth + 1, value, field_prefix, known_dict=True)
+            self.emit(indent + 1, 'else:')
+            self.emit(indent + 2, '_not_embedded(errors, {}, {}, "document")'.format(prefix, field_literal))
+            validations = []
+        elif isinstance(field_type, Array) and isinstance(field_type.contained_type, (Schema, type)):
+            contained_type = field_type.contained_type
+            index, item = 'i{}'.format(depth), 'item{}'.format(depth)
+            self.emit(indent + 1, 'elif not isinstance({}, list):'.format(value))
+            self.emit(indent + 2, '_not_embedded(errors, {}, {}, "array")'.format(prefix, field_literal))
+            self.emit(indent + 1, 'else:')
+            self.emit(indent + 2, 'for {}, {} in enumerate({}):'.format(index, item, value))
+            if isinstance(contained_type, Schema):
+                self._emit_document_check(contained_type, indent + 3, depth + 1, item,
+                                          '({}, {})'.format(field_prefix, index))
+            else:
+                self.emit(indent + 3, 'if not isinstance({}, {}):'.format(item, self.constant(contained_type)))
+                self.emit(indent + 4, '_incorrect_item(errors, {}, {}, {})'.format(prefix, field_literal, index))
+        elif isinstance(field_type, type):
+            self.emit(indent + 1, 'elif not isinstance({}, {}):'.format(value, self.constant(field_type)))
+            self.emit(indent + 2, 'errors[_append_path(_path({}), {})] = {}'.format(
+                prefix, field_literal, self.literal("Field should be of type {}".format(field_type))))
+            self.emit(indent + 1, 'else:')
+            self.emit(indent + 2, 'pass')
+        else:
+            # Dynamic types are worked out per value, so leave them to schemer
+            self.emit(indent + 1, 'else:')
+            self.emit(indent + 2, '{}._validate_value({}, {}, _path({}), errors)'.format(
+                self.constant(schema), value, self.constant(spec), field_prefix))
+            validations = []
+        if validations:
+            self.emit(indent + 2, '_apply_validations({}, {}, {}, errors)'.format(
+                self.constant(validations), value, field_prefix))
+        if spec.get('required', False):
+            self.emit(indent, 'else:')
+            self.emit(indent + 1, '_required(errors, {}, {})'.format(prefix, field_literal))
+
+    def _default_source(self, default):
+        if default is list or default is dict:
+            return '[]' if default is list else '{}'
+        elif callable(default):
+            return '{}()'.format(self.constant(default))
+        elif type(default) in _ATOMIC_TYPES:
+            return self.literal(default)
+        return 'deepcopy({})'.format(self.constant(default))
+
+    def _emit_document_fill(self, schema, indent, depth, document):
+        """Emits the equivalent of Schema.apply_defaults for the document
+        in the variable `document`"""
+        value, item = 'value{}'.format(depth), 'item{}'.format(depth)
+        for field, spec in schema.doc_spec.iteritems():
+            field_literal = self.literal(field)
+            field_type = spec['type']
+            nested = None
+            if isinstance(field_type, Schema):
+                nested = field_type
+            elif isinstance(field_type, Array) and isinstance(field_type.contained_type, Schema):
+                nested = field_type.contained_type
+            if 'default' in spec:
+                self.emit(indent, 'if {} not in {}:'.format(field_literal, document))
+                self.emit(indent + 1, '{}[{}] = {}'.format(document, field_literal, self._default_source(spec['default'])))
+            if nested is None:
+                continue
+            self.emit(indent, 'if {} in {}:'.format(field_literal, document))
+            self.emit(indent + 1, '{} = {}[{}]'.format(value, document, field_literal))
+            if nested is field_type:
+                self.emit(indent + 1, 'if isinstance({}, dict):'.format(value))
+                self.emit(indent + 2, 'pass')
+                self._emit_document_fill(nested, indent + 2, depth + 1, value)
+            else:
+                self.emit(indent + 1, 'if isinstance({}, list):'.format(value))
+                self.emit(indent + 2, 'for {} in {}:'.format(item, value))
+                self.emit(indent + 3, 'pass')
+                self._emit_document_fill(nested, indent + 3, depth + 1, item)
+
+def _constant_repr(value):
+    """A repr of a constant which is the same in every process, so functions
+    are named, along with what they close over, rather than shown with
+    their address"""
+    if isinstance(value, (list, tuple)):
+        return '[{}]'.format(', '.join(_constant_repr(item) for item in value))
+    if isinstance(value, dict):
+        return '{{{}}}'.format(', '.join('{}: {}'.format(_constant_repr(key), _constant_repr(value[key]))
+                                         for key in sorted(value)))
+    if isinstance(value, types.FunctionType):
+        # Validators are mostly closures, so what they check is in their cells
+        cells = [cell.cell_contents for cell in value.__closure__ or []]
+        return '{}.{}({})'.format(value.__module__, value.__name__, _constant_repr(cells))
+    if callable(value) and not isinstance(value, type):
+        return '{}.{}'.format(getattr(value, '__module__', None), getattr(value, '__name__', type(value).__name__))
+    return repr(value)
+
+def _fingerprint(source, namespace):
+    """Changes whenever the fields, types, validations or defaults of a
+    compiled schema change. Constants are included along with the source,
+    since defaults which aren't literals are only named in it."""
+    constants = ''.join('{}={}\n'.format(name, _constant_repr(value)) for name, value in sorted(namespace.iteritems()))
+    return hashlib.sha1(source + '\n' + constants).hexdigest()
+
+class CompiledSchema(object):
+    """Validates documents and applies defaults exactly like `schema`"""
+    def __init__(self, schema):
+        self.schema = schema
+        compiler = _SchemaCompiler()
+        compiler.emit_check(schema)
+        compiler.emit_fill(schema)
+        self.source = '\n'.join(compiler.lines)
+        self.fingerprint = _fingerprint(self.source, compiler.namespace)
+        namespace = compiler.namespace
+        exec compile(self.source, '<compiled schema>', 'exec') in namespace
+        self._check = namespace['check']
+        self._fill = namespace['fill']
+
+    def validate(self, instance):
+        errors = {}
+        self._check(instance, errors, '')
+        if errors:
+            raise ValidationException(errors)
+
+    def apply_defaults(self, instance):
+        self._fill(instance)
+
+def compile_schema(schema):
+    """Compile a schemer Schema into a CompiledSchema"""
+    return CompiledSchema(schema)
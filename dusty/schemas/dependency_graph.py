@@ -0,0 +1,180 @@
+"""Index of the dependencies between specs. Apps can depend on apps, libs
+and services, and libs can depend on other libs. The graph is built once
+per spec load with a single pass of Tarjan's strongly connected components
+algorithm, which finds every cycle and orders every app and lib after
+everything it depends on in O(V+E).
+
+The transitive dependencies of each spec, and the reverse index of which
+specs depend on each app and lib, are computed the first time they are
+asked for. Walking the specs in dependency order means each spec's
+dependencies are built from the already-computed dependencies of its
+children, so no part of the graph is walked twice.
+
+Specs which reference a missing spec or sit on a cycle don't stop the graph
+from being built, since they may belong to a bundle which isn't active.
+Querying the dependencies of such a spec raises a RuntimeError instead."""
+
+import threading
+
+def _direct_dependencies(spec, dependent_type):
+    return spec.get('depends', {}).get(dependent_type, [])
+
+def _ordered_union(sequences):
+    seen = set()
+    ordered = []
+    for sequence in sequences:
+        for item in sequence:
+            if item not in seen:
+                seen.add(item)
+                ordered.append(item)
+    return tuple(ordered)
+
+class DependencyGraph(object):
+    # Edges followed when computing transitive dependencies of each type
+    _EDGES = {'apps': ('apps', 'libs'), 'libs': ('libs',)}
+
+    def __init__(self, specs, roots=None):
+        """If `roots` is given, as a list of (spec_type, name) pairs, only the
+        specs which can be reached from those roots are indexed."""
+        self._specs = dict((spec_type, specs.get(spec_type, {})) for spec_type in ['apps', 'libs', 'services'])
+        self._order = []
+        self._errors = {}
+        self._cycles = []
+        self._closures = None
+        self._dependents = None
+        self._lock = threading.Lock()
+        self._build(roots)
+
+    def _children(self, node):
+        spec_type, name = node
+        spec = self._specs[spec_type][name]
+        return [(dependent_type, dependent_name)
+                for dependent_type in self._EDGES[spec_type]
+                for dependent_name in _direct_dependencies(spec, dependent_type)]
+
+    def _build(self, roots):
+        if roots is None:
+            roots = [(spec_type, name) for spec_type in ['libs', 'apps'] for name in sorted(self._specs[spec_type])]
+        index = {}
+        for root in roots:
+            if root not in index:
+                self._strong_connect(root, index)
+
+    def _strong_connect(self, root, index):
+        """Iterative Tarjan's algorithm, so long dependency chains can't hit
+        the recursion limit. Components are completed dependencies first."""
+        lowlink = {}
+        component_stack = []
+        on_stack = set()
+
+        def _push(node):
+            index[node] = lowlink[node] = len(index)
+            component_stack.append(node)
+            on_stack.add(node)
+            return (node, iter(self._children(node)))
+
+        call_stack = [_push(root)]
+        while call_stack:
+            node, children = call_stack[-1]
+            for child in children:
+                child_type, child_name = child
+                if child_name not in self._specs[child_type]:
+                    self._errors.setdefault(child, "{} {} was referenced but not found".format(child_type, child_name))
+                elif child not in index:
+                    call_stack.append(_push(child))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                call_stack.pop()
+                if call_stack:
+                    parent = call_stack[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = component_stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    self._complete(component)
+
+    def _complete(self, component):
+        """Record a strongly connected component, all of whose dependencies
+        outside the component have already been completed."""
+        spec_type, name = component[0]
+        if len(component) > 1 or (spec_type, name) in self._children((spec_type, name)):
+            cycle = sorted(component)
+            self._cycles.append(cycle)
+            message = "Cycle found between {}: {}".format(spec_type, ', '.join(member[1] for member in cycle))
+            for member in cycle:
+                self._errors[member] = message
+        for member in component:
+            self._order.append(member)
+            if member not in self._errors:
+                for child in self._children(member):
+                    if child in self._errors:
+                        self._errors[member] = self._errors[child]
+                        break
+
+    def _compute_closures(self):
+        closures = {}
+        dependents = {}
+        for node in self._order:
+            if node in self._errors:
+                continue
+            spec_type, name = node
+            spec = self._specs[spec_type][name]
+            closure = {}
+            for dependent_type in self._EDGES[spec_type]:
+                closure[dependent_type] = _ordered_union(
+                    [closures[(dependent_type, child_name)].get(dependent_type, ()) + (child_name,)
+                     for child_name in _direct_dependencies(spec, dependent_type)])
+                for dependent_name in closure[dependent_type]:
+                    reverse = dependents.setdefault((dependent_type, dependent_name), {})
+                    reverse.setdefault(spec_type, set()).add(name)
+            closures[node] = closure
+        self._dependents = dependents
+        self._closures = closures
+
+    def _ensure_closures(self):
+        with self._lock:
+            if self._closures is None:
+                self._compute_closures()
+
+    def _closure(self, spec_type, name):
+        node = (spec_type, name)
+        if name not in self._specs.get(spec_type, {}):
+            raise RuntimeError("{} {} was referenced but not found".format(spec_type, name))
+        if node in self._errors:
+            raise RuntimeError(self._errors[node])
+        self._ensure_closures()
+        return self._closures[node]
+
+    def dependencies(self, spec_type, name, dependent_type):
+        """Returns the names of everything of type `dependent_type` which the
+        spec `name` of type `spec_type` depends on, directly or indirectly.
+        Libs are ordered so that every lib comes after the libs it depends on.
+        Services are only ever direct dependencies of apps."""
+        if dependent_type == 'services':
+            self._closure(spec_type, name)
+            return tuple(_direct_dependencies(self._specs[spec_type][name], 'services'))
+        return self._closure(spec_type, name).get(dependent_type, ())
+
+    def dependents(self, spec_type, name, dependent_type):
+        """Returns the sorted names of everything of type `dependent_type` which
+        depends on the spec `name` of type `spec_type`, directly or indirectly."""
+        self._ensure_closures()
+        return tuple(sorted(self._dependents.get((spec_type, name), {}).get(dependent_type, ())))
+
+    def topological_order(self, spec_type):
+        """Returns the names of all specs of `spec_type` ('apps' or 'libs'),
+        each after everything it depends on."""
+        return [name for node_type, name in self._order if node_type == spec_type]
+
+    @property
+    def cycles(self):
+        """Every dependency cycle, as the sorted list of (spec_type, name)
+        pairs in one strongly connected component of the graph."""
+        return list(self._cycles)
@@ -33,6 +33,9 @@ class Repo(object):
             return self.remote_path == other.remote_path
         return False
 
+    def __ne__(self, other):
+        return not self == other
+
     def __hash__(self):
         return hash(self.remote_path)
 
@@ -70,16 +73,16 @@ class Repo(object):
 
     @property
     def is_overridden(self):
-        return self.remote_path in get_config_value(constants.CONFIG_REPO_OVERRIDES_KEY)
+        return self.override_path is not None
 
     @property
     def override_path(self):
-        repo_overrides = get_config_value(constants.CONFIG_REPO_OVERRIDES_KEY)
-        return repo_overrides.get(self.remote_path)
+        return get_config_value(constants.CONFIG_REPO_OVERRIDES_KEY).get(self.remote_path)
 
     @property
     def local_path(self):
-        return self.override_path if self.is_overridden else self.managed_path
+        override_path = self.override_path
+        return override_path if override_path is not None else self.managed_path
 
     @property
     def vm_path(self):
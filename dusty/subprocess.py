@@ -1,19 +1,32 @@
 """Module for running subprocesses.  Providies features such as
 demotion, to execute the process as another user, log streaming
-to the client"""
+to the client, timeouts and cancellation.
+
+Every process is started in its own process group and registered
+with the daemon job running it, so cancelling the job kills the
+process along with any children it spawned."""
 
 from __future__ import absolute_import
 
 import os
 import pwd
+import errno
+import signal
 import subprocess
+import threading
+import time
 import logging
 from copy import copy
+from functools import partial
 
 from .config import get_config_value
 from .log import log_to_client
+from .jobs import current_job, raise_if_cancelled
 from . import constants
 
+class SubprocessTimeout(RuntimeError):
+    pass
+
 def _demote_to_user(user_name):
     def _demote():
         pw_record = pwd.getpwnam(user_name)
@@ -26,36 +39,110 @@ def _set_demoted_home_dir(user_name):
     home_dir = os.path.expanduser('~{}'.format(user_name))
     os.environ['HOME'] = home_dir
 
-def run_subprocess(fn, shell_args, demote=True, env=None, **kwargs):
+def _preexec_fn(demote):
+    demote_fn = _demote_to_user(get_config_value(constants.CONFIG_MAC_USERNAME_KEY)) if demote else None
+    def _preexec():
+        os.setsid()
+        if demote_fn is not None:
+            demote_fn()
+    return _preexec
+
+def _signal_process_group(process, sig):
+    if process.returncode is not None:
+        return
+    try:
+        os.killpg(process.pid, sig)
+    except OSError as e:
+        if e.errno != errno.ESRCH:
+            raise
+
+def _kill_after_grace_period(process):
+    """Sends SIGKILL to the group once the grace period is up, or as soon
+    as the process has exited, so any children left behind in its group
+    don't keep the daemon waiting out the full grace period"""
+    deadline = time.time() + constants.SUBPROCESS_KILL_GRACE_PERIOD
+    while process.returncode is None and time.time() < deadline:
+        time.sleep(0.05)
+    _signal_process_group(process, signal.SIGKILL)
+
+def kill_process_group(process):
+    """Ask the process group to terminate, then kill it outright
+    if it is still around after the grace period."""
+    _signal_process_group(process, signal.SIGTERM)
+    killer = threading.Thread(target=_kill_after_grace_period, args=(process,))
+    killer.daemon = True
+    killer.start()
+
+def run_subprocess(handle_process, shell_args, demote=True, env=None, timeout=None, **kwargs):
+    """Start `shell_args` and call `handle_process` with the Popen object.
+    `handle_process` should consume the process's output and return once
+    it has exited; its return value is returned. Raises CalledProcessError
+    if the process exits non-zero, SubprocessTimeout if it runs longer than
+    `timeout` seconds, and JobCancelled if the current job is cancelled."""
+    raise_if_cancelled()
     if env:
         passed_env = copy(os.environ)
         passed_env.update(env)
     else:
         passed_env = None
-    if demote:
-        kwargs['preexec_fn'] = _demote_to_user(get_config_value(constants.CONFIG_MAC_USERNAME_KEY))
-    output = fn(shell_args, env=passed_env, **kwargs)
+    process = subprocess.Popen(shell_args, env=passed_env, preexec_fn=_preexec_fn(demote), **kwargs)
+    kill = partial(kill_process_group, process)
+    job = current_job()
+    if job is not None:
+        job.add_cancel_handler(kill)
+    timed_out = threading.Event()
+    def _kill_on_timeout():
+        timed_out.set()
+        kill()
+    if timeout is not None:
+        timer = threading.Timer(timeout, _kill_on_timeout)
+        timer.daemon = True
+        timer.start()
+    try:
+        output = handle_process(process)
+    finally:
+        if timeout is not None:
+            timer.cancel()
+        if job is not None:
+            job.remove_cancel_handler(kill)
+    raise_if_cancelled()
+    if timed_out.is_set():
+        logging.warning('Killed {} after {} seconds'.format(shell_args, timeout))
+        raise SubprocessTimeout('Command `{}` timed out after {} seconds'.format(' '.join(shell_args), timeout))
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, ' '.join(shell_args), output)
     return output
 
-def check_call_demoted(shell_args, env=None, redirect_stderr=False):
-    kwargs = {} if not redirect_stderr else {'stderr': subprocess.STDOUT}
-    return run_subprocess(subprocess.check_call, shell_args, demote=True, env=env, **kwargs)
+def _wait(process):
+    process.wait()
+
+def _communicate(process):
+    return process.communicate()[0]
 
-def check_output_demoted(shell_args, env=None, redirect_stderr=False):
+def check_call(shell_args, demote=False, env=None, redirect_stderr=False, timeout=None):
     kwargs = {} if not redirect_stderr else {'stderr': subprocess.STDOUT}
-    return run_subprocess(subprocess.check_output, shell_args, demote=True, env=env, **kwargs)
-
-def check_and_log_output_and_error_demoted(shell_args, env=None, strip_newlines=False):
-    return check_and_log_output_and_error(shell_args, demote=True, env=env, strip_newlines=strip_newlines)
-
-def check_and_log_output_and_error(shell_args, demote=True, env=None, strip_newlines=False):
-    total_output = ""
-    process = run_subprocess(subprocess.Popen, shell_args, demote=demote, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    for output in iter(process.stdout.readline, ''):
-        if not strip_newlines or output.strip('\n') != '':
-            total_output += output
-            log_to_client(output.strip())
-    return_code = process.wait()
-    if return_code != 0:
-        raise subprocess.CalledProcessError(return_code, ' '.join(shell_args))
-    return total_output
+    return run_subprocess(_wait, shell_args, demote=demote, env=env, timeout=timeout, **kwargs)
+
+def check_call_demoted(shell_args, env=None, redirect_stderr=False, timeout=None):
+    return check_call(shell_args, demote=True, env=env, redirect_stderr=redirect_stderr, timeout=timeout)
+
+def check_output_demoted(shell_args, env=None, redirect_stderr=False, timeout=None):
+    kwargs = {'stdout': subprocess.PIPE}
+    if redirect_stderr:
+        kwargs['stderr'] = subprocess.STDOUT
+    return run_subprocess(_communicate, shell_args, demote=True, env=env, timeout=timeout, **kwargs)
+
+def check_and_log_output_and_error_demoted(shell_args, env=None, strip_newlines=False, timeout=None):
+    return check_and_log_output_and_error(shell_args, demote=True, env=env, strip_newlines=strip_newlines, timeout=timeout)
+
+def check_and_log_output_and_error(shell_args, demote=True, env=None, strip_newlines=False, timeout=None):
+    def _log_output(process):
+        total_output = ""
+        for output in iter(process.stdout.readline, ''):
+            if not strip_newlines or output.strip('\n') != '':
+                total_output += output
+                log_to_client(output.strip())
+        process.wait()
+        return total_output
+    return run_subprocess(_log_output, shell_args, demote=demote, env=env, timeout=timeout,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
@@ -0,0 +1,184 @@
+"""An optional DNS responder, run inside the daemon, which answers A
+queries for the host names in the port spec. It is used instead of the
+hosts file when `dns_responder_address` is set in the config. `dusty up`
+swaps in a new table of host names, so routing changes take effect
+immediately, without writing any files or flushing resolver caches.
+
+Only what Dusty needs is implemented: one question per query, A records
+for known names, an empty answer for other record types of known names,
+and NXDOMAIN for everything else."""
+
+import socket
+import struct
+import logging
+import threading
+
+from ... import constants
+from ...config import get_config_value
+
+_HEADER = struct.Struct('!HHHHHH')
+_QUESTION_FOOTER = struct.Struct('!HH')
+_ANSWER = struct.Struct('!HHHIH')
+
+_FLAG_RESPONSE = 0x8000
+_FLAG_AUTHORITATIVE = 0x0400
+_FLAG_RECURSION_DESIRED = 0x0100
+_OPCODE_MASK = 0x7800
+
+_TYPE_A = 1
+_CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_FORMERR = 1
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP = 4
+
+# Points back at the name in the question, which always starts right after the header
+_NAME_POINTER = 0xC000 | _HEADER.size
+
+def _parse_question(query):
+    """Returns the name, type and class of the query's question, and the
+    offset where it ends. Raises ValueError for a malformed question."""
+    labels = []
+    offset = _HEADER.size
+    while True:
+        if offset >= len(query):
+            raise ValueError('Question name runs past the end of the query')
+        length = ord(query[offset])
+        offset += 1
+        if length == 0:
+            break
+        if length & 0xC0:
+            raise ValueError('Compressed names are not allowed in a question')
+        labels.append(query[offset:offset + length])
+        offset += length
+    if offset + _QUESTION_FOOTER.size > len(query):
+        raise ValueError('Question type and class run past the end of the query')
+    qtype, qclass = _QUESTION_FOOTER.unpack_from(query, offset)
+    return '.'.join(labels).lower(), qtype, qclass, offset + _QUESTION_FOOTER.size
+
+def _response_header(query_id, query_flags, rcode, question_count, answer_count):
+    flags = (_FLAG_RESPONSE | _FLAG_AUTHORITATIVE | (query_flags & (_OPCODE_MASK | _FLAG_RECURSION_DESIRED)) | rcode)
+    return _HEADER.pack(query_id, flags, question_count, answer_count, 0, 0)
+
+def dns_response(query, records, ttl=constants.DNS_RESPONDER_TTL):
+    """Returns the response to a DNS query, given a dict of lowercase
+    host names to IPv4 addresses, or None if the query is too short to
+    answer at all"""
+    if len(query) < _HEADER.size:
+        return None
+    query_id, query_flags, question_count = _HEADER.unpack_from(query)[:3]
+    if query_flags & _FLAG_RESPONSE:
+        return None
+    if query_flags & _OPCODE_MASK:
+        return _response_header(query_id, query_flags, RCODE_NOTIMP, 0, 0)
+    if question_count != 1:
+        return _response_header(query_id, query_flags, RCODE_FORMERR, 0, 0)
+    try:
+        name, qtype, qclass, question_end = _parse_question(query)
+    except ValueError:
+        return _response_header(query_id, query_flags, RCODE_FORMERR, 0, 0)
+
+    question = query[_HEADER.size:question_end]
+    ip = records.get(name)
+    if ip is None:
+        return _response_header(query_id, query_flags, RCODE_NXDOMAIN, 1, 0) + question
+    if qtype != _TYPE_A or qclass != _CLASS_IN:
+        return _response_header(query_id, query_flags, RCODE_NOERROR, 1, 0) + question
+    answer = _ANSWER.pack(_NAME_POINTER, _TYPE_A, _CLASS_IN, ttl, 4) + socket.inet_aton(ip)
+    return _response_header(query_id, query_flags, RCODE_NOERROR, 1, 1) + question + answer
+
+def records_from_port_spec(port_spec):
+    return dict((spec['host_address'].lower().rstrip('.'), spec['forwarded_ip'])
+                for spec in port_spec['hosts_file'])
+
+class DnsResponder(object):
+    """Answers DNS queries over UDP from a thread. The table of records
+    is replaced as a whole by set_records, so every query is answered
+    from either the old table or the new one."""
+    def __init__(self, address, port):
+        self.records = {}
+        self._stopped = threading.Event()
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((address, port))
+        self._socket.settimeout(constants.DNS_RESPONDER_POLL_INTERVAL)
+        self.address, self.port = self._socket.getsockname()
+        self._thread = threading.Thread(target=self._serve, name='DustyDnsResponder')
+        self._thread.daemon = True
+
+    def set_records(self, records):
+        self.records = records
+
+    def start(self):
+        self._thread.start()
+        logging.info('DNS responder listening on {}:{}'.format(self.address, self.port))
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._socket.close()
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            try:
+                query, client_address = self._socket.recvfrom(constants.DNS_RESPONDER_MAX_QUERY_SIZE)
+            except socket.timeout:
+                continue
+            except socket.error:
+                logging.exception('DNS responder could not read a query')
+                continue
+            try:
+                response = dns_response(query, self.records)
+                if response is not None:
+                    self._socket.sendto(response, client_address)
+            except Exception:
+                logging.exception('DNS responder could not answer a query')
+
+_responder = None
+_responder_lock = threading.Lock()
+
+def dns_responder_address():
+    """Returns the (address, port) the DNS responder should listen on, or
+    None if it is turned off. The config value is `address[:port]`."""
+    value = get_config_value(constants.CONFIG_DNS_RESPONDER_KEY)
+    if not value:
+        return None
+    address, _, port = value.partition(':')
+    try:
+        return address or constants.LOCALHOST, int(port) if port else constants.DNS_RESPONDER_PORT
+    except ValueError:
+        raise RuntimeError('{} should look like 127.0.0.1:53, not {}'.format(constants.CONFIG_DNS_RESPONDER_KEY, value))
+
+def dns_responder_enabled():
+    return dns_responder_address() is not None
+
+def _ensure_responder_running(address):
+    global _responder
+    if _responder is not None and (_responder.address, _responder.port) == address:
+        return _responder
+    if _responder is not None:
+        _responder.stop()
+        _responder = None
+    try:
+        responder = DnsResponder(*address)
+    except socket.error as e:
+        raise RuntimeError('Could not start the DNS responder on {}:{}: {}'.format(address[0], address[1], e))
+    responder.start()
+    _responder = responder
+    return responder
+
+def update_dns_from_port_spec(port_spec):
+    """Start the DNS responder if it isn't running at the configured
+    address, then have it answer for the host names in the port spec"""
+    with _responder_lock:
+        responder = _ensure_responder_running(dns_responder_address())
+        responder.set_records(records_from_port_spec(port_spec))
+        logging.info('DNS responder now answers for {} host names'.format(len(responder.records)))
+
+def stop_dns_responder():
+    global _responder
+    with _responder_lock:
+        if _responder is not None:
+            _responder.stop()
+            _responder = None
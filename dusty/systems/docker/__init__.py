@@ -3,9 +3,14 @@ import os
 import docker
 import logging
 
+from ... import constants
+from ...cache import cached
+from ...config import get_config_value
 from ...log import log_to_client
 from ...subprocess import check_output_demoted
 from ...compiler.spec_assembler import get_specs
+from ..virtualbox import vm_boot_fingerprint
+from .testing_image import _ensure_image_exists
 
 def _exec_in_container(client, container, command, *args):
     exec_instance = client.exec_create(container['Id'],
@@ -20,17 +25,40 @@ def get_dusty_images():
     dusty_images = set([name  if ':' in name else "{}:latest".format(name) for name in dusty_image_names])
     return dusty_images
 
+def get_app_image_ids(assembled_specs):
+    """Returns a dict of app name to the ID of the image each app in the
+    assembled specs runs from, pulling any image not in the VM yet. Apps
+    built from a Dockerfile are left out."""
+    app_names = sorted(app_name for app_name, app_spec in assembled_specs['apps'].iteritems() if 'image' in app_spec)
+    if not app_names:
+        return {}
+    client = get_docker_client()
+    image_ids = {}
+    for app_name in app_names:
+        image = assembled_specs['apps'][app_name]['image']
+        _ensure_image_exists(client, image)
+        image_ids[app_name] = client.inspect_image(image)['Id']
+    return image_ids
+
 def get_dusty_container_name(service_name):
     return 'dusty_{}_1'.format(service_name)
 
+def _docker_env_fingerprint():
+    boot_fingerprint = vm_boot_fingerprint()
+    if boot_fingerprint is None:
+        return None
+    return (boot_fingerprint, get_config_value(constants.CONFIG_MAC_USERNAME_KEY))
+
+@cached(_docker_env_fingerprint, copy=True)
 def get_docker_env():
-    output = check_output_demoted(['boot2docker', 'shellinit'])
+    output = check_output_demoted(['boot2docker', 'shellinit'], timeout=constants.VM_COMMAND_TIMEOUT)
     env = {}
     for line in output.splitlines():
         k, v = line.strip().split()[1].split('=')
         env[k] = v
     return env
 
+@cached(_docker_env_fingerprint)
 def get_docker_client():
     """Ripped off and slightly modified based on docker-py's
     kwargs_from_env utility function."""
@@ -1,5 +1,6 @@
 import logging
 
+from ... import constants
 from ...log import log_to_client
 from . import _get_dusty_containers, get_dusty_images, get_docker_client
 
@@ -39,13 +40,15 @@ def _remove_dangling_images(client):
     return removed
 
 def remove_images():
-    """Removes all dangling images as well as all images referenced in a dusty spec; forceful removal is not used"""
+    """Removes all dangling images, all images referenced in a dusty spec and the images with apps' libs
+    installed in them; forceful removal is not used"""
     client = get_docker_client()
     removed = _remove_dangling_images(client)
     dusty_images = get_dusty_images()
     all_images = client.images(all=True)
     for image in all_images:
-        if set(image['RepoTags']).intersection(dusty_images):
+        if (set(image['RepoTags']).intersection(dusty_images) or
+                any(tag.startswith(constants.LIB_INSTALLS_IMAGE_PREFIX) for tag in image['RepoTags'])):
             try:
                 client.remove_image(image['Id'])
             except Exception as e:
@@ -1,22 +1,81 @@
+from __future__ import absolute_import
+
 import os
 import logging
 
 import yaml
+import docker
 
-from . import _get_canonical_container_name, get_docker_env, get_docker_client, _get_dusty_containers
+from . import _get_canonical_container_name, get_docker_env, get_docker_client, _get_dusty_containers, get_dusty_container_name
 from ... import constants
 from ...log import log_to_client
+from ...jobs import register_rollback
 from ...subprocess import check_output_demoted, check_and_log_output_and_error_demoted
 from ...compiler.spec_assembler import get_expected_number_of_running_containers
 from ...path import parent_dir
 
+def _register_composefile_rollback(compose_file_location):
+    if not os.path.exists(compose_file_location):
+        return
+    with open(compose_file_location, 'r') as f:
+        previous_composefile = f.read()
+    def _rollback():
+        logging.info('Restoring previous Composefile')
+        with open(compose_file_location, 'w') as f:
+            f.write(previous_composefile)
+    register_rollback(_rollback)
+
+def _composefile_contents(compose_config):
+    return yaml.dump(compose_config, default_flow_style=False)
+
 def write_composefile(compose_config, compose_file_location):
     logging.info('Writing new Composefile')
     compose_dir_location = parent_dir(compose_file_location)
     if not os.path.exists(compose_dir_location):
         os.makedirs(compose_dir_location)
+    _register_composefile_rollback(compose_file_location)
     with open(compose_file_location, 'w') as f:
-        f.write(yaml.dump(compose_config, default_flow_style=False))
+        f.write(_composefile_contents(compose_config))
+
+def composefile_matches(compose_config, compose_file_location):
+    """Returns whether the Composefile at compose_file_location is
+    already the one write_composefile would write for compose_config"""
+    try:
+        with open(compose_file_location, 'r') as f:
+            return f.read() == _composefile_contents(compose_config)
+    except IOError:
+        return False
+
+def read_composefile(compose_file_location):
+    """Returns the compose config in the Composefile at
+    compose_file_location, or None if there isn't a readable one"""
+    try:
+        with open(compose_file_location, 'r') as f:
+            compose_config = yaml.safe_load(f)
+    except (IOError, yaml.YAMLError):
+        return None
+    return compose_config if isinstance(compose_config, dict) else None
+
+def services_with_outdated_images(compose_config):
+    """Returns the services whose containers were created from a different
+    image than the one their image name points to now, such as after the
+    image was pulled or rebuilt under the same tag. A service whose image
+    isn't in the VM at all is outdated too, so Compose pulls it again."""
+    client = get_docker_client()
+    containers = dict((_get_canonical_container_name(container), container)
+                      for container in _get_dusty_containers(client, compose_config.keys(), include_exited=True))
+    outdated = []
+    for name, service_config in sorted(compose_config.iteritems()):
+        container = containers.get(get_dusty_container_name(name))
+        if container is None or 'image' not in service_config:
+            continue
+        try:
+            image_id = client.inspect_image(service_config['image'])['Id']
+        except docker.errors.APIError:
+            image_id = None
+        if client.inspect_container(container['Id'])['Image'] != image_id:
+            outdated.append(name)
+    return outdated
 
 def _compose_base_command(core_command, compose_file_location, project_name):
     logging.info('Running docker-compose {}'.format(core_command))
@@ -72,14 +131,30 @@ def _compose_restart(services):
         for container in dusty_containers:
             _restart_container(client, container)
 
-def update_running_containers_from_spec(compose_config, recreate_containers=True):
+def update_running_containers_from_spec(compose_config, recreate_containers=True, write=True):
     """Takes in a Compose spec from the Dusty Compose compiler,
     writes it to the Compose spec folder so Compose can pick it
     up, then does everything needed to make sure boot2docker is
-    up and running containers with the updated config."""
-    write_composefile(compose_config, constants.COMPOSEFILE_PATH)
+    up and running containers with the updated config. Pass
+    write=False if the Composefile is already up to date."""
+    if write:
+        write_composefile(compose_config, constants.COMPOSEFILE_PATH)
     compose_up(constants.COMPOSEFILE_PATH, 'dusty', recreate_containers=recreate_containers)
 
+def update_running_containers_from_plan(compose_config, plan, write=True):
+    """Applies an up plan from the compose plan compiler. Services being
+    removed or recreated are stopped and removed using the Composefile they
+    were created from, before the new one is written. Compose then creates
+    them again, along with any new services, and starts any stopped ones,
+    without recreating anything else."""
+    stale_services = plan['remove'] + plan['recreate']
+    if stale_services:
+        _compose_stop(constants.COMPOSEFILE_PATH, 'dusty', stale_services)
+        _compose_rm(constants.COMPOSEFILE_PATH, 'dusty', stale_services)
+    if write:
+        write_composefile(compose_config, constants.COMPOSEFILE_PATH)
+    compose_up(constants.COMPOSEFILE_PATH, 'dusty', recreate_containers=False)
+
 def stop_running_services(services=None):
     """Stop running containers owned by Dusty, or a specific
     list of Compose services if provided.
@@ -0,0 +1,117 @@
+"""Bakes the installs of the libs an app uses into a derived image of the
+app's image, one layer per lib, so its containers don't run every lib's
+install step each time they start. Each layer is tagged with a key made
+from the base image, the install commands and a fingerprint of the code
+of each lib up to and including its own, so when a lib changes only its
+layer and the ones after it are built again."""
+
+from __future__ import absolute_import
+
+import os
+import json
+import hashlib
+import logging
+
+import docker
+
+from ...compiler.compose import (libs_to_bake, lib_installs_image_name, lib_install_and_mark_command,
+                                 get_app_volume_mounts)
+from ...log import log_to_client
+from ...source import Repo
+from ... import constants
+from . import get_docker_client
+from .testing_image import (_ensure_image_exists, _get_split_volumes, _get_create_container_volumes,
+                            _get_create_container_binds)
+
+def repo_content_fingerprint(path):
+    """Changes whenever a file under `path` is added, removed or modified.
+    VCS metadata, dependency and build output directories and compiled
+    Python files are skipped, since they are large and don't change what
+    the lib's install step does."""
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(dirname for dirname in dirnames
+                             if dirname not in constants.LIB_FINGERPRINT_IGNORED_DIRS)
+        for filename in sorted(filenames):
+            if filename.endswith('.pyc'):
+                continue
+            file_path = os.path.join(dirpath, filename)
+            try:
+                stat = os.lstat(file_path)
+            except OSError:
+                continue
+            entries.append((os.path.relpath(file_path, path), stat.st_size, stat.st_mtime))
+    return hashlib.sha1(json.dumps(entries)).hexdigest()
+
+def _layer_keys(base_image_id, app_name, assembled_specs):
+    """Returns (lib_name, key) for each lib baked into the app's image. A
+    layer's key covers everything installed in it and in the layers below."""
+    inputs = [base_image_id]
+    keys = []
+    for lib_name in libs_to_bake(app_name, assembled_specs):
+        lib_spec = assembled_specs['libs'][lib_name]
+        inputs.append([lib_name, lib_spec['install'], repo_content_fingerprint(Repo(lib_spec['repo']).local_path)])
+        keys.append((lib_name, hashlib.sha1(json.dumps(inputs)).hexdigest()[:12]))
+    return keys
+
+def _image_tags(docker_client, image_name):
+    return set(tag.split(':')[-1]
+               for image in docker_client.images(name=image_name)
+               for tag in image['RepoTags'] or []
+               if tag.rsplit(':', 1)[0] == image_name)
+
+def _bake_lib_layer(docker_client, base_image, lib_name, lib_spec, volumes, image_name, tag):
+    split_volumes = _get_split_volumes(volumes)
+    command = "sh -c \"{}\"".format(lib_install_and_mark_command(lib_name, lib_spec))
+    container = docker_client.create_container(image=base_image,
+                                               command=command,
+                                               volumes=_get_create_container_volumes(split_volumes),
+                                               host_config=docker.utils.create_host_config(binds=_get_create_container_binds(split_volumes)))
+    try:
+        docker_client.start(container=container['Id'])
+        exit_code = docker_client.wait(container=container['Id'])
+        if exit_code != 0:
+            raise RuntimeError('Installing lib {} into {} failed with exit code {}:\n{}'.format(
+                lib_name, image_name, exit_code, docker_client.logs(container=container['Id'])))
+        docker_client.commit(container=container['Id'], repository=image_name, tag=tag)
+    finally:
+        docker_client.remove_container(container=container['Id'])
+
+def _remove_stale_tags(docker_client, image_name, tags, current_tags):
+    for tag in tags - set(current_tags):
+        try:
+            docker_client.remove_image(image='{}:{}'.format(image_name, tag))
+        except Exception as e:
+            logging.info('Could not remove stale lib install layer {}:{}: {}'.format(image_name, tag, e))
+
+def ensure_lib_installs_image(docker_client, app_name, assembled_specs):
+    """Makes sure `dusty/lib_installs_<app>` has every lib the app uses
+    installed at its current code, building only the layers whose key
+    has changed. Returns the tagged name of the image to run the app from;
+    its tag changes whenever any of its layers does."""
+    image_name = lib_installs_image_name(app_name)
+    base_image = assembled_specs['apps'][app_name]['image']
+    _ensure_image_exists(docker_client, base_image)
+    layer_keys = _layer_keys(docker_client.inspect_image(base_image)['Id'], app_name, assembled_specs)
+    tags = _image_tags(docker_client, image_name)
+    volumes = get_app_volume_mounts(app_name, assembled_specs)
+    previous_image = base_image
+    for lib_name, key in layer_keys:
+        if key not in tags:
+            log_to_client('Installing lib {} into the image for {}'.format(lib_name, app_name))
+            _bake_lib_layer(docker_client, previous_image, lib_name, assembled_specs['libs'][lib_name],
+                            volumes, image_name, key)
+        previous_image = '{}:{}'.format(image_name, key)
+    _remove_stale_tags(docker_client, image_name, tags, [key for _, key in layer_keys])
+    return previous_image
+
+def ensure_lib_installs_images(assembled_specs):
+    """Makes sure the lib installs image of every active app with libs to
+    install is up to date. Returns a dict of app name to the image the
+    compose compiler should run the app from."""
+    app_names = sorted(app_name for app_name in assembled_specs['apps'] if libs_to_bake(app_name, assembled_specs))
+    if not app_names:
+        return {}
+    docker_client = get_docker_client()
+    return {app_name: ensure_lib_installs_image(docker_client, app_name, assembled_specs)
+            for app_name in app_names}
@@ -1,7 +1,11 @@
+import os
 import logging
 import re
+from functools import partial
 
 from ... import constants
+from ...jobs import register_rollback
+from ...path import atomic_write
 
 DUSTY_CONFIG_REGEX = re.compile('\# BEGIN section for Dusty.*\# END section for Dusty\n', flags=re.DOTALL | re.MULTILINE)
 
@@ -10,8 +14,8 @@ def _read_hosts(filepath):
         return f.read()
 
 def _write_hosts(filepath, contents):
-    with open(filepath, 'w') as f:
-        f.write(contents)
+    # Replace the file a symlinked hosts file points to, not the symlink
+    atomic_write(os.path.realpath(filepath), contents)
 
 def _remove_current_dusty_config(hosts):
     """Given a string representing the contents of a hosts
@@ -30,13 +34,39 @@ def _dusty_hosts_config(hosts_specs):
     rules += '# END section for Dusty\n'
     return rules
 
+def _has_dusty_hosts_config(hosts, hosts_specs):
+    return DUSTY_CONFIG_REGEX.findall(hosts) == [_dusty_hosts_config(hosts_specs)]
+
 def update_hosts_file_from_port_spec(port_spec):
     """Given a port spec, update the hosts file specified at
     constants.HOST_PATH to contain the port mappings specified
-    in the spec. Any existing Dusty configurations are replaced."""
-    logging.info('Updating hosts file to match port spec')
+    in the spec. Any existing Dusty configurations are replaced.
+    The hosts file is only written if its Dusty section changes."""
     hosts_specs = port_spec['hosts_file']
     current_hosts = _read_hosts(constants.HOSTS_PATH)
+    if _has_dusty_hosts_config(current_hosts, hosts_specs):
+        logging.info('Hosts file already matches port spec')
+        return
+    logging.info('Updating hosts file to match port spec')
     cleared_hosts = _remove_current_dusty_config(current_hosts)
     updated_hosts = cleared_hosts + _dusty_hosts_config(hosts_specs)
+    register_rollback(partial(_write_hosts, constants.HOSTS_PATH, current_hosts))
     _write_hosts(constants.HOSTS_PATH, updated_hosts)
+
+def hosts_file_matches_port_spec(port_spec):
+    """Returns whether the hosts file already has the Dusty section
+    update_hosts_file_from_port_spec would write for this port spec"""
+    try:
+        current_hosts = _read_hosts(constants.HOSTS_PATH)
+    except IOError:
+        return False
+    return _has_dusty_hosts_config(current_hosts, port_spec['hosts_file'])
+
+def remove_dusty_hosts_config():
+    """Remove the Dusty section from the hosts file, if it has one"""
+    current_hosts = _read_hosts(constants.HOSTS_PATH)
+    if not DUSTY_CONFIG_REGEX.search(current_hosts):
+        return
+    logging.info('Removing Dusty section from hosts file')
+    register_rollback(partial(_write_hosts, constants.HOSTS_PATH, current_hosts))
+    _write_hosts(constants.HOSTS_PATH, _remove_current_dusty_config(current_hosts))
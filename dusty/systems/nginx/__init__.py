@@ -2,8 +2,12 @@ import os
 import logging
 import subprocess
 
+import psutil
+
 from ... import constants
 from ...config import get_config_value
+from ...jobs import register_rollback
+from ...path import atomic_write
 
 def _start_nginx():
     """Start a new nginx master process. This should not be called
@@ -24,18 +28,87 @@ def _ensure_nginx_running_with_latest_config():
     except:
         _start_nginx()
 
+def _nginx_is_running():
+    for process in psutil.process_iter():
+        try:
+            if process.name() == 'nginx':
+                return True
+        except psutil.Error:
+            continue
+    return False
+
+def _test_nginx_config():
+    """Runs `nginx -t`, which checks nginx's whole config, including
+    ours. Returns nginx's output if the config is invalid, or None."""
+    try:
+        subprocess.check_output(['nginx', '-t'], stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError as e:
+        return e.output
+    return None
+
+def ensure_nginx_running():
+    """Make sure nginx is running with whatever config is on disk,
+    starting it if needed. A running nginx is left alone."""
+    if not _nginx_is_running():
+        _start_nginx()
+
+def _nginx_config_path():
+    return os.path.join(get_config_value(constants.CONFIG_NGINX_DIR_KEY), 'dusty.conf')
+
+def _read_nginx_config():
+    """Returns the Dusty nginx config on disk, or None if there isn't one"""
+    try:
+        with open(_nginx_config_path(), 'r') as f:
+            return f.read()
+    except IOError:
+        return None
+
 def _write_nginx_config(nginx_config):
     """Writes the config file from the Dusty Nginx compiler
     to the Nginx includes directory, which should be included
     in the main nginx.conf."""
-    with open(os.path.join(get_config_value(constants.CONFIG_NGINX_DIR_KEY), 'dusty.conf'), 'w') as f:
-        f.write(nginx_config)
+    atomic_write(_nginx_config_path(), nginx_config)
+
+def _restore_nginx_config(previous_config):
+    """Puts back `previous_config`, or removes our config if there wasn't one"""
+    if previous_config is None:
+        if os.path.exists(_nginx_config_path()):
+            os.remove(_nginx_config_path())
+    else:
+        _write_nginx_config(previous_config)
+
+def _register_nginx_config_rollback(previous_config):
+    """If the current job is cancelled, put back the config we are
+    about to overwrite, or remove ours if this is the first one, and
+    have nginx pick up the change."""
+    def _rollback():
+        logging.info('Restoring previous nginx config')
+        _restore_nginx_config(previous_config)
+        _ensure_nginx_running_with_latest_config()
+    register_rollback(_rollback)
 
 def update_nginx_from_config(nginx_config):
     """Write the given config to disk as a Dusty sub-config
     in the Nginx includes directory. Then, either start nginx
     or tell it to reload its config to pick up what we've
-    just written."""
+    just written. If the config on disk is already this one,
+    nothing is written or reloaded. If nginx rejects the new
+    config, the previous one is put back and nginx keeps running
+    with it."""
+    previous_config = _read_nginx_config()
+    if previous_config == nginx_config:
+        logging.info('Dusty nginx config is unchanged')
+        ensure_nginx_running()
+        return
     logging.info('Updating nginx with new Dusty config')
+    _register_nginx_config_rollback(previous_config)
     _write_nginx_config(nginx_config)
+    errors = _test_nginx_config()
+    if errors is not None:
+        _restore_nginx_config(previous_config)
+        raise RuntimeError('nginx rejected the new Dusty config, so the previous config was kept:\n{}'.format(errors))
     _ensure_nginx_running_with_latest_config()
+
+def nginx_config_matches(nginx_config):
+    """Returns whether the Dusty nginx config on disk is already `nginx_config`"""
+    return _read_nginx_config() == nginx_config
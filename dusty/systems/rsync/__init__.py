@@ -1,17 +1,18 @@
 import os
 import logging
-from subprocess import check_call, CalledProcessError
+from subprocess import CalledProcessError
 
 from ... import constants
 from ...config import get_config_value
-from ...subprocess import check_call_demoted, check_and_log_output_and_error_demoted
+from ...subprocess import check_call, check_call_demoted, check_and_log_output_and_error_demoted
 from ...source import Repo
 from ...path import parent_dir
 from ...log import log_to_client
-from dusty.compiler.spec_assembler import get_repo_of_app_or_library, get_assembled_specs
+from dusty.compiler import spec_assembler
 
 def _ensure_vm_dir_exists(remote_dir):
-    check_call_demoted(['boot2docker', 'ssh', 'sudo mkdir -p {0}; sudo chown -R docker {0}'.format(remote_dir)])
+    check_call_demoted(['boot2docker', 'ssh', 'sudo mkdir -p {0}; sudo chown -R docker {0}'.format(remote_dir)],
+                       timeout=constants.VM_COMMAND_TIMEOUT)
 
 def _rsync_command(local_path, remote_path, is_dir=True, from_local=True, exclude_git=True):
     key_path = os.path.expanduser('~{}/.ssh/id_boot2docker'.format(get_config_value(constants.CONFIG_MAC_USERNAME_KEY)))
@@ -31,7 +32,7 @@ def vm_path_is_directory(remote_path):
     This function returns False on any process error, so False may indicate
     other failures such as the path not actually existing."""
     try:
-        check_call_demoted(['boot2docker', 'ssh', 'test -d {}'.format(remote_path)])
+        check_call_demoted(['boot2docker', 'ssh', 'test -d {}'.format(remote_path)], timeout=constants.VM_COMMAND_TIMEOUT)
     except CalledProcessError:
         return False
     return True
@@ -60,9 +61,11 @@ def sync_repos_by_specs(specs_list):
     Takes a list of app or lib specs (class DustySchema), and syncs the repos
     for those specs
     """
+    specs = spec_assembler.get_specs()
+    graph = spec_assembler.get_dependency_graph(specs)
     repos = set()
     for spec in specs_list:
-        for lib_name in spec['depends']['libs']:
-            repos.add(get_repo_of_app_or_library(lib_name))
-        repos.add(get_repo_of_app_or_library(spec.name))
+        for lib_name in graph.dependencies(spec.spec_type, spec.name, 'libs'):
+            repos.add(Repo(specs.get_app_or_lib(lib_name)['repo']))
+        repos.add(Repo(specs.get_app_or_lib(spec.name)['repo']))
     sync_repos(repos)
@@ -3,25 +3,35 @@ import re
 import logging
 
 from ... import constants
+from ...cache import cached, path_fingerprint
 from ...config import get_config_value
 from ...subprocess import check_and_log_output_and_error_demoted, check_output_demoted
 from ...log import log_to_client
+from ...path import vm_once_markers_path
 
 def _ensure_rsync_is_installed():
     logging.info('Installing rsync inside the Docker VM')
-    check_and_log_output_and_error_demoted(['boot2docker', 'ssh', 'tce-load -wi rsync'])
+    check_and_log_output_and_error_demoted(['boot2docker', 'ssh', 'tce-load -wi rsync'], timeout=constants.VM_COMMAND_TIMEOUT)
 
 def _ensure_persist_dir_is_linked():
     logging.info('Linking {} to VBox disk (if it is not already linked)'.format(constants.VM_PERSIST_DIR))
     mkdir_if_cmd = 'if [ ! -d /mnt/sda1{0} ]; then sudo mkdir /mnt/sda1{0}; fi'.format(constants.VM_PERSIST_DIR)
     mount_if_cmd = 'if [ ! -d {0} ]; then sudo ln -s /mnt/sda1{0} {0}; fi'.format(constants.VM_PERSIST_DIR)
-    check_and_log_output_and_error_demoted(['boot2docker', 'ssh', mkdir_if_cmd])
-    check_and_log_output_and_error_demoted(['boot2docker', 'ssh', mount_if_cmd])
+    check_and_log_output_and_error_demoted(['boot2docker', 'ssh', mkdir_if_cmd], timeout=constants.VM_COMMAND_TIMEOUT)
+    check_and_log_output_and_error_demoted(['boot2docker', 'ssh', mount_if_cmd], timeout=constants.VM_COMMAND_TIMEOUT)
 
 def _ensure_cp_dir_exists():
     logging.info('Creating {} in VM to support dusty cp'.format(constants.VM_CP_DIR))
     mkdir_if_cmd = 'if [ ! -d {0} ]; then sudo mkdir {0}; fi'.format(constants.VM_CP_DIR)
-    check_and_log_output_and_error_demoted(['boot2docker', 'ssh', mkdir_if_cmd])
+    check_and_log_output_and_error_demoted(['boot2docker', 'ssh', mkdir_if_cmd], timeout=constants.VM_COMMAND_TIMEOUT)
+
+def remove_once_markers(app_name):
+    """Forget that the app has run its `once` command, so its container
+    runs it again the next time it starts. Only the markers are removed,
+    since their directory is mounted into the app's running container."""
+    logging.info('Removing the once command markers of {} from the VM'.format(app_name))
+    rm_cmd = 'sudo rm -f {}/*'.format(vm_once_markers_path(app_name))
+    check_and_log_output_and_error_demoted(['boot2docker', 'ssh', rm_cmd], timeout=constants.VM_COMMAND_TIMEOUT)
 
 def _ensure_docker_vm_exists():
     """Initialize the boot2docker VM if it does not already exist."""
@@ -40,10 +50,22 @@ def initialize_docker_vm():
     _ensure_persist_dir_is_linked()
     _ensure_cp_dir_exists()
 
+def _vm_log_path():
+    user_home = os.path.expanduser('~{}'.format(get_config_value(constants.CONFIG_MAC_USERNAME_KEY)))
+    return os.path.join(user_home, 'VirtualBox VMs', constants.VM_NAME, 'Logs', 'VBox.log')
+
+def vm_boot_fingerprint():
+    """Changes every time the VM boots, since VirtualBox rotates its log
+    and starts a new VBox.log on each start. Returns None if the log
+    cannot be found, in which case we cannot tell when the VM restarts."""
+    fingerprint = path_fingerprint(_vm_log_path())
+    return fingerprint[0] if fingerprint is not None else None
+
+@cached(vm_boot_fingerprint)
 def get_docker_vm_ip():
     """Checks boot2docker's IP, assuming that the VM is started"""
     logging.info("Checking boot2docker's ip")
-    ip = check_and_log_output_and_error_demoted(['boot2docker', 'ip']).rstrip()
+    ip = check_and_log_output_and_error_demoted(['boot2docker', 'ip'], timeout=constants.VM_COMMAND_TIMEOUT).rstrip()
     return ip
 
 def _format_df_line(line):
@@ -59,6 +81,6 @@ def _format_df_line(line):
     return formatted_usage
 
 def get_docker_vm_disk_info():
-    df_output = check_output_demoted(['boot2docker', 'ssh', 'df', '-h', '|', 'grep', '/dev/sda1'])
+    df_output = check_output_demoted(['boot2docker', 'ssh', 'df', '-h', '|', 'grep', '/dev/sda1'], timeout=constants.VM_COMMAND_TIMEOUT)
     output_lines = df_output.split('\n')
     return _format_df_line(output_lines[0])
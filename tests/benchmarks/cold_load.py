@@ -0,0 +1,60 @@
+"""Benchmark for loading a large specs repo with an empty specs cache.
+Times a full load with each number of processes given, and reports the
+timings and the speedup over a single process as JSON.
+
+    python -m tests.benchmarks.cold_load --specs 5000 --processes 1 2 4 8
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+import yaml
+
+from dusty import constants
+from dusty.schemas.base_schema_class import get_specs_from_path
+from .synthetic_specs import write_synthetic_specs
+
+def _cold_load_seconds(specs_path, processes, repeat):
+    timings = []
+    for _ in range(repeat):
+        if os.path.exists(constants.SPECS_CACHE_PATH):
+            os.remove(constants.SPECS_CACHE_PATH)
+        start = time.time()
+        get_specs_from_path(specs_path, processes=processes)
+        timings.append(time.time() - start)
+    return min(timings)
+
+def run(num_specs, process_counts, repeat):
+    temp_dir = tempfile.mkdtemp()
+    try:
+        constants.SPECS_CACHE_PATH = os.path.join(temp_dir, 'specs_cache.pickle')
+        specs_path = os.path.join(temp_dir, 'specs')
+        write_synthetic_specs(specs_path, num_specs)
+        results = {'specs': num_specs, 'cores': multiprocessing.cpu_count(),
+                   'c_yaml_loader': hasattr(yaml, 'CLoader'), 'runs': []}
+        serial = None
+        for processes in process_counts:
+            seconds = _cold_load_seconds(specs_path, processes, repeat)
+            serial = serial or (seconds if processes == 1 else None)
+            results['runs'].append({'processes': processes, 'best_ms': seconds * 1000,
+                                    'speedup': serial / seconds if serial else None})
+        return results
+    finally:
+        shutil.rmtree(temp_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--specs', type=int, default=5000, help='Number of synthetic specs to generate')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4],
+                        help='Numbers of processes to time, starting with 1 for the baseline')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed loads for each number of processes')
+    args = parser.parse_args()
+    print json.dumps(run(args.specs, args.processes, args.repeat), indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
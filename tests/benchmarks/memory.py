@@ -0,0 +1,63 @@
+"""Memory benchmark for parsed specs. Loads a large synthetic specs repo,
+then holds many assembled spec sets the way a long-running daemon does
+across commands, and reports the peak RSS at each step as JSON.
+
+For comparison it also holds the same number of thawed copies, which is
+what every command used to pay for when specs were deep-copied.
+
+    python -m tests.benchmarks.memory --specs 1000 --views 20
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import resource
+import tempfile
+
+from mock import patch
+
+from dusty import constants
+from dusty.compiler import spec_assembler
+from dusty.schemas.base_schema_class import DustySpecs, thaw
+from .synthetic_specs import write_synthetic_specs
+
+def _peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on OS X and kilobytes on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def run(num_specs, num_views):
+    temp_dir = tempfile.mkdtemp()
+    try:
+        constants.SPECS_CACHE_PATH = os.path.join(temp_dir, 'specs_cache.pickle')
+        names = write_synthetic_specs(os.path.join(temp_dir, 'specs'), num_specs)
+        results = {'specs': num_specs, 'views': num_views, 'baseline_kb': _peak_rss_kb()}
+
+        specs = DustySpecs(os.path.join(temp_dir, 'specs'))
+        results['loaded_kb'] = _peak_rss_kb()
+
+        with patch('dusty.compiler.spec_assembler._get_active_bundles', return_value=names['bundles']):
+            views = [spec_assembler._get_expanded_active_specs(specs) for _ in range(num_views)]
+        results['views_kb'] = _peak_rss_kb()
+
+        copies = [thaw(view) for view in views]
+        results['copies_kb'] = _peak_rss_kb()
+        del copies
+
+        results['per_view_kb'] = float(results['views_kb'] - results['loaded_kb']) / num_views
+        results['per_copy_kb'] = float(results['copies_kb'] - results['views_kb']) / num_views
+        return results
+    finally:
+        shutil.rmtree(temp_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--specs', type=int, default=1000, help='Number of synthetic specs to generate')
+    parser.add_argument('--views', type=int, default=20, help='Number of assembled spec sets to hold')
+    args = parser.parse_args()
+    print json.dumps(run(args.specs, args.views), indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
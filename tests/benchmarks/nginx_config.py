@@ -0,0 +1,76 @@
+"""Benchmark for compiling the nginx config of many local host names. For
+each number of hosts it builds a port spec with one forwarded port per host,
+spread over a few listen ports, and reports the time to compile the config,
+its size, and the number of server blocks and upstreams in it as JSON.
+
+If nginx is installed, it also times `nginx -t` on the compiled config,
+which parses it much like a reload does.
+
+    python -m tests.benchmarks.nginx_config --hosts 100 1000 5000
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from distutils.spawn import find_executable
+
+from dusty.compiler.nginx import get_nginx_configuration_spec
+
+VM_IP = '192.168.59.103'
+LISTEN_PORTS = [80, 443, 3000, 8000]
+
+def _port_spec(num_hosts):
+    return {'nginx': [{'proxied_port': str(65000 + i),
+                       'boot2docker_ip': VM_IP,
+                       'host_address': 'local.app-{}.example.com'.format(i),
+                       'host_port': str(LISTEN_PORTS[i % len(LISTEN_PORTS)]),
+                       'app_name': 'app-{}'.format(i),
+                       'proxy_settings': {}}
+                      for i in range(num_hosts)]}
+
+def _best_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        timings.append(time.time() - start)
+    return min(timings) * 1000
+
+def _nginx_test_ms(nginx_config, repeat):
+    nginx = find_executable('nginx')
+    if nginx is None:
+        return None
+    temp_dir = tempfile.mkdtemp()
+    try:
+        config_path = os.path.join(temp_dir, 'nginx.conf')
+        with open(config_path, 'w') as f:
+            f.write('events {}\npid {};\nerror_log {};\n{}'.format(os.path.join(temp_dir, 'nginx.pid'),
+                                                                   os.path.join(temp_dir, 'error.log'), nginx_config))
+        return _best_ms(lambda: subprocess.check_call([nginx, '-t', '-q', '-p', temp_dir, '-c', config_path]), repeat)
+    finally:
+        shutil.rmtree(temp_dir)
+
+def run_hosts(num_hosts, repeat):
+    port_spec = _port_spec(num_hosts)
+    nginx_config = get_nginx_configuration_spec(port_spec)
+    return {'hosts': num_hosts,
+            'compile_ms': _best_ms(lambda: get_nginx_configuration_spec(port_spec), repeat),
+            'config_bytes': len(nginx_config),
+            'server_blocks': nginx_config.count('server {'),
+            'upstreams': nginx_config.count('upstream '),
+            'nginx_test_ms': _nginx_test_ms(nginx_config, repeat)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='Numbers of host names to forward')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs of each')
+    args = parser.parse_args()
+    print json.dumps([run_hosts(num_hosts, args.repeat) for num_hosts in args.hosts], indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
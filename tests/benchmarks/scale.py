@@ -0,0 +1,146 @@
+"""Benchmark of the spec pipeline at increasing specs repo sizes. For each
+size it generates a synthetic specs repo, with chains of libs depending on
+libs and several host_forwarding entries per app, activates every bundle,
+and times each stage of the pipeline on its own:
+
+    get_specs_cold           loading every spec with no specs cache
+    get_specs                loading every spec from a warm specs cache
+    get_assembled_specs      assembling the active specs from loaded specs
+    get_expanded_libs_specs  expanding the libs of every app and lib
+    get_port_spec_document   compiling the port spec from assembled specs
+    get_nginx_configuration_spec
+    get_compose_dict
+    validate_specs_from_path a full validation, with no saved results
+
+Results are printed as JSON, and can be written to a file with --output.
+Pass the output of an earlier run, such as one from the last release,
+with --baseline to include the ratio of each timing to the baseline's.
+
+    python -m tests.benchmarks.scale --sizes 10 100 1000 5000 --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from dusty import constants, cache
+from dusty.config import write_default_config, update_config
+from dusty.path import validation_state_path
+from dusty.compiler import spec_assembler
+from dusty.compiler.port_spec import get_port_spec_document
+from dusty.compiler.nginx import get_nginx_configuration_spec
+from dusty.compiler.compose import get_compose_dict
+from dusty.commands.validate import validate_specs_from_path
+from .synthetic_specs import write_synthetic_specs
+
+SPECS_REPO = 'github.com/dusty/synthetic-specs'
+VM_IP = '192.168.59.103'
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+def _best_ms(stage, repeat, setup=None):
+    """Runs `setup` then times `stage`, `repeat` times, returning the best time"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.time()
+        stage()
+        timings.append(time.time() - start)
+    return min(timings) * 1000
+
+def _loaded_specs():
+    spec_assembler.get_specs.invalidate()
+    return spec_assembler.get_specs().load()
+
+def _time_stages(specs_path, repeat):
+    timings = {}
+    timings['get_specs_cold'] = _best_ms(lambda: spec_assembler.get_specs().load(), repeat,
+                                         setup=lambda: (_remove(constants.SPECS_CACHE_PATH), cache.clear()))
+    timings['get_specs'] = _best_ms(lambda: spec_assembler.get_specs().load(), repeat, setup=cache.clear)
+
+    # Each later stage starts from freshly loaded specs, so building the
+    # dependency graph is counted in the first stage which needs it
+    def _fresh_specs():
+        _loaded_specs()
+        spec_assembler.get_assembled_specs.invalidate()
+        spec_assembler.get_expanded_libs_specs.invalidate()
+    timings['get_assembled_specs'] = _best_ms(spec_assembler.get_assembled_specs, repeat, setup=_fresh_specs)
+    timings['get_expanded_libs_specs'] = _best_ms(spec_assembler.get_expanded_libs_specs, repeat, setup=_fresh_specs)
+
+    assembled_specs = spec_assembler.get_assembled_specs()
+    timings['get_port_spec_document'] = _best_ms(lambda: get_port_spec_document(assembled_specs, VM_IP), repeat)
+    port_spec = get_port_spec_document(assembled_specs, VM_IP)
+    timings['get_nginx_configuration_spec'] = _best_ms(lambda: get_nginx_configuration_spec(port_spec), repeat)
+    timings['get_compose_dict'] = _best_ms(lambda: get_compose_dict(assembled_specs, port_spec), repeat)
+    timings['validate_specs_from_path'] = _best_ms(lambda: validate_specs_from_path(specs_path), repeat,
+                                                   setup=lambda: _remove(validation_state_path(os.path.realpath(specs_path))))
+    return timings
+
+def run_size(num_specs, repeat, lib_depth, host_forwarding_per_app):
+    temp_dir = tempfile.mkdtemp()
+    try:
+        constants.CONFIG_PATH = os.path.join(temp_dir, 'config.yml')
+        constants.SPECS_CACHE_PATH = os.path.join(temp_dir, 'specs_cache.pickle')
+        constants.VALIDATION_STATE_DIR = os.path.join(temp_dir, 'validation_state')
+        constants.PORT_ALLOCATIONS_PATH = os.path.join(temp_dir, 'port_allocations.pickle')
+        specs_path = os.path.join(temp_dir, 'specs')
+        names = write_synthetic_specs(specs_path, num_specs, lib_depth=lib_depth,
+                                      host_forwarding_per_app=host_forwarding_per_app)
+        cache.clear()
+        write_default_config()
+        update_config(**{constants.CONFIG_SPECS_REPO_KEY: SPECS_REPO,
+                         constants.CONFIG_REPO_OVERRIDES_KEY: {SPECS_REPO: specs_path},
+                         constants.CONFIG_BUNDLES_KEY: names['bundles']})
+        return {'specs': num_specs,
+                'counts': dict((spec_type, len(spec_names)) for spec_type, spec_names in names.iteritems()),
+                'timings_ms': _time_stages(specs_path, repeat)}
+    finally:
+        cache.clear()
+        shutil.rmtree(temp_dir)
+
+def _compare(results, baseline):
+    """Adds the ratio of each timing to the baseline's timing for the same size"""
+    baseline_timings = dict((result['specs'], result['timings_ms']) for result in baseline['results'])
+    for result in results['results']:
+        previous = baseline_timings.get(result['specs'], {})
+        result['ratio_to_baseline'] = dict((stage, ms / previous[stage])
+                                           for stage, ms in result['timings_ms'].iteritems() if previous.get(stage))
+    results['baseline_version'] = baseline.get('version')
+
+def run(sizes, repeat, lib_depth, host_forwarding_per_app):
+    return {'version': constants.VERSION,
+            'python': sys.version.split()[0],
+            'repeat': repeat,
+            'lib_depth': lib_depth,
+            'host_forwarding_per_app': host_forwarding_per_app,
+            'results': [run_size(num_specs, repeat, lib_depth, host_forwarding_per_app) for num_specs in sizes]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 5000],
+                        help='Numbers of synthetic specs to generate')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of each stage')
+    parser.add_argument('--lib-depth', type=int, default=8, help='Length of the chains of libs depending on libs')
+    parser.add_argument('--host-forwarding', type=int, default=4, help='Number of host_forwarding entries per app')
+    parser.add_argument('--output', help='File to also write the results to')
+    parser.add_argument('--baseline', help='Results of an earlier run to compare against')
+    args = parser.parse_args()
+    results = run(args.sizes, args.repeat, args.lib_depth, args.host_forwarding)
+    if args.baseline:
+        with open(args.baseline) as f:
+            _compare(results, json.load(f))
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print output
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark for checking specs against their schemas. Parses the specs of
+a synthetic specs repo once, then times validating them and applying their
+defaults with schemer and with the compiled schemas, and reports the time
+per spec for each as JSON.
+
+    python -m tests.benchmarks.schema_validation --specs 2000
+"""
+
+import os
+import copy
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import yaml
+
+from dusty.schemas.app_schema import app_schema
+from dusty.schemas.bundle_schema import bundle_schema
+from dusty.schemas.lib_schema import lib_schema
+from dusty.schemas.compiled_schema import compile_schema
+from .synthetic_specs import write_synthetic_specs
+
+SCHEMAS = {'apps': app_schema, 'bundles': bundle_schema, 'libs': lib_schema}
+
+def _parse_specs(specs_path):
+    documents = []
+    for spec_type in SCHEMAS:
+        for spec_path in glob.glob(os.path.join(specs_path, spec_type, '*.yml')):
+            with open(spec_path) as f:
+                documents.append((spec_type, yaml.safe_load(f)))
+    return documents
+
+def _best_seconds(schemas, documents, repeat):
+    timings = []
+    for _ in range(repeat):
+        copies = copy.deepcopy(documents)
+        start = time.time()
+        for spec_type, document in copies:
+            schemas[spec_type].validate(document)
+            schemas[spec_type].apply_defaults(document)
+        timings.append(time.time() - start)
+    return min(timings)
+
+def run(num_specs, repeat):
+    temp_dir = tempfile.mkdtemp()
+    try:
+        write_synthetic_specs(temp_dir, num_specs)
+        documents = _parse_specs(temp_dir)
+    finally:
+        shutil.rmtree(temp_dir)
+    compiled = dict((spec_type, compile_schema(schema)) for spec_type, schema in SCHEMAS.iteritems())
+    schemer_seconds = _best_seconds(SCHEMAS, documents, repeat)
+    compiled_seconds = _best_seconds(compiled, documents, repeat)
+    return {'specs': len(documents), 'repeat': repeat,
+            'schemer_us_per_spec': schemer_seconds / len(documents) * 1e6,
+            'compiled_us_per_spec': compiled_seconds / len(documents) * 1e6,
+            'speedup': schemer_seconds / compiled_seconds}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--specs', type=int, default=2000, help='Number of synthetic specs to generate')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs of each')
+    args = parser.parse_args()
+    print json.dumps(run(args.specs, args.repeat), indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
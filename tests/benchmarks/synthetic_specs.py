@@ -0,0 +1,81 @@
+"""Writes a synthetic specs repo of a given size, for benchmarks which need
+more specs than the fixtures provide. Every app depends on a few libs,
+services and other apps, libs depend on other libs, and each bundle
+activates a slice of the apps, so the assembler has real work to do."""
+
+import os
+import random
+
+import yaml
+
+def _write_spec(specs_path, spec_type, name, document):
+    spec_dir = os.path.join(specs_path, spec_type)
+    if not os.path.exists(spec_dir):
+        os.makedirs(spec_dir)
+    with open(os.path.join(spec_dir, '{}.yml'.format(name)), 'w') as f:
+        f.write(yaml.safe_dump(document, default_flow_style=False))
+
+def _sample(rng, names, count):
+    return rng.sample(names, min(count, len(names)))
+
+def _lib_dependencies(rng, lib_names, i, lib_depth):
+    dependencies = _sample(rng, lib_names[:i], 2)
+    if lib_depth and i % lib_depth and lib_names[i - 1] not in dependencies:
+        dependencies.append(lib_names[i - 1])
+    return dependencies
+
+def _host_forwarding(name, i, count):
+    forwarding = [{'host_name': '{}.local'.format(name), 'host_port': 80, 'container_port': 8000 + i % 1000}]
+    forwarding += [{'host_name': '{}-{}.local'.format(name, j), 'host_port': 80, 'container_port': 9000 + j}
+                   for j in range(1, count)]
+    return forwarding
+
+def write_synthetic_specs(specs_path, num_specs, seed=0, lib_depth=None, host_forwarding_per_app=1):
+    """Write roughly `num_specs` specs to `specs_path`: half apps, a quarter
+    libs, the rest split between services and bundles. Dependencies only
+    point at earlier specs of the same type, so the graph is acyclic.
+    If `lib_depth` is given, libs also form chains that deep, each lib
+    depending on the one before it. Returns a dict of spec type to the
+    names written."""
+    rng = random.Random(seed)
+    num_apps = max(1, num_specs // 2)
+    num_libs = max(1, num_specs // 4)
+    num_services = max(1, num_specs // 8)
+    num_bundles = max(1, num_specs - num_apps - num_libs - num_services)
+    names = {'apps': ['app{}'.format(i) for i in range(num_apps)],
+             'libs': ['lib{}'.format(i) for i in range(num_libs)],
+             'services': ['service{}'.format(i) for i in range(num_services)],
+             'bundles': ['bundle{}'.format(i) for i in range(num_bundles)]}
+
+    for i, name in enumerate(names['libs']):
+        _write_spec(specs_path, 'libs', name, {
+            'repo': '/repos/{}'.format(name),
+            'mount': '/{}'.format(name),
+            'install': 'python setup.py develop',
+            'depends': {'libs': _lib_dependencies(rng, names['libs'], i, lib_depth)}})
+
+    for i, name in enumerate(names['services']):
+        _write_spec(specs_path, 'services', name, {
+            'image': 'dusty/{}'.format(name),
+            'volumes': ['/persist/{0}:/data/{0}'.format(name)]})
+
+    for i, name in enumerate(names['apps']):
+        _write_spec(specs_path, 'apps', name, {
+            'repo': '/repos/{}'.format(name),
+            'mount': '/{}'.format(name),
+            'image': 'dusty/{}'.format(name),
+            'depends': {'apps': _sample(rng, names['apps'][:i], 2),
+                        'libs': _sample(rng, names['libs'], 3),
+                        'services': _sample(rng, names['services'], 2)},
+            'host_forwarding': _host_forwarding(name, i, host_forwarding_per_app),
+            'commands': {'always': './run.sh', 'once': './install.sh'},
+            'compose': {'environment': {'APP_NAME': name, 'DEBUG': '1'},
+                        'volumes': ['/tmp/{0}:/tmp/{0}'.format(name)]}})
+
+    apps_per_bundle = max(1, num_apps // num_bundles)
+    for i, name in enumerate(names['bundles']):
+        _write_spec(specs_path, 'bundles', name, {
+            'description': 'Synthetic bundle {}'.format(i),
+            'apps': names['apps'][i * apps_per_bundle:(i + 1) * apps_per_bundle] or names['apps'][:1]})
+
+    return names
@@ -0,0 +1,62 @@
+"""Benchmark for spec validation. Loads a synthetic specs repo once, then
+times the reference and cycle checks, including building the dependency
+graph. Loading and schema validation of the spec files is not included.
+
+It then times `validate_specs_from_path` end to end with a warm specs
+cache, first with no saved validation state and then after changing a
+single spec, and reports all of the results as JSON.
+
+    python -m tests.benchmarks.validate --specs 2000
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from dusty import constants
+from dusty.commands.validate import _validate_specs, validate_specs_from_path
+from dusty.schemas.base_schema_class import DustySpecs
+from .synthetic_specs import write_synthetic_specs
+
+def run(num_specs, repeat):
+    temp_dir = tempfile.mkdtemp()
+    try:
+        constants.SPECS_CACHE_PATH = os.path.join(temp_dir, 'specs_cache.pickle')
+        constants.VALIDATION_STATE_DIR = os.path.join(temp_dir, 'validation_state')
+        specs_path = os.path.join(temp_dir, 'specs')
+        names = write_synthetic_specs(specs_path, num_specs)
+        specs = DustySpecs(specs_path)
+        timings = []
+        for _ in range(repeat):
+            # A fresh view has no dependency graph yet, so each run builds its own
+            view = DustySpecs.view(specs)
+            start = time.time()
+            _validate_specs(view)
+            timings.append(time.time() - start)
+        results = {'specs': num_specs, 'repeat': repeat,
+                   'best_ms': min(timings) * 1000, 'worst_ms': max(timings) * 1000}
+
+        start = time.time()
+        validate_specs_from_path(specs_path)
+        results['full_run_ms'] = (time.time() - start) * 1000
+        with open(os.path.join(specs_path, 'libs', '{}.yml'.format(names['libs'][0])), 'a') as f:
+            f.write('install: ./changed.sh\n')
+        start = time.time()
+        validate_specs_from_path(specs_path)
+        results['one_change_run_ms'] = (time.time() - start) * 1000
+        return results
+    finally:
+        shutil.rmtree(temp_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--specs', type=int, default=2000, help='Number of synthetic specs to generate')
+    parser.add_argument('--repeat', type=int, default=10, help='Number of timed validation runs')
+    args = parser.parse_args()
+    print json.dumps(run(args.specs, args.repeat), indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,7 @@ from nose.tools import nottest
 from mock import patch
 import git
 
-from dusty import constants
+from dusty import constants, cache
 from dusty.config import write_default_config, save_config_value, get_config, save_config
 from dusty.compiler.spec_assembler import get_specs_repo
 from dusty.commands.repos import override_repo
@@ -34,7 +34,12 @@ class DustyTestCase(TestCase):
         self.temp_specs_path = tempfile.mkdtemp()
         self.temp_repos_path = tempfile.mkdtemp()
 
+        cache.clear()
         constants.CONFIG_PATH = self.temp_config_path
+        constants.SPECS_CACHE_PATH = os.path.join(self.temp_repos_path, 'specs_cache.pickle')
+        constants.VALIDATION_STATE_DIR = os.path.join(self.temp_repos_path, 'validation_state')
+        constants.COMPILED_OUTPUTS_PATH = os.path.join(self.temp_repos_path, 'compiled_outputs.pickle')
+        constants.PORT_ALLOCATIONS_PATH = os.path.join(self.temp_repos_path, 'port_allocations.pickle')
         write_default_config()
         save_config_value(constants.CONFIG_SPECS_REPO_KEY, 'github.com/org/dusty-specs')
         override_repo(get_specs_repo().remote_path, self.temp_specs_path)
@@ -51,7 +56,7 @@ class DustyTestCase(TestCase):
         logging.getLogger(constants.SOCKET_LOGGER_NAME).removeHandler(self.capture_handler)
 
     @nottest
-    @patch('dusty.schemas.base_schema_class.get_specs_from_path')
+    @patch('dusty.schemas.base_schema_class._spec_sections')
     def make_test_specs(self, specs_dict, fake_specs_from_path):
         fake_specs_from_path.return_value = specs_dict
         return DustySpecs('')
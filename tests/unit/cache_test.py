@@ -0,0 +1,83 @@
+import os
+
+from ..testcases import DustyTestCase
+from dusty.cache import cached, clear, path_fingerprint, glob_fingerprint
+from dusty.compiler.spec_assembler import get_specs
+from dusty.config import get_config_value, save_config_value
+from dusty import constants
+
+class TestCached(DustyTestCase):
+    def setUp(self):
+        super(TestCached, self).setUp()
+        self.fingerprint = 1
+        self.builds = 0
+        @cached(lambda: self.fingerprint, copy=True)
+        def build():
+            self.builds += 1
+            return {'builds': self.builds}
+        self.build = build
+
+    def test_reuses_result_while_fingerprint_is_unchanged(self):
+        self.assertEqual(self.build(), {'builds': 1})
+        self.assertEqual(self.build(), {'builds': 1})
+        self.assertEqual(self.builds, 1)
+
+    def test_rebuilds_when_fingerprint_changes(self):
+        self.build()
+        self.fingerprint = 2
+        self.assertEqual(self.build(), {'builds': 2})
+
+    def test_none_fingerprint_is_never_cached(self):
+        self.fingerprint = None
+        self.build()
+        self.build()
+        self.assertEqual(self.builds, 2)
+
+    def test_copy_protects_cached_value(self):
+        self.build()['builds'] = 100
+        self.assertEqual(self.build(), {'builds': 1})
+
+    def test_invalidate_and_clear(self):
+        self.build()
+        self.build.invalidate()
+        self.build()
+        clear()
+        self.build()
+        self.assertEqual(self.builds, 3)
+
+class TestFingerprints(DustyTestCase):
+    def test_path_fingerprint_of_missing_file(self):
+        self.assertIsNone(path_fingerprint('/does/not/exist'))
+
+    def test_path_fingerprint_changes_on_write(self):
+        fingerprint = path_fingerprint(self.temp_config_path)
+        with open(self.temp_config_path, 'a') as f:
+            f.write('\n')
+        self.assertNotEqual(path_fingerprint(self.temp_config_path), fingerprint)
+
+    def test_glob_fingerprint_changes_when_files_are_added(self):
+        pattern = os.path.join(self.temp_specs_path, 'apps', '*.yml')
+        fingerprint = glob_fingerprint(pattern)
+        open(os.path.join(self.temp_specs_path, 'apps', 'new-app.yml'), 'w').close()
+        self.assertNotEqual(glob_fingerprint(pattern), fingerprint)
+
+class TestCachedState(DustyTestCase):
+    def test_specs_reloaded_when_spec_file_changes(self):
+        self.assertEqual(get_specs()['apps']['app-a']['image'], 'app/a')
+        spec_path = os.path.join(self.temp_specs_path, 'apps', 'app-a.yml')
+        with open(spec_path, 'r') as f:
+            contents = f.read()
+        with open(spec_path, 'w') as f:
+            f.write(contents.replace('app/a', 'app/changed'))
+        self.assertEqual(get_specs()['apps']['app-a']['image'], 'app/changed')
+
+    def test_specs_are_shared_between_callers(self):
+        self.assertIs(get_specs(), get_specs())
+
+    def test_shared_specs_cannot_be_modified(self):
+        with self.assertRaises(TypeError):
+            del get_specs()['apps']['app-a']
+
+    def test_config_reloaded_after_save(self):
+        save_config_value(constants.CONFIG_NGINX_DIR_KEY, '/some/dir')
+        self.assertEqual(get_config_value(constants.CONFIG_NGINX_DIR_KEY), '/some/dir')
@@ -0,0 +1,80 @@
+import socket
+import threading
+from StringIO import StringIO
+
+from mock import patch
+
+from ...testcases import DustyTestCase
+from dusty import protocol
+from dusty.cli import _run_command, _run_detached_command, _attach_to_job
+
+class TestRunCommand(DustyTestCase):
+    def setUp(self):
+        super(TestRunCommand, self).setUp()
+        self.client_side, self.daemon_side = socket.socketpair()
+        self.client_side.settimeout(1)
+
+    def tearDown(self):
+        super(TestRunCommand, self).tearDown()
+        self.client_side.close()
+        self.daemon_side.close()
+
+    def _respond(self, *messages):
+        def daemon():
+            self.received = protocol.recv_message(self.daemon_side)
+            for kind, body in messages:
+                protocol.send_message(self.daemon_side, kind, body)
+        responder = threading.Thread(target=daemon)
+        responder.start()
+        return responder
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_successful_command(self, fake_stdout):
+        responder = self._respond((protocol.JOB, '1'), (protocol.PROGRESS, 'Step one'), (protocol.LOG, 'done'), (protocol.RESULT, ''))
+        self.assertFalse(_run_command(self.client_side, 'command'))
+        responder.join()
+        self.assertEqual(self.received, (protocol.COMMAND, 'command'))
+        self.assertEqual(fake_stdout.getvalue(), 'Step one\ndone\n')
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_failed_command(self, fake_stdout):
+        responder = self._respond((protocol.JOB, '1'), (protocol.LOG, 'working'), (protocol.ERROR, 'Boom'))
+        self.assertTrue(_run_command(self.client_side, 'command'))
+        responder.join()
+        self.assertEqual(fake_stdout.getvalue(), 'working\nERROR: Boom\n')
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_daemon_hangs_up(self, fake_stdout):
+        self.daemon_side.shutdown(socket.SHUT_WR)
+        self.assertTrue(_run_command(self.client_side, 'command'))
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_detached_command(self, fake_stdout):
+        responder = self._respond((protocol.JOB, '7'))
+        self.assertFalse(_run_detached_command(self.client_side, 'command'))
+        responder.join()
+        self.assertEqual(self.received, (protocol.DETACH, 'command'))
+        self.assertIn('dusty attach 7', fake_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_attach_to_job(self, fake_stdout):
+        responder = self._respond((protocol.JOB, '7'), (protocol.LOG, 'replayed'), (protocol.RESULT, ''))
+        self.assertFalse(_attach_to_job(self.client_side, '7'))
+        responder.join()
+        self.assertEqual(self.received, (protocol.ATTACH, '7'))
+        self.assertEqual(fake_stdout.getvalue(), 'replayed\n')
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_keyboard_interrupt_cancels_job(self, fake_stdout):
+        responses = [(protocol.JOB, '7'), KeyboardInterrupt, (protocol.LOG, 'Restoring'), (protocol.ERROR, 'Job cancelled by client')]
+        with patch('dusty.protocol.recv_message', side_effect=responses):
+            self.assertTrue(_run_command(self.client_side, 'command'))
+        self.assertEqual(protocol.recv_message(self.daemon_side), (protocol.COMMAND, 'command'))
+        self.assertEqual(protocol.recv_message(self.daemon_side), (protocol.CANCEL, ''))
+        self.assertIn('Restoring\nERROR: Job cancelled by client', fake_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_keyboard_interrupt_returns_when_cancel_is_slow(self, fake_stdout):
+        with patch('dusty.protocol.recv_message', side_effect=[(protocol.JOB, '7'), KeyboardInterrupt, socket.timeout]):
+            self.assertTrue(_run_command(self.client_side, 'command'))
+        self.assertIn('dusty attach 7', fake_stdout.getvalue())
@@ -0,0 +1,17 @@
+from ...testcases import DustyTestCase
+from dusty import protocol
+from dusty.commands.jobs import list_jobs, _format_duration
+from dusty.jobs import Job, daemon_jobs
+
+class TestJobsCommands(DustyTestCase):
+    def test_format_duration(self):
+        self.assertEqual(_format_duration(0), '0m00s')
+        self.assertEqual(_format_duration(125.7), '2m05s')
+
+    def test_list_jobs(self):
+        job = daemon_jobs.create('start_local_env')
+        job.finish(Job.SUCCEEDED, protocol.RESULT)
+        list_jobs()
+        row = [line for line in self.last_client_output.splitlines() if 'start_local_env' in line][0]
+        self.assertIn(job.id, row)
+        self.assertIn('succeeded', row)
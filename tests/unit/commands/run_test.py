@@ -1,6 +1,6 @@
 from mock import patch, call
 
-from dusty.commands.run import restart_apps_or_services
+from dusty.commands.run import restart_apps_or_services, restart_apps_affected_by, start_local_env, reset_once
 from dusty.source import Repo
 from ...testcases import DustyTestCase
 
@@ -86,3 +86,208 @@ class TestRunCommands(DustyTestCase):
         fake_get_specs.return_value = self.specs
         restart_apps_or_services(sync=False)
         self.assertFalse(fake_rsync.sync_repos.called)
+
+    @patch('dusty.commands.run.docker.compose.restart_running_services')
+    @patch('dusty.commands.run.rsync')
+    @patch('dusty.commands.run.spec_assembler.get_specs')
+    @patch('dusty.commands.run.spec_assembler.get_assembled_specs')
+    def test_restart_affected_by_lib(self, fake_get_assembled_specs, fake_get_specs, fake_rsync, fake_restart):
+        fake_get_assembled_specs.return_value = self.specs
+        fake_get_specs.return_value = self.specs
+        restart_apps_affected_by('lib-b')
+        fake_rsync.sync_repos.assert_called_once_with([Repo('github.com/lib/b')])
+        fake_restart.assert_called_once_with(['app-a'])
+
+    @patch('dusty.commands.run.docker.compose.restart_running_services')
+    @patch('dusty.commands.run.rsync')
+    @patch('dusty.commands.run.spec_assembler.get_specs')
+    @patch('dusty.commands.run.spec_assembler.get_assembled_specs')
+    def test_restart_affected_by_linked_app(self, fake_get_assembled_specs, fake_get_specs, fake_rsync, fake_restart):
+        fake_get_assembled_specs.return_value = self.specs
+        fake_get_specs.return_value = self.specs
+        restart_apps_affected_by('app-b', sync=False)
+        self.assertFalse(fake_rsync.sync_repos.called)
+        fake_restart.assert_called_once_with(['app-a', 'app-b'])
+
+    @patch('dusty.commands.run.docker.compose.restart_running_services')
+    @patch('dusty.commands.run.rsync')
+    @patch('dusty.commands.run.spec_assembler.get_specs')
+    @patch('dusty.commands.run.spec_assembler.get_assembled_specs')
+    def test_restart_affected_by_lib_of_linked_app(self, fake_get_assembled_specs, fake_get_specs, fake_rsync, fake_restart):
+        specs = self.make_test_specs({
+            'apps': {
+                'app-x': {'repo': 'github.com/app/x', 'depends': {'apps': ['app-y']}},
+                'app-y': {'repo': 'github.com/app/y', 'depends': {'libs': ['lib-l']}}
+            },
+            'libs': {
+                'lib-l': {'repo': 'github.com/lib/l'}
+            }
+        })
+        fake_get_assembled_specs.return_value = specs
+        fake_get_specs.return_value = specs
+        restart_apps_affected_by('lib-l')
+        fake_restart.assert_called_once_with(['app-x', 'app-y'])
+
+    @patch('dusty.commands.run.docker.compose.restart_running_services')
+    @patch('dusty.commands.run.rsync')
+    @patch('dusty.commands.run.spec_assembler.get_specs')
+    @patch('dusty.commands.run.spec_assembler.get_assembled_specs')
+    def test_restart_affected_by_repo(self, fake_get_assembled_specs, fake_get_specs, fake_rsync, fake_restart):
+        fake_get_assembled_specs.return_value = self.specs
+        fake_get_specs.return_value = self.specs
+        restart_apps_affected_by('github.com/lib/a')
+        fake_rsync.sync_repos.assert_called_once_with([Repo('github.com/lib/a')])
+        fake_restart.assert_called_once_with(['app-a'])
+
+    @patch('dusty.commands.run.docker.compose.restart_running_services')
+    @patch('dusty.commands.run.rsync')
+    @patch('dusty.commands.run.spec_assembler.get_specs')
+    @patch('dusty.commands.run.spec_assembler.get_assembled_specs')
+    def test_restart_affected_by_skips_inactive_apps(self, fake_get_assembled_specs, fake_get_specs, fake_rsync, fake_restart):
+        fake_get_assembled_specs.return_value = {'apps': {'app-b': self.specs['apps']['app-b']}}
+        fake_get_specs.return_value = self.specs
+        restart_apps_affected_by('lib-b')
+        self.assertFalse(fake_rsync.sync_repos.called)
+        self.assertFalse(fake_restart.called)
+
+@patch('dusty.commands.run.update_managed_repos')
+@patch('dusty.commands.run.virtualbox')
+@patch('dusty.commands.run.rsync')
+@patch('dusty.commands.run.hosts')
+@patch('dusty.commands.run.nginx')
+@patch('dusty.commands.run.compose')
+@patch('dusty.commands.run.compose_compiler.get_compose_dict')
+@patch('dusty.commands.run.spec_assembler')
+@patch('dusty.commands.run.port_spec_compiler.get_port_spec_document')
+class TestStartLocalEnv(DustyTestCase):
+    def setUp(self):
+        super(TestStartLocalEnv, self).setUp()
+        self.compose_config = {'app-a': {'image': 'app/a', 'links': ['service-a']},
+                               'service-a': {'image': 'postgres'}}
+
+    def _start(self, fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox,
+               previous_compose_config=None, docker_ip='192.168.59.103', outdated_images=()):
+        fake_assembler.get_assembled_specs.return_value = {'bundles': {'bundle-a': {}}, 'apps': {}, 'libs': {}, 'services': {}}
+        fake_assembler.get_all_repos.return_value = set()
+        fake_virtualbox.get_docker_vm_ip.return_value = docker_ip
+        fake_port_spec.return_value = {'nginx': [], 'hosts_file': [], 'docker_compose': {}}
+        fake_compose_dict.return_value = self.compose_config
+        fake_compose.read_composefile.return_value = previous_compose_config
+        fake_compose.services_with_outdated_images.return_value = list(outdated_images)
+        start_local_env()
+
+    def test_compiles_and_writes_outputs(self, fake_port_spec, fake_assembler, fake_compose_dict, fake_compose,
+                                         fake_nginx, fake_hosts, fake_rsync, fake_virtualbox, fake_update_repos):
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox)
+        self.assertEqual(fake_port_spec.call_count, 1)
+        self.assertTrue(fake_hosts.update_hosts_file_from_port_spec.called)
+        self.assertTrue(fake_nginx.update_nginx_from_config.called)
+        fake_compose.update_running_containers_from_spec.assert_called_once_with(self.compose_config, recreate_containers=True)
+
+    def test_skips_unchanged_outputs(self, fake_port_spec, fake_assembler, fake_compose_dict, fake_compose,
+                                     fake_nginx, fake_hosts, fake_rsync, fake_virtualbox, fake_update_repos):
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox)
+        fake_hosts.reset_mock()
+        fake_nginx.reset_mock()
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox,
+                    previous_compose_config=self.compose_config)
+        self.assertEqual(fake_port_spec.call_count, 1)
+        self.assertFalse(fake_hosts.update_hosts_file_from_port_spec.called)
+        self.assertFalse(fake_nginx.update_nginx_from_config.called)
+        self.assertTrue(fake_nginx.ensure_nginx_running.called)
+        self.assertTrue(fake_rsync.sync_repos.called)
+        plan = fake_compose.update_running_containers_from_plan.call_args[0][1]
+        self.assertEqual(plan['keep'], ['app-a', 'service-a'])
+        self.assertFalse(fake_compose.update_running_containers_from_plan.call_args[1]['write'])
+        self.assertIn('No containers need to be created, recreated or removed', self.client_output)
+
+    def test_recompiles_when_vm_ip_changes(self, fake_port_spec, fake_assembler, fake_compose_dict, fake_compose,
+                                           fake_nginx, fake_hosts, fake_rsync, fake_virtualbox, fake_update_repos):
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox)
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox,
+                    docker_ip='192.168.59.104')
+        self.assertEqual(fake_port_spec.call_count, 2)
+
+    def test_recompiles_when_outputs_changed_on_disk(self, fake_port_spec, fake_assembler, fake_compose_dict, fake_compose,
+                                                    fake_nginx, fake_hosts, fake_rsync, fake_virtualbox, fake_update_repos):
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox)
+        fake_nginx.nginx_config_matches.return_value = False
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox)
+        self.assertEqual(fake_port_spec.call_count, 2)
+
+    def test_recreates_only_changed_services(self, fake_port_spec, fake_assembler, fake_compose_dict, fake_compose,
+                                             fake_nginx, fake_hosts, fake_rsync, fake_virtualbox, fake_update_repos):
+        previous_compose_config = {'app-a': {'image': 'app/a', 'links': ['service-a']},
+                                   'service-a': {'image': 'mysql'},
+                                   'app-b': {'image': 'app/b'}}
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox,
+                    previous_compose_config=previous_compose_config)
+        plan = fake_compose.update_running_containers_from_plan.call_args[0][1]
+        self.assertEqual(plan['recreate'], ['app-a', 'service-a'])
+        self.assertEqual(plan['remove'], ['app-b'])
+        self.assertFalse(fake_compose.stop_running_services.called)
+        self.assertIn('Recreate: app-a (links to service-a), service-a (image)', self.client_output)
+        self.assertIn('Remove: app-b', self.client_output)
+
+    def test_recreates_services_with_outdated_images(self, fake_port_spec, fake_assembler, fake_compose_dict, fake_compose,
+                                                     fake_nginx, fake_hosts, fake_rsync, fake_virtualbox, fake_update_repos):
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox,
+                    previous_compose_config=self.compose_config, outdated_images=['service-a'])
+        plan = fake_compose.update_running_containers_from_plan.call_args[0][1]
+        self.assertEqual(plan['recreate'], ['app-a', 'service-a'])
+        self.assertIn('Recreate: app-a (links to service-a), service-a (image was updated)', self.client_output)
+
+    @patch('dusty.commands.run.dns')
+    def test_uses_dns_responder_instead_of_hosts_file(self, fake_dns, fake_port_spec, fake_assembler, fake_compose_dict,
+                                                      fake_compose, fake_nginx, fake_hosts, fake_rsync, fake_virtualbox,
+                                                      fake_update_repos):
+        fake_dns.dns_responder_enabled.return_value = True
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox)
+        fake_dns.update_dns_from_port_spec.assert_called_once_with(fake_port_spec.return_value)
+        self.assertTrue(fake_hosts.remove_dusty_hosts_config.called)
+        self.assertFalse(fake_hosts.update_hosts_file_from_port_spec.called)
+
+    @patch('dusty.commands.run.lib_installs')
+    def test_bakes_lib_installs_before_starting_containers(self, fake_lib_installs, fake_port_spec, fake_assembler,
+                                                           fake_compose_dict, fake_compose, fake_nginx, fake_hosts,
+                                                           fake_rsync, fake_virtualbox, fake_update_repos):
+        fake_lib_installs.ensure_lib_installs_images.return_value = {'app-a': 'dusty/lib_installs_app-a:abc'}
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox)
+        fake_lib_installs.ensure_lib_installs_images.assert_called_once_with(fake_assembler.get_assembled_specs.return_value)
+        self.assertEqual(fake_compose_dict.call_args[0][2], {'app-a': 'dusty/lib_installs_app-a:abc'})
+
+    @patch('dusty.commands.run.docker')
+    def test_recompiles_when_app_image_ids_change(self, fake_docker, fake_port_spec, fake_assembler, fake_compose_dict,
+                                                  fake_compose, fake_nginx, fake_hosts, fake_rsync, fake_virtualbox,
+                                                  fake_update_repos):
+        fake_docker.get_app_image_ids.return_value = {'app-a': 'image-1'}
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox)
+        self.assertEqual(fake_compose_dict.call_args[0][3], {'app-a': 'image-1'})
+        fake_docker.get_app_image_ids.return_value = {'app-a': 'image-2'}
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox,
+                    previous_compose_config=self.compose_config)
+        self.assertEqual(fake_port_spec.call_count, 2)
+
+    @patch('dusty.commands.run.lib_installs')
+    def test_recompiles_when_lib_installs_images_change(self, fake_lib_installs, fake_port_spec, fake_assembler,
+                                                        fake_compose_dict, fake_compose, fake_nginx, fake_hosts,
+                                                        fake_rsync, fake_virtualbox, fake_update_repos):
+        fake_lib_installs.ensure_lib_installs_images.return_value = {'app-a': 'dusty/lib_installs_app-a:abc'}
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox)
+        fake_lib_installs.ensure_lib_installs_images.return_value = {'app-a': 'dusty/lib_installs_app-a:def'}
+        self._start(fake_port_spec, fake_assembler, fake_compose_dict, fake_compose, fake_virtualbox,
+                    previous_compose_config=self.compose_config)
+        self.assertEqual(fake_port_spec.call_count, 2)
+
+class TestResetOnce(DustyTestCase):
+    @patch('dusty.commands.run.virtualbox')
+    def test_reset_once(self, fake_virtualbox):
+        reset_once('app-a')
+        fake_virtualbox.remove_once_markers.assert_called_once_with('app-a')
+        self.assertIn('Use `dusty restart app-a` to run it now', self.client_output[0])
+
+    @patch('dusty.commands.run.virtualbox')
+    def test_reset_once_unknown_app(self, fake_virtualbox):
+        with self.assertRaises(KeyError):
+            reset_once('app-z')
+        self.assertFalse(fake_virtualbox.remove_once_markers.called)
@@ -232,13 +232,13 @@ class TestSetupCommands(DustyTestCase):
         fake_get_default_specs.assert_has_calls([call()])
         fake_get_nginx.assert_has_calls([])
 
-    @patch('dusty.commands.setup.save_config_value')
-    def test_complete_setup(self, fake_save_config_value):
+    @patch('dusty.commands.setup.update_config')
+    def test_complete_setup(self, fake_update_config):
         dict_argument = {constants.CONFIG_MAC_USERNAME_KEY: 'user',
                          constants.CONFIG_SPECS_REPO_KEY: 'github.com/gamechanger/dusty',
                          constants.CONFIG_NGINX_DIR_KEY: '/etc/dusty/nginx'}
         complete_setup(dict_argument)
-        fake_save_config_value.assert_has_calls([call(constants.CONFIG_MAC_USERNAME_KEY,'user'),
-                                                 call(constants.CONFIG_SPECS_REPO_KEY, 'github.com/gamechanger/dusty'),
-                                                 call(constants.CONFIG_NGINX_DIR_KEY, '/etc/dusty/nginx'),
-                                                 call(constants.CONFIG_SETUP_KEY, True)])
+        fake_update_config.assert_called_once_with(**{constants.CONFIG_MAC_USERNAME_KEY: 'user',
+                                                      constants.CONFIG_SPECS_REPO_KEY: 'github.com/gamechanger/dusty',
+                                                      constants.CONFIG_NGINX_DIR_KEY: '/etc/dusty/nginx',
+                                                      constants.CONFIG_SETUP_KEY: True})
@@ -38,7 +38,7 @@ class TestStatusCommands(DustyTestCase):
 
     @patch('dusty.commands.status.PrettyTable')
     @patch('dusty.commands.status.get_dusty_containers')
-    @patch('dusty.schemas.base_schema_class.get_specs_from_path')
+    @patch('dusty.schemas.base_schema_class._spec_sections')
     @patch('dusty.compiler.spec_assembler._get_referenced_apps')
     @patch('dusty.compiler.spec_assembler._get_referenced_libs')
     @patch('dusty.compiler.spec_assembler._get_referenced_services')
@@ -65,7 +65,7 @@ class TestStatusCommands(DustyTestCase):
 
     @patch('dusty.commands.status.PrettyTable')
     @patch('dusty.commands.status.get_dusty_containers')
-    @patch('dusty.schemas.base_schema_class.get_specs_from_path')
+    @patch('dusty.schemas.base_schema_class._spec_sections')
     @patch('dusty.compiler.spec_assembler._get_referenced_apps')
     @patch('dusty.compiler.spec_assembler._get_referenced_libs')
     @patch('dusty.compiler.spec_assembler._get_referenced_services')
@@ -1,8 +1,16 @@
+import os
+import shutil
+import tempfile
+
+import git
+from mock import patch
 from schemer import ValidationException
 
 from ...testcases import DustyTestCase
+from ...fixtures import _write
 from ..utils import apply_required_keys
-from dusty.commands.validate import (_validate_app_references, _validate_cycle_free)
+from dusty.commands import validate
+from dusty.commands.validate import _spec_name_errors, _cycle_errors, _validate_specs, validate_specs_from_path
 from dusty import constants
 
 class ValidatorTest(DustyTestCase):
@@ -23,8 +31,7 @@ class ValidatorTest(DustyTestCase):
         }
         apply_required_keys(specs)
         specs = self.make_test_specs(specs)
-        with self.assertRaises(AssertionError):
-            _validate_app_references(specs['apps']['app1'], specs)
+        self.assertEqual(_spec_name_errors(specs), ['apps app1 references services service2, which does not exist'])
 
     def test_validate_app_with_bad_app(self):
         specs = {'apps': {
@@ -40,8 +47,7 @@ class ValidatorTest(DustyTestCase):
         }
         apply_required_keys(specs)
         specs = self.make_test_specs(specs)
-        with self.assertRaises(AssertionError):
-            _validate_app_references(specs['apps']['app1'], specs)
+        self.assertEqual(_spec_name_errors(specs), ['apps app1 references apps app3, which does not exist'])
 
     def test_validate_app_with_bad_lib(self):
         specs = {'apps': {
@@ -59,8 +65,7 @@ class ValidatorTest(DustyTestCase):
         }
         apply_required_keys(specs)
         specs = self.make_test_specs(specs)
-        with self.assertRaises(AssertionError):
-            _validate_app_references(specs['apps']['app1'], specs)
+        self.assertEqual(_spec_name_errors(specs), ['apps app1 references libs lib2, which does not exist'])
 
     def test_app_cycle_detection(self):
         specs = {'apps': {
@@ -75,8 +80,7 @@ class ValidatorTest(DustyTestCase):
         }
         apply_required_keys(specs)
         specs = self.make_test_specs(specs)
-        with self.assertRaises(ValidationException):
-            _validate_cycle_free(specs)
+        self.assertEqual(_cycle_errors(specs), ['Cycle found between apps: app1'])
 
     def test_lib_cycle_detection(self):
         specs = {
@@ -107,5 +111,136 @@ class ValidatorTest(DustyTestCase):
         }
         apply_required_keys(specs)
         specs = self.make_test_specs(specs)
+        self.assertEqual(_cycle_errors(specs), ['Cycle found between libs: lib1, lib2, lib3'])
+
+    def test_all_cycles_reported(self):
+        specs = {
+            'apps': {
+                'app1': {'depends': {'apps': ['app2']}},
+                'app2': {'depends': {'apps': ['app1']}},
+                'app3': {'depends': {'apps': ['app1'], 'libs': ['lib1']}}
+            },
+            'libs': {
+                'lib1': {'depends': {'libs': ['lib2']}},
+                'lib2': {'depends': {'libs': ['lib1']}},
+                'lib3': {'depends': {'libs': ['lib3']}}
+            }
+        }
+        apply_required_keys(specs)
+        specs = self.make_test_specs(specs)
+        self.assertEqual(sorted(_cycle_errors(specs)), ['Cycle found between apps: app1, app2',
+                                                        'Cycle found between libs: lib1, lib2',
+                                                        'Cycle found between libs: lib3'])
+
+    def test_validate_specs_reports_every_problem(self):
+        specs = {
+            'bundles': {'bundle1': {'apps': ['app1', 'app2']}},
+            'apps': {
+                'app1': {'depends': {'apps': ['app1'], 'services': ['service1']}}
+            }
+        }
+        apply_required_keys(specs)
+        specs = self.make_test_specs(specs)
+        with self.assertRaises(ValidationException) as context:
+            _validate_specs(specs)
+        self.assertEqual(context.exception.errors, 'Found 3 problems with your specs')
+        self.assertEqual(self.client_output[-3:], ['apps app1 references services service1, which does not exist',
+                                                   'bundles bundle1 references apps app2, which does not exist',
+                                                   'Cycle found between apps: app1'])
+
+class IncrementalValidatorTest(DustyTestCase):
+    def _validate(self, changed_since=None):
+        with patch('dusty.commands.validate._reference_errors', wraps=validate._reference_errors) as fake_reference_errors:
+            try:
+                validate_specs_from_path(self.temp_specs_path, changed_since=changed_since)
+            finally:
+                self.checked = set(call[0][:2] for call in fake_reference_errors.call_args_list)
+
+    def test_first_validation_checks_everything(self):
+        self._validate()
+        self.assertEqual(len(self.checked), 7)
+
+    def test_unchanged_specs_are_not_checked_again(self):
+        self._validate()
+        self._validate()
+        self.assertEqual(self.checked, set())
+
+    def test_changed_spec_and_referrers_are_checked(self):
+        self._validate()
+        _write('app', 'app-a', {'repo': 'github.com/app/a', 'image': 'app/a', 'mount': '/app/a/changed'})
+        self._validate()
+        self.assertEqual(self.checked, set([('apps', 'app-a'), ('bundles', 'bundle-a')]))
+
+    def test_errors_of_unchanged_specs_are_kept(self):
+        _write('app', 'app-a', {'repo': 'github.com/app/a', 'image': 'app/a', 'mount': '/app/a',
+                                'depends': {'libs': ['lib-b']}})
+        with self.assertRaises(ValidationException):
+            self._validate()
+        _write('app', 'app-c', {'repo': '/gc/repos/c', 'image': 'app/c', 'mount': '/app/c/changed'})
+        with self.assertRaises(ValidationException):
+            self._validate()
+        self.assertNotIn(('apps', 'app-a'), self.checked)
+        self.assertIn('apps app-a references libs lib-b, which does not exist', self.client_output)
+
+    def test_adding_referenced_spec_rechecks_referrers(self):
+        _write('app', 'app-a', {'repo': 'github.com/app/a', 'image': 'app/a', 'mount': '/app/a',
+                                'depends': {'libs': ['lib-b']}})
         with self.assertRaises(ValidationException):
-            _validate_cycle_free(specs)
+            self._validate()
+        _write('lib', 'lib-b', {'repo': 'github.com/lib/b', 'mount': '/lib/b'})
+        self._validate()
+        self.assertEqual(self.checked, set([('apps', 'app-a'), ('libs', 'lib-b')]))
+
+    def test_new_cycle_through_changed_spec(self):
+        self._validate()
+        _write('lib', 'lib-a', {'repo': 'github.com/lib/a', 'mount': '/lib/a', 'depends': {'libs': ['lib-a']}})
+        with self.assertRaises(ValidationException):
+            self._validate()
+        self.assertIn('Cycle found between libs: lib-a', self.client_output)
+        _write('lib', 'lib-a', {'repo': 'github.com/lib/a', 'mount': '/lib/a'})
+        self._validate()
+
+    def test_changed_since_git_ref(self):
+        repo = git.Repo.init(self.temp_specs_path)
+        repo.git.config('user.name', 'Dusty')
+        repo.git.config('user.email', 'dusty@example.com')
+        repo.git.add('.')
+        repo.git.commit('-m', 'Initial specs')
+        _write('app', 'app-b', {'repo': 'github.com/app/b', 'image': 'app/b', 'mount': '/app/b/changed'})
+        _write('service', 'service-b', {'image': 'service/b'})
+        self._validate(changed_since='HEAD')
+        self.assertEqual(self.checked, set([('apps', 'app-b'), ('bundles', 'bundle-b'), ('services', 'service-b')]))
+
+    def test_changed_since_does_not_hide_errors_from_next_validation(self):
+        _write('app', 'app-a', {'repo': 'github.com/app/a', 'image': 'app/a', 'mount': '/app/a',
+                                'depends': {'libs': ['lib-b']}})
+        repo = git.Repo.init(self.temp_specs_path)
+        repo.git.config('user.name', 'Dusty')
+        repo.git.config('user.email', 'dusty@example.com')
+        repo.git.add('.')
+        repo.git.commit('-m', 'Initial specs')
+        self._validate(changed_since='HEAD')
+        with self.assertRaises(ValidationException):
+            self._validate()
+        self.assertIn('apps app-a references libs lib-b, which does not exist', self.client_output)
+
+    def test_state_is_kept_per_specs_path(self):
+        self._validate()
+        other_specs_path = tempfile.mkdtemp()
+        try:
+            shutil.rmtree(other_specs_path)
+            shutil.copytree(self.temp_specs_path, other_specs_path)
+            validate_specs_from_path(other_specs_path)
+            self._validate()
+            self.assertEqual(self.checked, set())
+        finally:
+            shutil.rmtree(other_specs_path)
+
+    def test_warns_when_state_cannot_be_saved(self):
+        with open(os.path.join(self.temp_repos_path, 'not_a_dir'), 'w'):
+            pass
+        constants.VALIDATION_STATE_DIR = os.path.join(self.temp_repos_path, 'not_a_dir', 'validation_state')
+        self._validate()
+        self.assertTrue(any(line.startswith('Could not save validation results') for line in self.client_output))
+        self._validate()
+        self.assertEqual(len(self.checked), 7)
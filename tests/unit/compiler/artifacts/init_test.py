@@ -0,0 +1,50 @@
+from dusty import constants
+from dusty.config import save_config_value
+from dusty.compiler.artifacts import compilation_fingerprint, load_compiled_outputs, save_compiled_outputs
+from ....testcases import DustyTestCase
+
+class TestCompiledArtifacts(DustyTestCase):
+    def setUp(self):
+        super(TestCompiledArtifacts, self).setUp()
+        self.assembled_specs = {'apps': {'app-a': {'repo': '/repo-a', 'image': 'app/a'}}, 'libs': {}, 'services': {}}
+        self.outputs = {'port_spec': {'nginx': [], 'hosts_file': []},
+                        'nginx_config': 'http {}',
+                        'compose_config': {'app-a': {'image': 'app/a'}}}
+
+    def test_fingerprint_is_stable(self):
+        self.assertEqual(compilation_fingerprint(self.assembled_specs, '192.168.59.103'),
+                         compilation_fingerprint(dict(self.assembled_specs), '192.168.59.103'))
+
+    def test_fingerprint_changes_with_docker_ip(self):
+        self.assertNotEqual(compilation_fingerprint(self.assembled_specs, '192.168.59.103'),
+                            compilation_fingerprint(self.assembled_specs, '192.168.59.104'))
+
+    def test_fingerprint_changes_with_specs(self):
+        fingerprint = compilation_fingerprint(self.assembled_specs, '192.168.59.103')
+        self.assembled_specs['apps']['app-a']['image'] = 'app/b'
+        self.assertNotEqual(fingerprint, compilation_fingerprint(self.assembled_specs, '192.168.59.103'))
+
+    def test_fingerprint_changes_with_repo_overrides(self):
+        fingerprint = compilation_fingerprint(self.assembled_specs, '192.168.59.103')
+        save_config_value(constants.CONFIG_REPO_OVERRIDES_KEY, {'github.com/app/a': '/somewhere/else'})
+        self.assertNotEqual(fingerprint, compilation_fingerprint(self.assembled_specs, '192.168.59.103'))
+
+    def test_fingerprint_changes_with_lib_installs_images(self):
+        self.assertNotEqual(compilation_fingerprint(self.assembled_specs, '192.168.59.103', {'app-a': 'dusty/lib_installs_app-a:abc'}),
+                            compilation_fingerprint(self.assembled_specs, '192.168.59.103', {'app-a': 'dusty/lib_installs_app-a:def'}))
+
+    def test_load_with_nothing_saved(self):
+        self.assertIsNone(load_compiled_outputs('abc'))
+
+    def test_save_and_load(self):
+        save_compiled_outputs('abc', self.outputs)
+        self.assertEqual(load_compiled_outputs('abc'), self.outputs)
+
+    def test_load_with_other_fingerprint(self):
+        save_compiled_outputs('abc', self.outputs)
+        self.assertIsNone(load_compiled_outputs('def'))
+
+    def test_load_corrupt_outputs(self):
+        with open(constants.COMPILED_OUTPUTS_PATH, 'w') as f:
+            f.write('not a pickle')
+        self.assertIsNone(load_compiled_outputs('abc'))
@@ -0,0 +1,76 @@
+from unittest import TestCase
+
+from dusty.compiler.compose.plan import get_up_plan, describe_up_plan
+
+class TestUpPlan(TestCase):
+    def setUp(self):
+        self.previous = {'app-a': {'image': 'app/a', 'command': 'run-a', 'links': ['app-b', 'service-a']},
+                         'app-b': {'image': 'app/b', 'command': 'run-b', 'links': ['service-a']},
+                         'app-c': {'image': 'app/c', 'links': []},
+                         'service-a': {'image': 'postgres', 'volumes': ['/a:/a']}}
+
+    def _changed(self, name, **changes):
+        compose_config = dict((service, dict(config)) for service, config in self.previous.iteritems())
+        compose_config[name].update(changes)
+        return compose_config
+
+    def test_nothing_changed(self):
+        plan = get_up_plan(self.previous, self.previous)
+        self.assertEqual(plan['recreate'], [])
+        self.assertEqual(plan['create'], [])
+        self.assertEqual(plan['remove'], [])
+        self.assertEqual(plan['keep'], ['app-a', 'app-b', 'app-c', 'service-a'])
+
+    def test_no_previous_config(self):
+        plan = get_up_plan(None, self.previous)
+        self.assertEqual(plan['create'], ['app-a', 'app-b', 'app-c', 'service-a'])
+        self.assertEqual(plan['keep'], [])
+
+    def test_changed_service(self):
+        plan = get_up_plan(self.previous, self._changed('app-a', image='app/a2'))
+        self.assertEqual(plan['recreate'], ['app-a'])
+        self.assertEqual(plan['changes'], {'app-a': ['image']})
+        self.assertEqual(plan['keep'], ['app-b', 'app-c', 'service-a'])
+
+    def test_dependents_are_recreated(self):
+        plan = get_up_plan(self.previous, self._changed('service-a', volumes=['/b:/b']))
+        self.assertEqual(plan['recreate'], ['app-a', 'app-b', 'service-a'])
+        self.assertEqual(plan['changes']['service-a'], ['volumes'])
+        self.assertEqual(plan['changes']['app-b'], 'links to service-a')
+        self.assertEqual(plan['keep'], ['app-c'])
+
+    def test_link_aliases(self):
+        previous = {'app-a': {'image': 'app/a', 'links': ['app-b:b']}, 'app-b': {'image': 'app/b'}}
+        plan = get_up_plan(previous, {'app-a': previous['app-a'], 'app-b': {'image': 'app/b2'}})
+        self.assertEqual(plan['recreate'], ['app-a', 'app-b'])
+
+    def test_added_and_removed_services(self):
+        compose_config = dict(self.previous)
+        del compose_config['app-c']
+        compose_config['app-d'] = {'image': 'app/d'}
+        plan = get_up_plan(self.previous, compose_config)
+        self.assertEqual(plan['create'], ['app-d'])
+        self.assertEqual(plan['remove'], ['app-c'])
+        self.assertEqual(plan['recreate'], [])
+
+    def test_no_recreate(self):
+        plan = get_up_plan(self.previous, self._changed('service-a', image='mysql'), recreate_containers=False)
+        self.assertEqual(plan['recreate'], [])
+        self.assertEqual(plan['keep'], ['app-a', 'app-b', 'app-c', 'service-a'])
+
+    def test_describe_up_plan(self):
+        compose_config = self._changed('app-b', command='run-b2', image='app/b2')
+        compose_config['app-d'] = {'image': 'app/d'}
+        self.assertEqual(describe_up_plan(get_up_plan(self.previous, compose_config)),
+                         ['Create: app-d',
+                          'Recreate: app-a (links to app-b), app-b (command, image)',
+                          'Leave running: app-c, service-a'])
+
+    def test_outdated_image_recreates_service_and_dependents(self):
+        plan = get_up_plan(self.previous, self.previous, outdated_images=['service-a'])
+        self.assertEqual(plan['recreate'], ['app-a', 'app-b', 'service-a'])
+        self.assertEqual(plan['changes']['service-a'], 'image was updated')
+
+    def test_outdated_image_kept_without_recreate(self):
+        plan = get_up_plan(self.previous, self.previous, recreate_containers=False, outdated_images=['service-a'])
+        self.assertEqual(plan['recreate'], [])
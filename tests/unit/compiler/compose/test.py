@@ -1,11 +1,11 @@
 from mock import patch, call
-from copy import copy
 
 from dusty import constants
 from dusty.compiler.compose import (get_compose_dict, _composed_app_dict,
                                     _get_ports_list, _compile_docker_command, _get_compose_volumes,
                                     _lib_install_command, _lib_install_commands_for_app, _conditional_links,
-                                    get_app_volume_mounts, get_lib_volume_mounts)
+                                    get_app_volume_mounts, get_lib_volume_mounts, libs_to_bake,
+                                    once_marker_path)
 from dusty.compiler import compose
 from ..test_test_cases import all_test_configs
 from ....testcases import DustyTestCase
@@ -82,9 +82,10 @@ class TestComposeCompiler(DustyTestCase):
     def test_composed_volumes(self, *args):
         expected_volumes = [
             '/cp/app1:/cp',
+            '/persist/once_markers/app1:/var/lib/dusty/once',
             '/Users/gc/app1:/gc/app1',
-            '/Users/gc/lib1:/gc/lib1',
-            '/Users/gc/lib2:/gc/lib2'
+            '/Users/gc/lib2:/gc/lib2',
+            '/Users/gc/lib1:/gc/lib1'
         ]
         returned_volumes = _get_compose_volumes('app1', basic_specs)
         self.assertEqual(expected_volumes, returned_volumes)
@@ -92,8 +93,8 @@ class TestComposeCompiler(DustyTestCase):
     def testget_app_volume_mounts_1(self, *args):
         expected_volumes = [
             '/Users/gc/app1:/gc/app1',
-            '/Users/gc/lib1:/gc/lib1',
-            '/Users/gc/lib2:/gc/lib2'
+            '/Users/gc/lib2:/gc/lib2',
+            '/Users/gc/lib1:/gc/lib1'
         ]
         returned_volumes = get_app_volume_mounts('app1', basic_specs)
         self.assertEqual(expected_volumes, returned_volumes)
@@ -117,34 +118,71 @@ class TestComposeCompiler(DustyTestCase):
         self.assertEqual(expected_volumes, returned_volumes)
 
     def test_compile_command_with_once(self, *args):
-        expected_command_list = ["sh -c \"cd /gc/lib1 && ./install.sh",
-                                 " cd /gc/lib2 && python setup.py develop",
+        once_marker = once_marker_path(basic_specs['apps']['app1'])
+        expected_command_list = ["sh -c \"if [ ! -f /var/lib/dusty/lib_installs/lib2 ] || "
+                                 "[ -n \\\"$(find /gc/lib2 -newer /var/lib/dusty/lib_installs/lib2 | head -n 1)\\\" ]",
+                                 " then cd /gc/lib2 && python setup.py develop && mkdir -p /var/lib/dusty/lib_installs && "
+                                 "touch /var/lib/dusty/lib_installs/lib2",
+                                 " fi",
+                                 " if [ ! -f /var/lib/dusty/lib_installs/lib1 ] || "
+                                 "[ -n \\\"$(find /gc/lib1 -newer /var/lib/dusty/lib_installs/lib1 | head -n 1)\\\" ]",
+                                 " then cd /gc/lib1 && ./install.sh && mkdir -p /var/lib/dusty/lib_installs && "
+                                 "touch /var/lib/dusty/lib_installs/lib1",
+                                 " fi",
                                  " cd /gc/app1",
                                  " export PATH=$PATH:/gc/app1",
-                                 " if [ ! -f /var/run/dusty/docker_first_time_started ]",
-                                 " then mkdir -p /var/run/dusty",
-                                 " touch /var/run/dusty/docker_first_time_started",
-                                 " one_time.sh",
+                                 " if [ ! -f {} ]".format(once_marker),
+                                 " then one_time.sh && rm -f /var/lib/dusty/once/* && touch {}".format(once_marker),
                                  " fi",
                                  " always.sh\""]
         returned_command = _compile_docker_command('app1', basic_specs).split(";")
         self.assertEqual(expected_command_list, returned_command)
 
     def test_compile_command_without_once(self, *args):
-        new_specs = copy(basic_specs)
-        new_specs['apps']['app1']['commands']['once'] = ''
-        expected_command_list = ["sh -c \"cd /gc/lib1 && ./install.sh",
-                                 " cd /gc/lib2 && python setup.py develop",
+        app1 = basic_specs['apps']['app1']
+        app1 = app1.evolve(commands=dict(app1['commands'], once=''))
+        new_specs = dict(basic_specs, apps=dict(basic_specs['apps'], app1=app1))
+        once_marker = once_marker_path(app1)
+        expected_command_list = ["sh -c \"if [ ! -f /var/lib/dusty/lib_installs/lib2 ] || "
+                                 "[ -n \\\"$(find /gc/lib2 -newer /var/lib/dusty/lib_installs/lib2 | head -n 1)\\\" ]",
+                                 " then cd /gc/lib2 && python setup.py develop && mkdir -p /var/lib/dusty/lib_installs && "
+                                 "touch /var/lib/dusty/lib_installs/lib2",
+                                 " fi",
+                                 " if [ ! -f /var/lib/dusty/lib_installs/lib1 ] || "
+                                 "[ -n \\\"$(find /gc/lib1 -newer /var/lib/dusty/lib_installs/lib1 | head -n 1)\\\" ]",
+                                 " then cd /gc/lib1 && ./install.sh && mkdir -p /var/lib/dusty/lib_installs && "
+                                 "touch /var/lib/dusty/lib_installs/lib1",
+                                 " fi",
                                  " cd /gc/app1",
                                  " export PATH=$PATH:/gc/app1",
-                                 " if [ ! -f /var/run/dusty/docker_first_time_started ]",
-                                 " then mkdir -p /var/run/dusty",
-                                 " touch /var/run/dusty/docker_first_time_started",
+                                 " if [ ! -f {} ]".format(once_marker),
+                                 " then rm -f /var/lib/dusty/once/* && touch {}".format(once_marker),
                                  " fi",
                                  " always.sh\""]
         returned_command = _compile_docker_command('app1', new_specs).split(";")
         self.assertEqual(expected_command_list, returned_command)
 
+    def test_compile_command_installs_libs_for_built_app(self, *args):
+        app1 = basic_specs['apps']['app1'].plain_dict()
+        del app1['image']
+        app1['build'] = '/gc/app1'
+        new_specs = dict(basic_specs, apps=dict(basic_specs['apps'], app1=get_app_dusty_schema(app1)))
+        returned_command = _compile_docker_command('app1', new_specs).split(";")
+        self.assertEqual(["sh -c \"cd /gc/lib2 && python setup.py develop", " cd /gc/lib1 && ./install.sh"], returned_command[:2])
+
+    def test_once_marker_path(self, *args):
+        app1 = basic_specs['apps']['app1']
+        once_marker = once_marker_path(app1)
+        self.assertTrue(once_marker.startswith('/var/lib/dusty/once/'))
+        self.assertEqual(once_marker, once_marker_path(app1.evolve(mount='/gc/other')))
+        self.assertNotEqual(once_marker, once_marker_path(app1.evolve(commands=dict(app1['commands'], once='other.sh'))))
+        self.assertNotEqual(once_marker, once_marker_path(app1.evolve(image='otherimage')))
+        self.assertNotEqual(once_marker_path(app1, 'image-id-1'), once_marker_path(app1, 'image-id-2'))
+
+    def test_libs_to_bake(self, *args):
+        self.assertEqual(libs_to_bake('app1', basic_specs), ['lib2', 'lib1'])
+        self.assertEqual(libs_to_bake('app2', basic_specs), [])
+
     def test_ports_list(self, *args):
         expected_port_lists = {
             'app1': [
@@ -159,7 +197,7 @@ class TestComposeCompiler(DustyTestCase):
     @patch('dusty.compiler.compose._compile_docker_command', return_value="what command?")
     def test_composed_app(self, *args):
         expected_app_config = {
-            'image': 'awesomeGCimage',
+            'image': 'dusty/lib_installs_app1:0123456789ab',
             'command': 'what command?',
             'links': [
                 'service1',
@@ -168,18 +206,24 @@ class TestComposeCompiler(DustyTestCase):
             ],
             'volumes': [
                 '/cp/app1:/cp',
+                '/persist/once_markers/app1:/var/lib/dusty/once',
                 '/Users/gc/app1:/gc/app1',
-                '/Users/gc/lib1:/gc/lib1',
-                '/Users/gc/lib2:/gc/lib2'
+                '/Users/gc/lib2:/gc/lib2',
+                '/Users/gc/lib1:/gc/lib1'
             ],
             'ports': [
                 '8000:1',
                 '8005:90'
             ]
         }
-        retured_config = _composed_app_dict('app1', basic_specs, basic_port_specs)
+        retured_config = _composed_app_dict('app1', basic_specs, basic_port_specs,
+                                            {'app1': 'dusty/lib_installs_app1:0123456789ab'})
         self.assertEqual(expected_app_config, retured_config)
 
+    @patch('dusty.compiler.compose._compile_docker_command', return_value="what command?")
+    def test_composed_app_without_lib_installs_image(self, *args):
+        self.assertEqual(_composed_app_dict('app1', basic_specs, basic_port_specs)['image'], 'awesomeGCimage')
+
     def test_lib_install_command(self, *args):
         lib_spec = {
             'repo': 'some repo',
@@ -204,9 +248,9 @@ class TestComposeCompiler(DustyTestCase):
         _lib_install_commands_for_app('app1', basic_specs)
         # Mock is weird, it picks up on the truthiness calls we do
         # on the result after we call the function
-        fake_lib_install.assert_has_calls([call(basic_specs['libs']['lib1']),
+        fake_lib_install.assert_has_calls([call(basic_specs['libs']['lib2']),
                                            call().__nonzero__(),
-                                           call(basic_specs['libs']['lib2']),
+                                           call(basic_specs['libs']['lib1']),
                                            call().__nonzero__()])
 
     def test_get_available_app_links_no_services_1(self, *args):
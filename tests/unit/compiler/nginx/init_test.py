@@ -1,84 +1,203 @@
 from ....testcases import DustyTestCase
 from dusty.compiler.nginx import (get_nginx_configuration_spec, _nginx_listen_string, _nginx_location_spec,
-                                  _nginx_proxy_string, _nginx_server_spec, _nginx_server_name_string)
+                                  _nginx_proxy_string, _nginx_server_spec, _nginx_server_name_string,
+                                  _nginx_upstream_spec)
 
 def cleanse(string):
     return string.replace("\n", "").replace("\t", "").replace(" ", "")
 
+def default_proxy_settings(host):
+    return """proxy_http_version 1.1;
+                    proxy_set_header Connection "";
+                    proxy_set_header Host {};
+                    proxy_connect_timeout 5s;
+                    proxy_read_timeout 300s;
+                    proxy_buffer_size 16k;
+                    proxy_buffers 32 16k;""".format(host)
+
+GZIP_SETTINGS = """gzip on;
+                gzip_proxied any;
+                gzip_types text/plain text/css text/xml application/javascript application/json application/xml image/svg+xml;"""
+
 class TestPortSpecCompiler(DustyTestCase):
     def setUp(self):
         super(TestPortSpecCompiler, self).setUp()
         self.port_spec_dict_1 = {'nginx': [{'proxied_port':'80',
                                             'boot2docker_ip': '127.0.0.0',
                                             'host_address': 'local.gc.com',
-                                            'host_port': '80'}]}
+                                            'host_port': '80',
+                                            'app_name': 'gcweb',
+                                            'proxy_settings': {}}]}
         self.port_spec_dict_2 = {'nginx': [{'proxied_port':'8000',
                                             'boot2docker_ip': '127.0.0.0',
                                             'host_address': 'local.gcapi.com',
-                                            'host_port': '8001'}]}
+                                            'host_port': '8001',
+                                            'app_name': 'gcapi',
+                                            'proxy_settings': {}}]}
 
     def test_get_nginx_configuration_spec_1(self):
         expected_output = cleanse("""http {
+            upstream dusty_gcweb_80 {
+                server 127.0.0.0:80;
+                keepalive 16;
+            }
             server {
                 client_max_body_size 500M;
                 listen 80;
                 server_name local.gc.com;
+                %s
                 location / {
-                    proxy_pass http://127.0.0.0:80;
+                    proxy_pass http://dusty_gcweb_80;
+                    %s
                 }
             }
         }
-        """)
+        """ % (GZIP_SETTINGS, default_proxy_settings('127.0.0.0:80')))
         output = cleanse(get_nginx_configuration_spec(self.port_spec_dict_1))
         self.assertEqual(output, expected_output)
 
     def test_get_nginx_configuration_spec_2(self):
         expected_output = cleanse("""http {
+            upstream dusty_gcapi_8000 {
+                server 127.0.0.0:8000;
+                keepalive 16;
+            }
             server {
                 client_max_body_size 500M;
                 listen 8001;
                 server_name local.gcapi.com;
+                %s
                 location / {
-                    proxy_pass http://127.0.0.0:8000;
+                    proxy_pass http://dusty_gcapi_8000;
+                    %s
                 }
             }
         }
-        """)
+        """ % (GZIP_SETTINGS, default_proxy_settings('127.0.0.0:8000')))
         output = cleanse(get_nginx_configuration_spec(self.port_spec_dict_2))
         self.assertEqual(output, expected_output)
 
     def test_get_nginx_configuration_spec_3(self):
-        port_spec = {'nginx': [{'proxied_port':'8000',
-                                'boot2docker_ip': '127.0.0.0',
-                                'host_address': 'local.gcapi.com',
-                                'host_port': '8001'},
-                               {'proxied_port':'80',
-                                'host_address': 'local.gc.com',
-                                'boot2docker_ip': '127.0.0.0',
-                                'host_port': '80'}]}
+        port_spec = {'nginx': self.port_spec_dict_2['nginx'] + self.port_spec_dict_1['nginx']}
 
         expected_output = cleanse("""http {
+            upstream dusty_gcapi_8000 {
+                server 127.0.0.0:8000;
+                keepalive 16;
+            }
+            upstream dusty_gcweb_80 {
+                server 127.0.0.0:80;
+                keepalive 16;
+            }
             server {
                 client_max_body_size 500M;
                 listen 8001;
                 server_name local.gcapi.com;
+                %s
                 location / {
-                    proxy_pass http://127.0.0.0:8000;
+                    proxy_pass http://dusty_gcapi_8000;
+                    %s
                 }
             }
             server {
                 client_max_body_size 500M;
                 listen 80;
                 server_name local.gc.com;
+                %s
+                location / {
+                    proxy_pass http://dusty_gcweb_80;
+                    %s
+                }
+            }
+        }
+        """ % (GZIP_SETTINGS, default_proxy_settings('127.0.0.0:8000'),
+               GZIP_SETTINGS, default_proxy_settings('127.0.0.0:80')))
+        output = cleanse(get_nginx_configuration_spec(port_spec))
+        self.assertEqual(output, expected_output)
+
+    def test_get_nginx_configuration_spec_with_overrides(self):
+        self.port_spec_dict_1['nginx'][0]['proxy_settings'] = {'keepalive': 0,
+                                                               'client_max_body_size': '10M',
+                                                               'proxy_read_timeout': 30,
+                                                               'proxy_buffering': False,
+                                                               'gzip': False}
+        expected_output = cleanse("""http {
+            upstream dusty_gcweb_80 {
+                server 127.0.0.0:80;
+            }
+            server {
+                client_max_body_size 10M;
+                listen 80;
+                server_name local.gc.com;
                 location / {
-                    proxy_pass http://127.0.0.0:80;
+                    proxy_pass http://dusty_gcweb_80;
+                    proxy_http_version 1.1;
+                    proxy_set_header Connection "";
+                    proxy_set_header Host 127.0.0.0:80;
+                    proxy_connect_timeout 5s;
+                    proxy_read_timeout 30s;
+                    proxy_buffering off;
                 }
             }
         }
         """)
+        output = cleanse(get_nginx_configuration_spec(self.port_spec_dict_1))
+        self.assertEqual(output, expected_output)
+
+    def test_get_nginx_configuration_spec_groups_by_listen_port(self):
+        port_spec = {'nginx': [dict(self.port_spec_dict_1['nginx'][0]),
+                               dict(self.port_spec_dict_2['nginx'][0], host_port='80', host_address='Local.GCapi.com')]}
+        expected_output = cleanse("""http {
+            server_names_hash_max_size 4096;
+            server_names_hash_bucket_size 128;
+            map_hash_max_size 4096;
+            map_hash_bucket_size 128;
+            upstream dusty_gcweb_80 {
+                server 127.0.0.0:80;
+                keepalive 16;
+            }
+            upstream dusty_gcapi_8000 {
+                server 127.0.0.0:8000;
+                keepalive 16;
+            }
+            map $host $dusty_upstream_80_0 {
+                default dusty_gcweb_80;
+                local.gc.com dusty_gcweb_80;
+                local.gcapi.com dusty_gcapi_8000;
+            }
+            map $host $dusty_proxy_host_80_0 {
+                default 127.0.0.0:80;
+                local.gc.com 127.0.0.0:80;
+                local.gcapi.com 127.0.0.0:8000;
+            }
+            server {
+                client_max_body_size 500M;
+                listen 80;
+                server_name local.gc.com Local.GCapi.com;
+                %s
+                location / {
+                    proxy_pass http://$dusty_upstream_80_0;
+                    %s
+                }
+            }
+        }
+        """ % (GZIP_SETTINGS, default_proxy_settings('$dusty_proxy_host_80_0')))
         output = cleanse(get_nginx_configuration_spec(port_spec))
         self.assertEqual(output, expected_output)
 
+    def test_get_nginx_configuration_spec_splits_servers_by_settings(self):
+        port_spec = {'nginx': [dict(self.port_spec_dict_1['nginx'][0]),
+                               dict(self.port_spec_dict_2['nginx'][0], host_port='80', proxy_settings={'gzip': False}),
+                               dict(self.port_spec_dict_2['nginx'][0], host_port='80', host_address='local.other.com',
+                                    proxied_port='8001')]}
+        output = get_nginx_configuration_spec(port_spec)
+        self.assertEqual(output.count('server {'), 2)
+        self.assertIn('server_name local.gc.com local.other.com;', output)
+        self.assertIn('server_name local.gcapi.com;', output)
+
+    def test_nginx_upstream_name_is_sanitized(self):
+        port_spec = dict(self.port_spec_dict_1['nginx'][0], app_name='gc.web-app')
+        self.assertIn("upstream dusty_gc_web_app_80 {", _nginx_upstream_spec(port_spec))
 
     def test_nginx_listen_string_1(self):
         self.assertEqual("listen 80;", _nginx_listen_string(self.port_spec_dict_1['nginx'][0]))
@@ -93,7 +212,7 @@ class TestPortSpecCompiler(DustyTestCase):
         self.assertEqual("server_name local.gcapi.com;", _nginx_server_name_string(self.port_spec_dict_2['nginx'][0]))
 
     def test_nginx_proxy_string_1(self):
-        self.assertEqual("proxy_pass http://127.0.0.0:80;", _nginx_proxy_string(self.port_spec_dict_1['nginx'][0]))
+        self.assertEqual("proxy_pass http://dusty_gcweb_80;", _nginx_proxy_string(self.port_spec_dict_1['nginx'][0]))
 
     def test_nginx_proxy_string_2(self):
-        self.assertEqual("proxy_pass http://127.0.0.0:8000;", _nginx_proxy_string(self.port_spec_dict_2['nginx'][0]))
+        self.assertEqual("proxy_pass http://dusty_gcapi_8000;", _nginx_proxy_string(self.port_spec_dict_2['nginx'][0]))
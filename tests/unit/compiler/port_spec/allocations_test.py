@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from dusty.compiler.port_spec.allocations import PortAllocations, load_port_allocations, save_port_allocations
+from ....testcases import DustyTestCase
+
+class TestPortAllocations(TestCase):
+    def test_allocates_in_order(self):
+        allocations = PortAllocations()
+        self.assertEqual(allocations.port_for('a'), 65000)
+        self.assertEqual(allocations.port_for('b'), 65001)
+        self.assertEqual(allocations.port_for('a'), 65000)
+
+    def test_keeps_saved_ports(self):
+        allocations = PortAllocations({'a': 65003, 'b': 65001})
+        self.assertEqual(allocations.port_for('a'), 65003)
+        self.assertEqual(allocations.port_for('b'), 65001)
+        self.assertFalse(allocations.changed)
+
+    def test_reuses_lowest_free_port(self):
+        allocations = PortAllocations({'a': 65000, 'b': 65001, 'c': 65002, 'd': 65004})
+        allocations.release_all_except(set(['a', 'c', 'd']))
+        self.assertEqual(allocations.port_for('e'), 65001)
+        self.assertEqual(allocations.port_for('f'), 65003)
+        self.assertEqual(allocations.port_for('g'), 65005)
+
+    def test_reallocates_colliding_ports(self):
+        allocations = PortAllocations({'a': 65000, 'b': 65000})
+        self.assertEqual(sorted([allocations.port_for('a'), allocations.port_for('b')]), [65000, 65001])
+        self.assertTrue(allocations.changed)
+
+class TestPortAllocationsStorage(DustyTestCase):
+    def test_load_with_nothing_saved(self):
+        self.assertEqual(load_port_allocations().ports_by_key, {})
+
+    def test_save_and_load(self):
+        allocations = PortAllocations()
+        allocations.port_for('a')
+        allocations.port_for('b')
+        save_port_allocations(allocations)
+        self.assertEqual(load_port_allocations().ports_by_key, {'a': 65000, 'b': 65001})
@@ -2,6 +2,11 @@ from ....testcases import DustyTestCase
 from dusty.compiler.port_spec import (_docker_compose_port_spec, _nginx_port_spec,
                                       _hosts_file_port_spec, get_port_spec_document, LOCALHOST,
                                       ReusedHostFullAddress, ReusedContainerPort)
+from ...utils import apply_required_keys
+
+def _with_defaults(expanded_spec):
+    apply_required_keys(expanded_spec)
+    return expanded_spec
 
 class TestPortSpecCompiler(DustyTestCase):
     def setUp(self):
@@ -24,14 +29,18 @@ class TestPortSpecCompiler(DustyTestCase):
             {'proxied_port': '65000',
              'boot2docker_ip': '192.168.5.10',
              'host_address': 'local.gc.com',
-             'host_port': '80'})
+             'host_port': '80',
+             'app_name': None,
+             'proxy_settings': {}})
 
     def test_nginx_port_spec_2(self):
         self.assertEqual(_nginx_port_spec(self.test_host_forwarding_spec_2, '65001', '192.168.5.10'),
             {'proxied_port': '65001',
              'boot2docker_ip': '192.168.5.10',
              'host_address': 'local.alex.com',
-             'host_port': '8001'})
+             'host_port': '8001',
+             'app_name': None,
+             'proxy_settings': {}})
 
     def test_hosts_file_port_spec_1(self):
         self.assertEqual(_hosts_file_port_spec(self.test_host_forwarding_spec_1),
@@ -54,10 +63,12 @@ class TestPortSpecCompiler(DustyTestCase):
                              'nginx':[{'proxied_port': '65000',
                                        'boot2docker_ip': '192.168.5.10',
                                        'host_address': 'local.gc.com',
-                                       'host_port': '80'}],
+                                       'host_port': '80',
+                                       'app_name': 'gcweb',
+                                       'proxy_settings': {}}],
                              'hosts_file':[{'forwarded_ip': LOCALHOST,
                                             'host_address': 'local.gc.com'}]}
-        self.assertEqual(get_port_spec_document(expanded_spec, '192.168.5.10'), correct_port_spec)
+        self.assertEqual(get_port_spec_document(_with_defaults(expanded_spec), '192.168.5.10'), correct_port_spec)
 
     def test_get_port_spec_document_2_apps(self):
         expanded_spec = {'apps':
@@ -76,16 +87,20 @@ class TestPortSpecCompiler(DustyTestCase):
                              'nginx':[{'proxied_port': '65000',
                                        'boot2docker_ip': '192.168.5.10',
                                        'host_address': 'local.gcapi.com',
-                                       'host_port': '8000'},
+                                       'host_port': '8000',
+                                       'app_name': 'gcapi',
+                                       'proxy_settings': {}},
                                       {'proxied_port': '65001',
                                        'boot2docker_ip': '192.168.5.10',
                                        'host_address': 'local.gc.com',
-                                       'host_port': '80'}],
+                                       'host_port': '80',
+                                       'app_name': 'gcweb',
+                                       'proxy_settings': {}}],
                              'hosts_file':[{'forwarded_ip': LOCALHOST,
                                             'host_address': 'local.gcapi.com'},
                                           {'forwarded_ip': LOCALHOST,
                                             'host_address': 'local.gc.com'}]}
-        self.assertEqual(get_port_spec_document(expanded_spec, '192.168.5.10'), correct_port_spec)
+        self.assertEqual(get_port_spec_document(_with_defaults(expanded_spec), '192.168.5.10'), correct_port_spec)
 
     def test_get_port_spec_document_2_apps_same_host_port(self):
         expanded_spec = {'apps':
@@ -104,15 +119,19 @@ class TestPortSpecCompiler(DustyTestCase):
                              'nginx':[{'proxied_port': '65000',
                                        'host_address': 'local.gc.com',
                                        'boot2docker_ip': '192.168.5.10',
-                                       'host_port': '8000'},
+                                       'host_port': '8000',
+                                       'app_name': 'gcapi',
+                                       'proxy_settings': {}},
                                       {'proxied_port': '65001',
                                        'boot2docker_ip': '192.168.5.10',
                                        'host_address': 'local.gc.com',
-                                       'host_port': '80'}],
+                                       'host_port': '80',
+                                       'app_name': 'gcweb',
+                                       'proxy_settings': {}}],
                              'hosts_file':[{'forwarded_ip': LOCALHOST,
                                             'host_address': 'local.gc.com'}]}
         self.maxDiff = None
-        self.assertEqual(get_port_spec_document(expanded_spec, '192.168.5.10'), correct_port_spec)
+        self.assertEqual(get_port_spec_document(_with_defaults(expanded_spec), '192.168.5.10'), correct_port_spec)
 
     def test_port_spec_throws_full_address_error(self):
         expanded_spec = {'apps':
@@ -125,7 +144,7 @@ class TestPortSpecCompiler(DustyTestCase):
                                                              'host_port': 80,
                                                              'container_port': 81}]}}}
         with self.assertRaises(ReusedHostFullAddress):
-            get_port_spec_document(expanded_spec, '192.168.5.10')
+            get_port_spec_document(_with_defaults(expanded_spec), '192.168.5.10')
 
     def test_port_spec_throws_container_port(self):
         expanded_spec = {'apps':
@@ -141,7 +160,7 @@ class TestPortSpecCompiler(DustyTestCase):
                                                              'host_port': 82,
                                                              'container_port': 81}]}}}
         with self.assertRaises(ReusedContainerPort):
-            get_port_spec_document(expanded_spec, '192.168.5.10')
+            get_port_spec_document(_with_defaults(expanded_spec), '192.168.5.10')
 
     def test_app_with_multiple_host_forwardings(self):
         expanded_spec = {'apps':
@@ -165,17 +184,40 @@ class TestPortSpecCompiler(DustyTestCase):
                              'nginx':[{'proxied_port': '65000',
                                        'boot2docker_ip': '192.168.5.10',
                                        'host_address': 'local.gcapi.com',
-                                       'host_port': '82'},
+                                       'host_port': '82',
+                                       'app_name': 'gcapi',
+                                       'proxy_settings': {}},
                                       {'proxied_port': '65001',
                                        'boot2docker_ip': '192.168.5.10',
                                        'host_address': 'local.gc.com',
-                                       'host_port': '80'},
+                                       'host_port': '80',
+                                       'app_name': 'gcweb',
+                                       'proxy_settings': {}},
                                       {'proxied_port': '65002',
                                        'boot2docker_ip': '192.168.5.10',
                                        'host_address': 'local.gc.com',
-                                       'host_port': '81'}],
+                                       'host_port': '81',
+                                       'app_name': 'gcweb',
+                                       'proxy_settings': {}}],
                              'hosts_file':[{'forwarded_ip': LOCALHOST,
                                             'host_address': 'local.gcapi.com'},
                                            {'forwarded_ip': LOCALHOST,
                                             'host_address': 'local.gc.com'}]}
-        self.assertEqual(get_port_spec_document(expanded_spec, '192.168.5.10'), correct_port_spec)
+        self.assertEqual(get_port_spec_document(_with_defaults(expanded_spec), '192.168.5.10'), correct_port_spec)
+
+    def _forwarded_ports(self, app_names):
+        expanded_spec = {'apps': dict((app_name, {'host_forwarding': [{'host_name': 'local.{}.com'.format(app_name),
+                                                                       'host_port': 80,
+                                                                       'container_port': 80}]})
+                                      for app_name in app_names)}
+        port_spec = get_port_spec_document(_with_defaults(expanded_spec), '192.168.5.10')
+        return dict((app_name, mappings[0]['mapped_host_port']) for app_name, mappings in port_spec['docker_compose'].iteritems())
+
+    def test_ports_are_stable_when_apps_are_added(self):
+        self.assertEqual(self._forwarded_ports(['b', 'c']), {'b': '65000', 'c': '65001'})
+        self.assertEqual(self._forwarded_ports(['a', 'b', 'c']), {'a': '65002', 'b': '65000', 'c': '65001'})
+
+    def test_ports_of_removed_apps_are_reused(self):
+        self._forwarded_ports(['a', 'b', 'c'])
+        self.assertEqual(self._forwarded_ports(['a', 'c']), {'a': '65000', 'c': '65002'})
+        self.assertEqual(self._forwarded_ports(['a', 'c', 'd']), {'a': '65000', 'c': '65002', 'd': '65001'})
@@ -37,8 +37,8 @@ class TestSpecAssemblerTestCases(DustyTestCase):
 
     @all_test_configs
     def test_expands_libs_in_apps(self, test_config, case_specs, assembled_specs):
-        spec_assembler._expand_libs_in_apps(case_specs)
-        for app_name, app in case_specs['apps'].iteritems():
+        expanded_apps = spec_assembler._expand_libs_in_apps(case_specs)
+        for app_name, app in expanded_apps.iteritems():
             self.assertEqual(set(app['depends']['libs']), set(assembled_specs['apps'][app_name]['depends']['libs']))
 
     @all_test_configs
@@ -47,15 +47,17 @@ class TestSpecAssemblerTestCases(DustyTestCase):
         bundles = case_specs[constants.CONFIG_BUNDLES_KEY].keys()
         @patch('dusty.compiler.spec_assembler._get_active_bundles', return_value=bundles)
         def run_patched_assembler(case_specs, *args):
-            spec_assembler._get_expanded_active_specs(case_specs)
-        run_patched_assembler(case_specs)
+            return spec_assembler._get_expanded_active_specs(case_specs)
+        case_specs = run_patched_assembler(case_specs)
         for spec_type in ('bundles', 'apps', 'libs', 'services'):
             for name, spec in assembled_specs[spec_type].iteritems():
                 if spec:
                     for spec_level_key, value in spec.iteritems():
-                        if spec_type == 'apps' and spec_level_key == 'depends' and value['libs'] == []:
-                            value['libs'] = set([])
-                        self.assertEquals(value, case_specs[spec_type][name][spec_level_key])
+                        assembled_value = case_specs[spec_type][name][spec_level_key]
+                        if spec_type == 'apps' and spec_level_key == 'depends':
+                            value['libs'] = set(value['libs'])
+                            assembled_value = dict(assembled_value, libs=set(assembled_value['libs']))
+                        self.assertEquals(value, assembled_value)
 
     def test_get_dependent_traverses_tree(self):
         specs = {
@@ -212,7 +214,7 @@ class TestGetExpandedLibSpecs(DustyTestCase):
                 'apps': {
                     'app1': {
                         'depends': {
-                            'libs': set(['lib1', 'lib2', 'lib3']),
+                            'libs': ['lib3', 'lib2', 'lib1'],
                             'apps': ['app2'],
                             'services': []
                         },
@@ -227,13 +229,13 @@ class TestGetExpandedLibSpecs(DustyTestCase):
                 'libs': {
                     'lib1': {
                         'depends': {
-                            'libs': set(['lib2', 'lib3'])
+                            'libs': ['lib3', 'lib2']
                         },
                         'repo': ''
                     },
                     'lib2': {
                         'depends': {
-                            'libs': set(['lib3'])
+                            'libs': ['lib3']
                         },
                         'repo': ''
                     },
@@ -242,7 +244,7 @@ class TestGetExpandedLibSpecs(DustyTestCase):
                     }
                 }
             }
-        spec_assembler._get_expanded_libs_specs(specs)
+        specs = spec_assembler._get_expanded_libs_specs(specs)
         for spec_type in ('apps', 'libs'):
             for name, spec in expected_expanded_specs[spec_type].iteritems():
                 for spec_level_key, value in spec.iteritems():
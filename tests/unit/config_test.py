@@ -1,5 +1,8 @@
 import os
 import tempfile
+import threading
+
+from mock import patch
 
 from ..testcases import DustyTestCase
 from dusty import constants, config
@@ -26,3 +29,33 @@ class TestConfig(DustyTestCase):
         self.assertItemsEqual(config.get_config_value(constants.CONFIG_BUNDLES_KEY), ['bundle-b'])
         config.save_config_value('new_key', 'bacon')
         self.assertEqual(config.get_config_value('new_key'), 'bacon')
+
+    def test_update_config_writes_once(self):
+        with patch('dusty.config.atomic_write') as fake_write:
+            config.update_config(bundles=['bundle-a'], nginx_includes_dir='/nginx')
+        self.assertEqual(fake_write.call_count, 1)
+
+    def test_update_config(self):
+        config.update_config(bundles=['bundle-a'], nginx_includes_dir='/nginx')
+        self.assertEqual(config.get_config_value(constants.CONFIG_BUNDLES_KEY), ['bundle-a'])
+        self.assertEqual(config.get_config_value(constants.CONFIG_NGINX_DIR_KEY), '/nginx')
+
+    def test_update_config_rejects_unknown_mac_username(self):
+        with self.assertRaises(RuntimeError):
+            config.update_config(bundles=['bundle-a'], mac_username='no-such-user-hopefully')
+        self.assertEqual(config.get_config_value(constants.CONFIG_BUNDLES_KEY), [])
+
+    def test_concurrent_updates_are_not_lost(self):
+        def update(i):
+            config.save_config_value('key-{}'.format(i), i)
+        threads = [threading.Thread(target=update, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i in range(10):
+            self.assertEqual(config.get_config_value('key-{}'.format(i)), i)
+
+    def test_get_config_value_returns_copy(self):
+        config.get_config_value(constants.CONFIG_BUNDLES_KEY).append('bundle-a')
+        self.assertEqual(config.get_config_value(constants.CONFIG_BUNDLES_KEY), [])
@@ -0,0 +1,138 @@
+import socket
+import threading
+
+from ..testcases import DustyTestCase
+from dusty import protocol
+from dusty.daemon import _handle_connection, _command_lock, _mutating_command_lock
+from dusty.jobs import Job, daemon_jobs
+from dusty.log import log_to_client
+from dusty.jobs import register_rollback, current_job
+from dusty.log import log_progress_to_client
+from dusty.payload import Payload, read_only, deadline
+
+def _mutating_command():
+    log_to_client('mutated')
+
+def _failing_command():
+    raise RuntimeError('Something broke')
+
+@read_only
+def _read_only_command():
+    pass
+
+def _command_waiting_for_cancel():
+    register_rollback(lambda: log_to_client('rolled back'))
+    log_to_client('started')
+    current_job().wait_for_cancel(5)
+    log_progress_to_client('next step')
+
+@deadline(0.1)
+def _command_with_deadline():
+    current_job().wait_for_cancel(5)
+    log_progress_to_client('next step')
+
+class TestDaemon(DustyTestCase):
+    def setUp(self):
+        super(TestDaemon, self).setUp()
+        self.daemon_side, self.client_side = socket.socketpair()
+        self.client_side.settimeout(1)
+
+    def tearDown(self):
+        super(TestDaemon, self).tearDown()
+        self.client_side.close()
+        if _mutating_command_lock.locked():
+            _mutating_command_lock.release()
+
+    def _send(self, kind, body):
+        worker = threading.Thread(target=_handle_connection, args=(self.daemon_side, True))
+        worker.start()
+        protocol.send_message(self.client_side, kind, body)
+        return worker
+
+    def _receive_all(self, worker):
+        messages = []
+        while True:
+            try:
+                messages.append(protocol.recv_message(self.client_side))
+            except protocol.ConnectionClosed:
+                break
+        worker.join(1)
+        return messages
+
+    def _run_command(self, payload):
+        return self._receive_all(self._send(protocol.COMMAND, payload.serialize()))
+
+    def test_read_only_command_runs_while_mutating_command_holds_lock(self):
+        _mutating_command_lock.acquire()
+        messages = self._run_command(Payload(_read_only_command))
+        self.assertEqual(messages[0][0], protocol.JOB)
+        self.assertEqual(messages[-1], (protocol.RESULT, ''))
+
+    def test_mutating_command_runs_when_lock_is_free(self):
+        messages = self._run_command(Payload(_mutating_command))
+        self.assertEqual(messages[1:], [(protocol.LOG, 'mutated'), (protocol.RESULT, '')])
+        self.assertFalse(_mutating_command_lock.locked())
+
+    def test_failing_command_sends_error(self):
+        messages = self._run_command(Payload(_failing_command))
+        self.assertEqual(messages[-1], (protocol.ERROR, 'Something broke'))
+        self.assertEqual(daemon_jobs.get(messages[0][1]).status, Job.FAILED)
+
+    def test_detached_command_only_returns_job_id(self):
+        _mutating_command_lock.acquire()
+        messages = self._receive_all(self._send(protocol.DETACH, Payload(_mutating_command).serialize()))
+        self.assertEqual(len(messages), 1)
+        kind, job_id = messages[0]
+        self.assertEqual(kind, protocol.JOB)
+        job = daemon_jobs.get(job_id)
+        self.assertFalse(job.finished)
+        _mutating_command_lock.release()
+        self.assertEqual(list(job.follow())[-1], (protocol.RESULT, ''))
+
+    def test_attach_replays_job_output(self):
+        job = daemon_jobs.create('test')
+        job.send_message(protocol.LOG, 'earlier output')
+        job.finish(Job.SUCCEEDED, protocol.RESULT)
+        messages = self._receive_all(self._send(protocol.ATTACH, job.id))
+        self.assertEqual(messages, [(protocol.JOB, job.id), (protocol.LOG, 'earlier output'), (protocol.RESULT, '')])
+
+    def test_attach_to_unknown_job(self):
+        messages = self._receive_all(self._send(protocol.ATTACH, 'no-such-job'))
+        self.assertEqual(messages, [(protocol.ERROR, 'No job found with id no-such-job')])
+
+    def test_mutating_command_waits_for_lock(self):
+        _mutating_command_lock.acquire()
+        acquired = []
+        def run():
+            with _command_lock(_mutating_command):
+                acquired.append(True)
+        waiter = threading.Thread(target=run)
+        waiter.start()
+        waiter.join(0.1)
+        self.assertEqual(acquired, [])
+        _mutating_command_lock.release()
+        waiter.join(1)
+        self.assertEqual(acquired, [True])
+
+    def test_cancel_stops_job_and_rolls_back(self):
+        worker = self._send(protocol.COMMAND, Payload(_command_waiting_for_cancel).serialize())
+        self.assertEqual(protocol.recv_message(self.client_side)[0], protocol.JOB)
+        self.assertEqual(protocol.recv_message(self.client_side), (protocol.LOG, 'started'))
+        protocol.send_message(self.client_side, protocol.CANCEL)
+        messages = self._receive_all(worker)
+        self.assertEqual(messages, [(protocol.LOG, 'rolled back'), (protocol.ERROR, 'Job cancelled by client')])
+        self.assertFalse(_mutating_command_lock.locked())
+
+    def test_command_cancelled_at_deadline(self):
+        messages = self._run_command(Payload(_command_with_deadline))
+        self.assertEqual(messages[-1], (protocol.ERROR, 'Command timed out after 0.1 seconds'))
+        self.assertEqual(daemon_jobs.get(messages[0][1]).status, Job.CANCELLED)
+
+    def test_cancel_while_waiting_for_lock(self):
+        _mutating_command_lock.acquire()
+        worker = self._send(protocol.COMMAND, Payload(_mutating_command).serialize())
+        self.assertEqual(protocol.recv_message(self.client_side)[0], protocol.JOB)
+        self.assertEqual(protocol.recv_message(self.client_side)[1], 'Waiting for another Dusty command to finish...')
+        protocol.send_message(self.client_side, protocol.CANCEL)
+        messages = self._receive_all(worker)
+        self.assertEqual(messages, [(protocol.ERROR, 'Job cancelled by client')])
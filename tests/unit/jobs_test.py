@@ -0,0 +1,106 @@
+import threading
+
+from ..testcases import DustyTestCase
+from dusty import constants, protocol
+from dusty.jobs import (Job, JobRegistry, JobCancelled, set_current_job, raise_if_cancelled,
+                        register_rollback)
+
+class TestJob(DustyTestCase):
+    def setUp(self):
+        super(TestJob, self).setUp()
+        self.job = Job('1', 'start_local_env')
+
+    def test_follow_replays_buffered_output(self):
+        self.job.send_message(protocol.LOG, 'one')
+        self.job.send_message(protocol.LOG, 'two')
+        self.job.finish(Job.SUCCEEDED, protocol.RESULT)
+        self.assertEqual(list(self.job.follow()),
+                         [(protocol.LOG, 'one'), (protocol.LOG, 'two'), (protocol.RESULT, '')])
+
+    def test_follow_waits_for_new_output(self):
+        self.job.send_message(protocol.LOG, 'one')
+        followed = []
+        def follow():
+            followed.extend(self.job.follow())
+        follower = threading.Thread(target=follow)
+        follower.start()
+        self.job.send_message(protocol.LOG, 'two')
+        self.job.finish(Job.FAILED, protocol.ERROR, 'Boom')
+        follower.join(1)
+        self.assertFalse(follower.is_alive())
+        self.assertEqual(followed, [(protocol.LOG, 'one'), (protocol.LOG, 'two'), (protocol.ERROR, 'Boom')])
+
+    def test_finish_sets_status(self):
+        self.assertFalse(self.job.finished)
+        self.job.finish(Job.FAILED, protocol.ERROR, 'Boom')
+        self.assertTrue(self.job.finished)
+        self.assertEqual(self.job.status, Job.FAILED)
+
+    def test_cancel_calls_cancel_handlers(self):
+        cancelled = []
+        self.job.add_cancel_handler(lambda: cancelled.append('kept'))
+        removed = lambda: cancelled.append('removed')
+        self.job.add_cancel_handler(removed)
+        self.job.remove_cancel_handler(removed)
+        self.job.cancel('Stop')
+        self.assertTrue(self.job.cancelled)
+        self.assertEqual(self.job.cancel_reason, 'Stop')
+        self.assertEqual(cancelled, ['kept'])
+
+    def test_cancel_handler_added_after_cancel_runs_immediately(self):
+        cancelled = []
+        self.job.cancel()
+        self.job.add_cancel_handler(lambda: cancelled.append(True))
+        self.assertEqual(cancelled, [True])
+
+    def test_cancel_finished_job_does_nothing(self):
+        self.job.finish(Job.SUCCEEDED, protocol.RESULT)
+        self.job.cancel()
+        self.assertFalse(self.job.cancelled)
+
+    def test_rollbacks_run_most_recent_first(self):
+        rolled_back = []
+        self.job.add_rollback(lambda: rolled_back.append(1))
+        self.job.add_rollback(lambda: rolled_back.append(2))
+        self.job.run_rollbacks()
+        self.assertEqual(rolled_back, [2, 1])
+
+    def test_raise_if_cancelled_checks_current_job(self):
+        raise_if_cancelled()
+        set_current_job(self.job)
+        try:
+            raise_if_cancelled()
+            register_rollback(lambda: None)
+            self.job.cancel('Stop')
+            with self.assertRaises(JobCancelled):
+                raise_if_cancelled()
+        finally:
+            set_current_job(None)
+        self.assertEqual(len(self.job._rollbacks), 1)
+
+class TestJobRegistry(DustyTestCase):
+    def setUp(self):
+        super(TestJobRegistry, self).setUp()
+        self.registry = JobRegistry()
+
+    def test_create_assigns_increasing_ids(self):
+        self.assertEqual(self.registry.create('a').id, '1')
+        self.assertEqual(self.registry.create('b').id, '2')
+
+    def test_get(self):
+        job = self.registry.create('a')
+        self.assertIs(self.registry.get(job.id), job)
+
+    def test_get_raises_for_unknown_job(self):
+        with self.assertRaises(KeyError):
+            self.registry.get('42')
+
+    def test_prunes_oldest_finished_jobs(self):
+        running = self.registry.create('running')
+        for i in range(constants.DAEMON_MAX_FINISHED_JOBS + 2):
+            self.registry.create('finished').finish(Job.SUCCEEDED, protocol.RESULT)
+        self.registry.create('newest')
+        jobs = self.registry.all()
+        self.assertIn(running, jobs)
+        self.assertEqual(len([job for job in jobs if job.finished]), constants.DAEMON_MAX_FINISHED_JOBS)
+        self.assertNotIn('2', [job.id for job in jobs])
@@ -0,0 +1,46 @@
+import threading
+
+from ..testcases import DustyTestCase
+from dusty import protocol
+from dusty.log import make_client_logger, close_client_logger, log_to_client, log_progress_to_client, handlers
+
+class FakeOutput(object):
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, kind, body=''):
+        self.messages.append((kind, body))
+
+class TestClientLogger(DustyTestCase):
+    def setUp(self):
+        super(TestClientLogger, self).setUp()
+        self.output = FakeOutput()
+
+    def tearDown(self):
+        super(TestClientLogger, self).tearDown()
+        close_client_logger()
+
+    def test_log_to_client_sends_to_output(self):
+        make_client_logger(self.output)
+        log_to_client('hello')
+        self.assertEqual(self.output.messages, [(protocol.LOG, 'hello')])
+
+    def test_log_progress_to_client_sends_progress_message(self):
+        make_client_logger(self.output)
+        log_progress_to_client('Compiling')
+        self.assertEqual(self.output.messages, [(protocol.PROGRESS, 'Compiling')])
+
+    def test_close_client_logger_removes_handler(self):
+        make_client_logger(self.output)
+        close_client_logger()
+        log_to_client('hello')
+        self.assertNotIn(threading.current_thread().ident, handlers)
+        self.assertEqual(self.output.messages, [])
+
+    def test_other_threads_do_not_write_to_output(self):
+        make_client_logger(self.output)
+        other_thread = threading.Thread(target=log_to_client, args=('from another command',))
+        other_thread.start()
+        other_thread.join()
+        log_to_client('mine')
+        self.assertEqual(self.output.messages, [(protocol.LOG, 'mine')])
@@ -1,9 +1,12 @@
+import os
 import tempfile
 import shutil
 
+from nose.plugins.skip import SkipTest
+
 from ..testcases import DustyTestCase
 from dusty.commands.repos import override_repo
-from dusty.path import parent_dir
+from dusty.path import parent_dir, atomic_write
 from dusty.source import Repo
 
 class TestPath(DustyTestCase):
@@ -31,3 +34,28 @@ class TestPath(DustyTestCase):
 
     def test_parent_dir_on_root_dir(self):
         self.assertEqual(parent_dir('/'), '/')
+
+    def test_atomic_write_creates_file(self):
+        path = os.path.join(self.temp_dir, 'file')
+        atomic_write(path, 'contents')
+        with open(path) as f:
+            self.assertEqual(f.read(), 'contents')
+        self.assertEqual(os.listdir(self.temp_dir), ['file'])
+        self.assertEqual(os.stat(path).st_mode & 0777, 0644)
+
+    def test_atomic_write_keeps_permissions(self):
+        path = os.path.join(self.temp_dir, 'file')
+        atomic_write(path, 'old', mode=0600)
+        atomic_write(path, 'new')
+        with open(path) as f:
+            self.assertEqual(f.read(), 'new')
+        self.assertEqual(os.stat(path).st_mode & 0777, 0600)
+
+    def test_atomic_write_keeps_owner(self):
+        if os.getuid() != 0:
+            raise SkipTest('Changing a file\'s owner needs root')
+        path = os.path.join(self.temp_dir, 'file')
+        atomic_write(path, 'old')
+        os.chown(path, 1, 1)
+        atomic_write(path, 'new')
+        self.assertEqual((os.stat(path).st_uid, os.stat(path).st_gid), (1, 1))
@@ -16,7 +16,7 @@ class TestPayload(DustyTestCase):
         self.serialized_payload = {'fn': _fn, 'args': ('arg1',), 'kwargs': (('arg2', 'arg2value'),)}
 
     def test_serialize(self):
-        result = cPickle.loads(self.test_payload.serialize().decode('string_escape'))
+        result = cPickle.loads(self.test_payload.serialize())
         self.assertItemsEqual(result, self.serialized_payload)
 
     def test_deserialize(self):
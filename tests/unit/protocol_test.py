@@ -0,0 +1,56 @@
+import socket
+import threading
+
+from ..testcases import DustyTestCase
+from dusty import protocol
+
+class TestProtocol(DustyTestCase):
+    def setUp(self):
+        super(TestProtocol, self).setUp()
+        self.sender, self.receiver = socket.socketpair()
+        self.receiver.settimeout(1)
+
+    def tearDown(self):
+        super(TestProtocol, self).tearDown()
+        self.sender.close()
+        self.receiver.close()
+
+    def test_round_trip(self):
+        protocol.send_message(self.sender, protocol.LOG, 'hello')
+        self.assertEqual(protocol.recv_message(self.receiver), (protocol.LOG, 'hello'))
+
+    def test_empty_body(self):
+        protocol.send_message(self.sender, protocol.RESULT)
+        self.assertEqual(protocol.recv_message(self.receiver), (protocol.RESULT, ''))
+
+    def test_unicode_body_is_utf8_encoded(self):
+        protocol.send_message(self.sender, protocol.LOG, u'caf\xe9')
+        self.assertEqual(protocol.recv_message(self.receiver), (protocol.LOG, 'caf\xc3\xa9'))
+
+    def test_body_containing_null_bytes(self):
+        protocol.send_message(self.sender, protocol.LOG, 'a\0\0b\0\1')
+        self.assertEqual(protocol.recv_message(self.receiver), (protocol.LOG, 'a\0\0b\0\1'))
+
+    def test_consecutive_messages(self):
+        protocol.send_message(self.sender, protocol.LOG, 'one')
+        protocol.send_message(self.sender, protocol.ERROR, 'two')
+        self.assertEqual(protocol.recv_message(self.receiver), (protocol.LOG, 'one'))
+        self.assertEqual(protocol.recv_message(self.receiver), (protocol.ERROR, 'two'))
+
+    def test_large_body(self):
+        body = 'x' * (1024 * 1024 * 3)
+        sender = threading.Thread(target=protocol.send_message, args=(self.sender, protocol.LOG, body))
+        sender.start()
+        self.assertEqual(protocol.recv_message(self.receiver), (protocol.LOG, body))
+        sender.join()
+
+    def test_closed_connection_raises(self):
+        self.sender.close()
+        with self.assertRaises(protocol.ConnectionClosed):
+            protocol.recv_message(self.receiver)
+
+    def test_closed_mid_frame_raises(self):
+        self.sender.sendall('\0\0\0\x05Lab')
+        self.sender.close()
+        with self.assertRaises(protocol.ConnectionClosed):
+            protocol.recv_message(self.receiver)
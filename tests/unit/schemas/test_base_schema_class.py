@@ -1,6 +1,16 @@
+import os
+import time
+import cPickle
+import collections
 from unittest import TestCase
+
+import yaml
+from mock import patch
 from schemer import Schema, Array, ValidationException
-from dusty.schemas.base_schema_class import DustySchema, DustySpecs
+from dusty import constants
+from dusty.jobs import JobCancelled
+from dusty.schemas.base_schema_class import (DustySchema, DustySpecs, FrozenDict, get_specs_from_path, freeze, thaw,
+                                             _compile_spec)
 
 from ...testcases import DustyTestCase
 
@@ -70,6 +80,41 @@ class TestDustySchemaClass(TestCase):
         dusty_schema = DustySchema(self.base_schema, doc)
         self.assertEquals(set(['dogstoon', 1]), set(dusty_schema.values()))
 
+    def test_nested_values_cannot_be_modified(self):
+        dusty_schema = DustySchema(self.bigger_schema, {'first_name': 'dusty'})
+        with self.assertRaises(TypeError):
+            dusty_schema['address']['street'] = 'catstown'
+
+    def test_evolve_shares_unchanged_values(self):
+        dusty_schema = DustySchema(self.bigger_schema, {'first_name': 'dusty'}, 'dusty', 'people')
+        evolved = dusty_schema.evolve(last_name='smith')
+        self.assertEquals(evolved['last_name'], 'smith')
+        self.assertEquals(dusty_schema['last_name'], 'johnson')
+        self.assertIs(evolved['address'], dusty_schema['address'])
+        self.assertEquals((evolved.name, evolved.spec_type), ('dusty', 'people'))
+
+class TestFreezeAndThaw(TestCase):
+    def test_frozen_lists_behave_like_lists(self):
+        frozen = freeze({'links': ['a', 'b']})
+        self.assertEquals(frozen['links'], ['a', 'b'])
+        self.assertEquals(frozen['links'] + ['c'], ['a', 'b', 'c'])
+        self.assertEquals(['z'] + frozen['links'], ['z', 'a', 'b'])
+
+    def test_frozen_dicts_are_compact_mappings(self):
+        self.assertFalse(hasattr(FrozenDict({}), '__dict__'))
+        self.assertFalse(hasattr(DustySchema(None, {}), '__dict__'))
+        frozen = freeze({'a': 1})
+        self.assertIsInstance(frozen, collections.Mapping)
+        self.assertEquals(frozen, {'a': 1})
+        self.assertEquals(frozen.get('b', 2), 2)
+
+    def test_thaw_returns_mutable_copy(self):
+        document = {'compose': {'environment': {'A': '1'}, 'volumes': ['/a:/a']}}
+        thawed = thaw(freeze(document))
+        thawed['compose']['volumes'].append('/b:/b')
+        self.assertEquals(document['compose']['volumes'], ['/a:/a'])
+        self.assertIsInstance(thawed['compose']['environment'], dict)
+
 class TestDustySpecsClass(DustyTestCase):
     def test_finds_app(self):
         specs = DustySpecs(self.temp_specs_path)
@@ -83,3 +128,152 @@ class TestDustySpecsClass(DustyTestCase):
         specs = DustySpecs(self.temp_specs_path)
         with self.assertRaises(KeyError):
             specs.get_app_or_lib('non-existant-thingy')
+
+class TestLazyDustySpecs(DustyTestCase):
+    def setUp(self):
+        super(TestLazyDustySpecs, self).setUp()
+        with open(os.path.join(self.temp_specs_path, 'apps', 'app-b.yml'), 'w') as f:
+            f.write('image: 1\n')
+
+    def _compiled_paths(self, fake_compile):
+        return [os.path.relpath(call[0][1], self.temp_specs_path) for call in fake_compile.call_args_list]
+
+    @patch('dusty.schemas.base_schema_class._compile_spec', wraps=_compile_spec)
+    def test_nothing_loaded_on_creation(self, fake_compile):
+        DustySpecs(self.temp_specs_path)
+        self.assertEqual(fake_compile.call_count, 0)
+
+    @patch('dusty.schemas.base_schema_class._compile_spec', wraps=_compile_spec)
+    def test_names_are_listed_without_loading(self, fake_compile):
+        specs = DustySpecs(self.temp_specs_path)
+        self.assertIn('app-a', specs['apps'])
+        self.assertEqual(sorted(specs['apps']), ['app-a', 'app-b', 'app-c'])
+        self.assertEqual(fake_compile.call_count, 0)
+
+    @patch('dusty.schemas.base_schema_class._compile_spec', wraps=_compile_spec)
+    def test_loads_one_spec(self, fake_compile):
+        specs = DustySpecs(self.temp_specs_path)
+        self.assertEqual(specs['apps']['app-a']['image'], 'app/a')
+        self.assertEqual(specs['apps'].get('app-a')['image'], 'app/a')
+        self.assertEqual(self._compiled_paths(fake_compile), ['apps/app-a.yml'])
+
+    @patch('dusty.schemas.base_schema_class._compile_spec', wraps=_compile_spec)
+    def test_loads_one_section(self, fake_compile):
+        specs = DustySpecs(self.temp_specs_path)
+        self.assertEqual(sorted(name for name, _ in specs['bundles'].iteritems()), ['bundle-a', 'bundle-b'])
+        self.assertEqual(sorted(self._compiled_paths(fake_compile)), ['bundles/bundle-a.yml', 'bundles/bundle-b.yml'])
+
+    def test_invalid_spec_raises_when_used(self):
+        specs = DustySpecs(self.temp_specs_path)
+        self.assertEqual(specs['apps']['app-a']['image'], 'app/a')
+        with self.assertRaises(ValidationException):
+            specs['apps']['app-b']
+        with self.assertRaises(ValidationException):
+            specs.load()
+
+    def test_loaded_spec_is_cached(self):
+        DustySpecs(self.temp_specs_path)['apps']['app-a']
+        with open(constants.SPECS_CACHE_PATH, 'rb') as f:
+            cached_paths = cPickle.load(f)['specs'].keys()
+        self.assertEqual(cached_paths, [os.path.join(self.temp_specs_path, 'apps', 'app-a.yml')])
+
+class TestSpecsCache(DustyTestCase):
+    def setUp(self):
+        super(TestSpecsCache, self).setUp()
+        self.app_path = os.path.join(self.temp_specs_path, 'apps', 'app-a.yml')
+        # Backdate the spec files so their mtimes are trusted by the cache
+        for spec_type in os.listdir(self.temp_specs_path):
+            for spec_file in os.listdir(os.path.join(self.temp_specs_path, spec_type)):
+                self._backdate(os.path.join(self.temp_specs_path, spec_type, spec_file))
+
+    def _backdate(self, path, seconds=10):
+        old_time = time.time() - seconds
+        os.utime(path, (old_time, old_time))
+
+    @patch('dusty.schemas.base_schema_class.yaml.load', wraps=yaml.load)
+    def test_warm_load_does_not_parse(self, fake_load):
+        get_specs_from_path(self.temp_specs_path)
+        parses = fake_load.call_count
+        specs = get_specs_from_path(self.temp_specs_path)
+        self.assertGreater(parses, 0)
+        self.assertEqual(fake_load.call_count, parses)
+        self.assertEqual(specs['apps']['app-a']['image'], 'app/a')
+
+    def test_changed_file_is_reparsed(self):
+        get_specs_from_path(self.temp_specs_path)
+        with open(self.app_path) as f:
+            contents = f.read()
+        with open(self.app_path, 'w') as f:
+            f.write(contents.replace('app/a', 'app/z'))
+        self._backdate(self.app_path, seconds=5)
+        self.assertEqual(get_specs_from_path(self.temp_specs_path)['apps']['app-a']['image'], 'app/z')
+
+    def test_recent_change_with_same_size_and_mtime_is_reparsed(self):
+        # A whole second ahead, so a slow load can't make it look old enough to trust
+        recent_time = int(time.time()) + 1
+        os.utime(self.app_path, (recent_time, recent_time))
+        get_specs_from_path(self.temp_specs_path)
+        with open(self.app_path) as f:
+            contents = f.read()
+        with open(self.app_path, 'w') as f:
+            f.write(contents.replace('app/a', 'app/z'))
+        os.utime(self.app_path, (recent_time, recent_time))
+        self.assertEqual(get_specs_from_path(self.temp_specs_path)['apps']['app-a']['image'], 'app/z')
+
+    def test_removed_file_is_dropped(self):
+        get_specs_from_path(self.temp_specs_path)
+        os.remove(self.app_path)
+        self.assertNotIn('app-a', get_specs_from_path(self.temp_specs_path)['apps'])
+
+    @patch('dusty.schemas.base_schema_class.yaml.load', wraps=yaml.load)
+    def test_schema_change_discards_cache(self, fake_load):
+        get_specs_from_path(self.temp_specs_path)
+        parses = fake_load.call_count
+        with patch('dusty.schemas.base_schema_class._SCHEMAS_FINGERPRINT', 'changed'):
+            get_specs_from_path(self.temp_specs_path)
+        self.assertEqual(fake_load.call_count, 2 * parses)
+
+    def test_invalid_spec_is_not_cached(self):
+        with open(self.app_path, 'w') as f:
+            f.write('image: 1\n')
+        with self.assertRaises(ValidationException):
+            get_specs_from_path(self.temp_specs_path)
+        with self.assertRaises(ValidationException):
+            get_specs_from_path(self.temp_specs_path)
+
+@patch('dusty.constants.SPECS_PARALLEL_LOAD_THRESHOLD', 1)
+class TestParallelSpecLoad(DustyTestCase):
+    def test_same_specs_as_serial_load(self):
+        parallel = get_specs_from_path(self.temp_specs_path, processes=2)
+        os.remove(constants.SPECS_CACHE_PATH)
+        serial = get_specs_from_path(self.temp_specs_path, processes=1)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel['apps']['app-a'].name, 'app-a')
+
+    @patch('dusty.schemas.base_schema_class._compile_specs_in_pool')
+    def test_serial_below_threshold(self, fake_pool):
+        with patch('dusty.constants.SPECS_PARALLEL_LOAD_THRESHOLD', 100):
+            get_specs_from_path(self.temp_specs_path, processes=2)
+        self.assertFalse(fake_pool.called)
+
+    def test_errors_reported_per_file(self):
+        for name in ['app-a', 'app-b']:
+            with open(os.path.join(self.temp_specs_path, 'apps', '{}.yml'.format(name)), 'w') as f:
+                f.write('image: 1\n')
+        with self.assertRaises(ValidationException):
+            get_specs_from_path(self.temp_specs_path, processes=2)
+        messages = [message for message in self.client_output if message.startswith('Could not load spec')]
+        self.assertEqual(len(messages), 2)
+        self.assertIn('app-a.yml', messages[0])
+        self.assertIn('app-b.yml', messages[1])
+        with open(constants.SPECS_CACHE_PATH, 'rb') as f:
+            cached_paths = cPickle.load(f)['specs'].keys()
+        self.assertIn(os.path.join(self.temp_specs_path, 'apps', 'app-c.yml'), cached_paths)
+
+    @patch('dusty.schemas.base_schema_class.raise_if_cancelled', side_effect=JobCancelled('cancelled'))
+    @patch('dusty.schemas.base_schema_class.multiprocessing.Pool')
+    def test_cancelling_stops_the_pool(self, fake_pool, fake_raise_if_cancelled):
+        fake_pool.return_value.map_async.return_value.ready.return_value = False
+        with self.assertRaises(JobCancelled):
+            get_specs_from_path(self.temp_specs_path, processes=2).load()
+        self.assertTrue(fake_pool.return_value.terminate.called)
@@ -0,0 +1,105 @@
+import copy
+from unittest import TestCase
+
+from schemer import Schema, Array, ValidationException
+
+from dusty.schemas.app_schema import app_schema
+from dusty.schemas.bundle_schema import bundle_schema
+from dusty.schemas.lib_schema import lib_schema
+from dusty.schemas.compiled_schema import compile_schema
+
+def _errors(schema, document):
+    try:
+        schema.validate(document)
+    except ValidationException as e:
+        return e.errors
+    return None
+
+def _defaults_applied(schema, document):
+    document = copy.deepcopy(document)
+    schema.apply_defaults(document)
+    return document
+
+class TestCompiledSchema(TestCase):
+    def assertSameAsSchemer(self, schema, document):
+        compiled = compile_schema(schema)
+        self.assertEqual(_errors(compiled, copy.deepcopy(document)), _errors(schema, copy.deepcopy(document)))
+        if _errors(schema, copy.deepcopy(document)) is None:
+            self.assertEqual(_defaults_applied(compiled, document), _defaults_applied(schema, document))
+
+    def test_valid_app(self):
+        self.assertSameAsSchemer(app_schema, {
+            'repo': '/repo', 'image': 'app/a', 'mount': '/app',
+            'depends': {'libs': ['lib-a'], 'services': ['service-a']},
+            'host_forwarding': [{'host_name': 'local.a', 'host_port': 80, 'container_port': 8000}],
+            'scripts': [{'name': 'example', 'command': 'ls'}],
+            'compose': {'volumes': ['/a:/a'], 'environment': {'A': '1'}},
+            'test': {'suites': [{'name': 'unit', 'command': 'nosetests'}]}})
+
+    def test_minimal_specs(self):
+        self.assertSameAsSchemer(app_schema, {'repo': '/repo', 'build': '.'})
+        self.assertSameAsSchemer(lib_schema, {'repo': '/repo'})
+        self.assertSameAsSchemer(bundle_schema, {'apps': ['app-a']})
+
+    def test_wrong_types(self):
+        self.assertSameAsSchemer(app_schema, {'repo': 1, 'image': ['a'], 'mount': '/app'})
+        self.assertSameAsSchemer(lib_schema, {'repo': '/repo', 'depends': {'libs': 'lib-a'}})
+        self.assertSameAsSchemer(bundle_schema, {'apps': ['app-a', 2, None]})
+
+    def test_nested_errors(self):
+        self.assertSameAsSchemer(app_schema, {
+            'repo': '/repo', 'image': 'app/a',
+            'depends': ['lib-a'], 'commands': {'once': 1},
+            'host_forwarding': [{'host_port': '80'}, 'local.a'],
+            'scripts': {'name': 'example'},
+            'test': {'suites': [{'name': 'unit', 'extra': True}], 'compose': []}})
+
+    def test_missing_required_and_none(self):
+        self.assertSameAsSchemer(app_schema, {'image': 'app/a', 'mount': None, 'build': None})
+        self.assertSameAsSchemer(bundle_schema, {'description': None})
+
+    def test_unexpected_fields(self):
+        self.assertSameAsSchemer(app_schema, {'repo': '/repo', 'image': 'a', 'mount': '', 'extra': 1,
+                                              'depends': {'others': []}})
+
+    def test_schema_validators(self):
+        self.assertSameAsSchemer(app_schema, {'repo': '/repo', 'image': 'a', 'build': '.'})
+        self.assertSameAsSchemer(app_schema, {'repo': '/repo'})
+
+    def test_not_a_document(self):
+        self.assertSameAsSchemer(app_schema, ['repo'])
+
+    def test_field_validators(self):
+        schema = Schema({'name': {'type': basestring, 'validates': lambda value: 'bad' if value == 'x' else None},
+                         'names': {'type': Array(basestring), 'validates': [lambda value: 'empty' if not value else None]}})
+        self.assertSameAsSchemer(schema, {'name': 'x', 'names': []})
+        self.assertSameAsSchemer(schema, {'name': 'y', 'names': ['y']})
+
+    def test_dynamic_types(self):
+        schema = Schema({'value': {'type': lambda value: int if isinstance(value, int) else basestring}})
+        self.assertSameAsSchemer(schema, {'value': 1})
+        self.assertSameAsSchemer(schema, {'value': 1.5})
+
+    def test_defaults_are_not_shared(self):
+        schema = Schema({'names': {'type': Array(basestring), 'default': ['a']}})
+        compiled = compile_schema(schema)
+        first, second = {}, {}
+        compiled.apply_defaults(first)
+        compiled.apply_defaults(second)
+        first['names'].append('b')
+        self.assertEqual(second['names'], ['a'])
+
+    def test_nested_schema_without_defaults(self):
+        schema = Schema({'settings': {'type': Schema({'size': {'type': int}}), 'default': dict}})
+        self.assertSameAsSchemer(schema, {})
+        self.assertSameAsSchemer(schema, {'settings': {'size': 1}})
+
+    def test_fingerprint_changes_with_schema(self):
+        from schemer.validators import one_of
+        fingerprint = compile_schema(Schema({'a': {'type': bool, 'default': False}})).fingerprint
+        self.assertEqual(fingerprint, compile_schema(Schema({'a': {'type': bool, 'default': False}})).fingerprint)
+        self.assertNotEqual(fingerprint, compile_schema(Schema({'a': {'type': bool, 'default': True}})).fingerprint)
+        self.assertNotEqual(fingerprint, compile_schema(Schema({'a': {'type': bool, 'default': False},
+                                                                'b': {'type': dict, 'default': dict}})).fingerprint)
+        self.assertNotEqual(compile_schema(Schema({'a': {'type': basestring, 'validates': one_of('x')}})).fingerprint,
+                            compile_schema(Schema({'a': {'type': basestring, 'validates': one_of('y')}})).fingerprint)
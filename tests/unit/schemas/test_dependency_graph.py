@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+from dusty.schemas.dependency_graph import DependencyGraph
+
+def _app(apps=(), libs=(), services=()):
+    return {'depends': {'apps': list(apps), 'libs': list(libs), 'services': list(services)}}
+
+def _lib(libs=()):
+    return {'depends': {'libs': list(libs)}}
+
+class TestDependencyGraph(TestCase):
+    def setUp(self):
+        self.specs = {
+            'apps': {
+                'app-a': _app(apps=['app-b'], libs=['lib-a'], services=['service-a']),
+                'app-b': _app(apps=['app-c'], libs=['lib-d']),
+                'app-c': _app()
+            },
+            'libs': {
+                'lib-a': _lib(['lib-b', 'lib-c']),
+                'lib-b': _lib(['lib-d']),
+                'lib-c': _lib(['lib-d']),
+                'lib-d': _lib()
+            },
+            'services': {'service-a': {}}
+        }
+
+    def test_transitive_apps(self):
+        graph = DependencyGraph(self.specs)
+        self.assertEqual(set(graph.dependencies('apps', 'app-a', 'apps')), set(['app-b', 'app-c']))
+        self.assertEqual(graph.dependencies('apps', 'app-c', 'apps'), ())
+
+    def test_transitive_libs(self):
+        graph = DependencyGraph(self.specs)
+        self.assertEqual(set(graph.dependencies('apps', 'app-a', 'libs')), set(['lib-a', 'lib-b', 'lib-c', 'lib-d']))
+        self.assertEqual(graph.dependencies('apps', 'app-b', 'libs'), ('lib-d',))
+
+    def test_diamond_libs_are_ordered_and_listed_once(self):
+        libs = DependencyGraph(self.specs).dependencies('libs', 'lib-a', 'libs')
+        self.assertEqual(sorted(libs), ['lib-b', 'lib-c', 'lib-d'])
+        self.assertLess(libs.index('lib-d'), libs.index('lib-b'))
+        self.assertLess(libs.index('lib-d'), libs.index('lib-c'))
+
+    def test_services_are_direct_dependencies(self):
+        graph = DependencyGraph(self.specs)
+        self.assertEqual(graph.dependencies('apps', 'app-a', 'services'), ('service-a',))
+        self.assertEqual(graph.dependencies('apps', 'app-b', 'services'), ())
+
+    def test_dependents(self):
+        graph = DependencyGraph(self.specs)
+        self.assertEqual(graph.dependents('libs', 'lib-d', 'apps'), ('app-a', 'app-b'))
+        self.assertEqual(graph.dependents('libs', 'lib-d', 'libs'), ('lib-a', 'lib-b', 'lib-c'))
+        self.assertEqual(graph.dependents('apps', 'app-c', 'apps'), ('app-a', 'app-b'))
+        self.assertEqual(graph.dependents('apps', 'app-a', 'apps'), ())
+
+    def test_topological_order(self):
+        graph = DependencyGraph(self.specs)
+        order = graph.topological_order('libs')
+        for lib_name in order:
+            for dependency in graph.dependencies('libs', lib_name, 'libs'):
+                self.assertLess(order.index(dependency), order.index(lib_name))
+        self.assertEqual(graph.topological_order('apps'), ['app-c', 'app-b', 'app-a'])
+
+    def test_long_chain(self):
+        libs = dict(('lib{}'.format(i), _lib(['lib{}'.format(i + 1)])) for i in range(2000))
+        libs['lib2000'] = _lib()
+        graph = DependencyGraph({'libs': libs})
+        self.assertEqual(len(graph.dependencies('libs', 'lib0', 'libs')), 2000)
+
+    def test_missing_reference_only_breaks_dependents(self):
+        self.specs['apps']['app-d'] = _app(libs=['lib-missing'])
+        graph = DependencyGraph(self.specs)
+        with self.assertRaises(RuntimeError):
+            graph.dependencies('apps', 'app-d', 'libs')
+        self.assertEqual(graph.dependencies('apps', 'app-b', 'libs'), ('lib-d',))
+
+    def test_unknown_spec(self):
+        with self.assertRaises(RuntimeError):
+            DependencyGraph(self.specs).dependencies('apps', 'app-z', 'libs')
+
+    def test_cycle(self):
+        self.specs['libs']['lib-d'] = _lib(['lib-a'])
+        graph = DependencyGraph(self.specs)
+        self.assertEqual(graph.cycles, [[('libs', 'lib-a'), ('libs', 'lib-b'), ('libs', 'lib-c'), ('libs', 'lib-d')]])
+        with self.assertRaises(RuntimeError):
+            graph.dependencies('apps', 'app-a', 'libs')
+        self.assertEqual(graph.dependencies('apps', 'app-c', 'apps'), ())
@@ -0,0 +1,55 @@
+import signal
+import threading
+import time
+from subprocess import CalledProcessError
+
+from mock import Mock, patch
+
+from ..testcases import DustyTestCase
+from dusty.jobs import Job, JobCancelled, set_current_job
+from dusty.subprocess import check_call, check_and_log_output_and_error, SubprocessTimeout, _kill_after_grace_period
+
+class TestSubprocess(DustyTestCase):
+    def tearDown(self):
+        super(TestSubprocess, self).tearDown()
+        set_current_job(None)
+
+    def test_check_and_log_output_and_error(self):
+        output = check_and_log_output_and_error(['echo', 'hello'], demote=False)
+        self.assertEqual(output, 'hello\n')
+        self.assertEqual(self.last_client_output, 'hello')
+
+    def test_nonzero_exit_raises(self):
+        with self.assertRaises(CalledProcessError):
+            check_call(['false'])
+
+    def test_timeout_kills_process_group(self):
+        start = time.time()
+        with self.assertRaises(SubprocessTimeout):
+            check_and_log_output_and_error(['sh', '-c', 'sleep 30 & sleep 30'], demote=False, timeout=0.2)
+        self.assertLess(time.time() - start, 1)
+
+    def test_cancelling_job_kills_process_group(self):
+        job = Job('1', 'test')
+        set_current_job(job)
+        threading.Timer(0.2, job.cancel).start()
+        start = time.time()
+        with self.assertRaises(JobCancelled):
+            check_and_log_output_and_error(['sh', '-c', 'sleep 30 & sleep 30'], demote=False)
+        self.assertLess(time.time() - start, 1)
+
+    def test_cancelled_job_does_not_start_processes(self):
+        job = Job('1', 'test')
+        job.cancel()
+        set_current_job(job)
+        with self.assertRaises(JobCancelled):
+            check_call(['true'])
+
+    @patch('dusty.constants.SUBPROCESS_KILL_GRACE_PERIOD', 30)
+    @patch('dusty.subprocess._signal_process_group')
+    def test_exited_process_group_is_killed_without_waiting(self, fake_signal):
+        process = Mock(returncode=0)
+        start = time.time()
+        _kill_after_grace_period(process)
+        self.assertLess(time.time() - start, 1)
+        fake_signal.assert_called_once_with(process, signal.SIGKILL)
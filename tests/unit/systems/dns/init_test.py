@@ -0,0 +1,110 @@
+import socket
+import struct
+
+from mock import patch
+
+from dusty import constants
+from dusty.config import save_config_value
+from dusty.systems.dns import (DnsResponder, dns_response, records_from_port_spec, dns_responder_address,
+                               update_dns_from_port_spec, stop_dns_responder,
+                               RCODE_NOERROR, RCODE_FORMERR, RCODE_NXDOMAIN, RCODE_NOTIMP)
+from ....testcases import DustyTestCase
+
+def _query(name, qtype=1, query_id=1234, flags=0x0100):
+    question = ''.join(chr(len(label)) + label for label in name.split('.')) + '\0'
+    return struct.pack('!HHHHHH', query_id, flags, 1, 0, 0, 0) + question + struct.pack('!HH', qtype, 1)
+
+def _parse_response(response):
+    query_id, flags, question_count, answer_count = struct.unpack('!HHHH', response[:8])
+    addresses = []
+    if answer_count:
+        # Answers are all 16 bytes: a name pointer, type, class, TTL, length and address
+        for i in range(answer_count):
+            answer = response[len(response) - 16 * (answer_count - i):][:16]
+            addresses.append(socket.inet_ntoa(answer[12:16]))
+    return {'id': query_id, 'rcode': flags & 0xF, 'response': bool(flags & 0x8000), 'addresses': addresses}
+
+class TestDnsResponse(DustyTestCase):
+    def setUp(self):
+        super(TestDnsResponse, self).setUp()
+        self.records = {'local.gc.com': '127.0.0.1'}
+
+    def test_answers_known_name(self):
+        response = _parse_response(dns_response(_query('local.gc.com'), self.records))
+        self.assertEqual(response, {'id': 1234, 'rcode': RCODE_NOERROR, 'response': True, 'addresses': ['127.0.0.1']})
+
+    def test_names_are_case_insensitive(self):
+        response = _parse_response(dns_response(_query('Local.GC.com'), self.records))
+        self.assertEqual(response['addresses'], ['127.0.0.1'])
+
+    def test_unknown_name(self):
+        response = _parse_response(dns_response(_query('local.other.com'), self.records))
+        self.assertEqual((response['rcode'], response['addresses']), (RCODE_NXDOMAIN, []))
+
+    def test_other_record_types_of_known_name(self):
+        response = _parse_response(dns_response(_query('local.gc.com', qtype=28), self.records))
+        self.assertEqual((response['rcode'], response['addresses']), (RCODE_NOERROR, []))
+
+    def test_malformed_question(self):
+        response = _parse_response(dns_response(_query('local.gc.com')[:-6], self.records))
+        self.assertEqual(response['rcode'], RCODE_FORMERR)
+
+    def test_unsupported_opcode(self):
+        response = _parse_response(dns_response(_query('local.gc.com', flags=0x1000), self.records))
+        self.assertEqual(response['rcode'], RCODE_NOTIMP)
+
+    def test_ignores_short_queries_and_responses(self):
+        self.assertIsNone(dns_response('abc', self.records))
+        self.assertIsNone(dns_response(_query('local.gc.com', flags=0x8000), self.records))
+
+    def test_records_from_port_spec(self):
+        port_spec = {'hosts_file': [{'forwarded_ip': '127.0.0.1', 'host_address': 'Local.GC.com'}]}
+        self.assertEqual(records_from_port_spec(port_spec), {'local.gc.com': '127.0.0.1'})
+
+    def test_dns_responder_address(self):
+        self.assertIsNone(dns_responder_address())
+        save_config_value(constants.CONFIG_DNS_RESPONDER_KEY, '127.0.0.1:5353')
+        self.assertEqual(dns_responder_address(), ('127.0.0.1', 5353))
+        save_config_value(constants.CONFIG_DNS_RESPONDER_KEY, '127.0.0.2')
+        self.assertEqual(dns_responder_address(), ('127.0.0.2', 53))
+        save_config_value(constants.CONFIG_DNS_RESPONDER_KEY, '127.0.0.1:dns')
+        with self.assertRaises(RuntimeError):
+            dns_responder_address()
+
+class TestDnsResponder(DustyTestCase):
+    def setUp(self):
+        super(TestDnsResponder, self).setUp()
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.client.settimeout(5)
+
+    def tearDown(self):
+        super(TestDnsResponder, self).tearDown()
+        self.client.close()
+        stop_dns_responder()
+
+    def _lookup(self, port, name):
+        self.client.sendto(_query(name), ('127.0.0.1', port))
+        return _parse_response(self.client.recv(512))
+
+    def test_responds_on_loopback(self):
+        responder = DnsResponder('127.0.0.1', 0)
+        responder.start()
+        try:
+            self.assertEqual(self._lookup(responder.port, 'local.gc.com')['rcode'], RCODE_NXDOMAIN)
+            responder.set_records({'local.gc.com': '127.0.0.1'})
+            self.assertEqual(self._lookup(responder.port, 'local.gc.com')['addresses'], ['127.0.0.1'])
+        finally:
+            responder.stop()
+
+    @patch('dusty.systems.dns.dns_responder_address')
+    def test_update_dns_from_port_spec(self, fake_address):
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        fake_address.return_value = ('127.0.0.1', port)
+        update_dns_from_port_spec({'hosts_file': [{'forwarded_ip': '127.0.0.1', 'host_address': 'local.gc.com'}]})
+        self.assertEqual(self._lookup(port, 'local.gc.com')['addresses'], ['127.0.0.1'])
+        update_dns_from_port_spec({'hosts_file': [{'forwarded_ip': '127.0.0.1', 'host_address': 'local.gcapi.com'}]})
+        self.assertEqual(self._lookup(port, 'local.gc.com')['rcode'], RCODE_NXDOMAIN)
+        self.assertEqual(self._lookup(port, 'local.gcapi.com')['addresses'], ['127.0.0.1'])
@@ -3,13 +3,15 @@ import tempfile
 import shutil
 
 from mock import Mock, patch
+import docker
 import yaml
 
 from dusty import constants
 from dusty.systems.docker import (get_docker_env, _get_dusty_containers, get_dusty_images, _get_container_for_app_or_service,
-                                  _get_canonical_container_name, _exec_in_container)
+                                  _get_canonical_container_name, _exec_in_container, get_app_image_ids)
 
-from dusty.systems.docker.compose import write_composefile
+from dusty.systems.docker.compose import (write_composefile, composefile_matches, read_composefile,
+                                          update_running_containers_from_plan, services_with_outdated_images)
 from dusty.systems.docker.cleanup import _get_exited_dusty_containers
 from dusty.compiler.spec_assembler import get_specs
 from ....testcases import DustyTestCase
@@ -42,6 +44,36 @@ class TestComposeSystem(DustyTestCase):
         written = open(self.temp_compose_path, 'r').read()
         self.assertItemsEqual(yaml.load(written), self.test_spec)
 
+    def test_composefile_matches(self):
+        self.assertFalse(composefile_matches(self.test_spec, constants.COMPOSEFILE_PATH))
+        write_composefile(self.test_spec, constants.COMPOSEFILE_PATH)
+        self.assertTrue(composefile_matches(self.test_spec, constants.COMPOSEFILE_PATH))
+        self.assertFalse(composefile_matches({'app-a': {'image': 'app/b'}}, constants.COMPOSEFILE_PATH))
+
+    def test_read_composefile(self):
+        self.assertIsNone(read_composefile(constants.COMPOSEFILE_PATH))
+        write_composefile(self.test_spec, constants.COMPOSEFILE_PATH)
+        self.assertEqual(read_composefile(constants.COMPOSEFILE_PATH), self.test_spec)
+
+    @patch('dusty.systems.docker.compose.compose_up')
+    @patch('dusty.systems.docker.compose._compose_rm')
+    @patch('dusty.systems.docker.compose._compose_stop')
+    def test_update_running_containers_from_plan(self, fake_stop, fake_rm, fake_up):
+        plan = {'create': [], 'recreate': ['app-a'], 'remove': ['app-b'], 'keep': ['app-c'], 'changes': {}}
+        update_running_containers_from_plan(self.test_spec, plan)
+        fake_stop.assert_called_once_with(constants.COMPOSEFILE_PATH, 'dusty', ['app-b', 'app-a'])
+        fake_rm.assert_called_once_with(constants.COMPOSEFILE_PATH, 'dusty', ['app-b', 'app-a'])
+        fake_up.assert_called_once_with(constants.COMPOSEFILE_PATH, 'dusty', recreate_containers=False)
+        self.assertEqual(read_composefile(constants.COMPOSEFILE_PATH), self.test_spec)
+
+    @patch('dusty.systems.docker.compose.compose_up')
+    @patch('dusty.systems.docker.compose._compose_stop')
+    def test_update_running_containers_from_plan_nothing_to_recreate(self, fake_stop, fake_up):
+        plan = {'create': [], 'recreate': [], 'remove': [], 'keep': ['app-a'], 'changes': {}}
+        update_running_containers_from_plan(self.test_spec, plan, write=False)
+        self.assertFalse(fake_stop.called)
+        self.assertIsNone(read_composefile(constants.COMPOSEFILE_PATH))
+
     @patch('dusty.subprocess.get_config_value')
     @patch('dusty.systems.docker.check_output_demoted')
     def testget_docker_env(self, fake_check_output, fake_config_value):
@@ -55,6 +87,18 @@ class TestComposeSystem(DustyTestCase):
         result = get_docker_env()
         self.assertItemsEqual(result, expected)
 
+    @patch('dusty.systems.docker.vm_boot_fingerprint')
+    @patch('dusty.systems.docker.check_output_demoted')
+    def test_get_docker_env_cached_until_vm_restarts(self, fake_check_output, fake_boot_fingerprint):
+        fake_boot_fingerprint.return_value = 1
+        fake_check_output.return_value = "export DOCKER_HOST=tcp://192.168.59.103:2376"
+        get_docker_env()
+        get_docker_env()
+        self.assertEqual(fake_check_output.call_count, 1)
+        fake_boot_fingerprint.return_value = 2
+        get_docker_env()
+        self.assertEqual(fake_check_output.call_count, 2)
+
     def test_get_dusty_containers_falsy(self):
         self.assertEqual(_get_dusty_containers(self.fake_docker_client, []),
                          self.containers_return[:-1])
@@ -101,3 +145,30 @@ class TestComposeSystem(DustyTestCase):
         fake_container = {'Id': 'container-id'}
         _exec_in_container(self.fake_docker_client, fake_container, 'ls')
         self.fake_docker_client.exec_create.assert_called_once_with('container-id', 'ls')
+
+    @patch('dusty.systems.docker.get_docker_client')
+    def test_get_app_image_ids(self, fake_get_client):
+        fake_get_client.return_value = self.fake_docker_client
+        self.fake_docker_client.images.return_value = [{'RepoTags': ['app/a:latest']}]
+        self.fake_docker_client.inspect_image.side_effect = lambda image: {'Id': 'id-' + image}
+        assembled_specs = {'apps': {'app-a': {'image': 'app/a'}, 'app-b': {'image': 'app/b:1.0'},
+                                    'app-c': {'build': '/c'}}}
+        self.assertEqual(get_app_image_ids(assembled_specs), {'app-a': 'id-app/a', 'app-b': 'id-app/b:1.0'})
+        self.fake_docker_client.pull.assert_called_once_with('app/b', '1.0', insecure_registry=True)
+
+    @patch('dusty.systems.docker.compose.get_docker_client')
+    def test_services_with_outdated_images(self, fake_get_client):
+        fake_get_client.return_value = self.fake_docker_client
+        self.fake_docker_client.containers.return_value = [{'Names': ['/dusty_app-a_1'], 'Id': 'a'},
+                                                           {'Names': ['/dusty_app-b_1'], 'Id': 'b'},
+                                                           {'Names': ['/dusty_app-c_1'], 'Id': 'c'}]
+        self.fake_docker_client.inspect_container.side_effect = lambda container_id: {'Image': 'image-' + container_id}
+        images = {'app/a': 'image-a', 'app/b': 'image-b2'}
+        def _inspect_image(image):
+            if image not in images:
+                raise docker.errors.APIError('No such image', Mock())
+            return {'Id': images[image]}
+        self.fake_docker_client.inspect_image.side_effect = _inspect_image
+        compose_config = {'app-a': {'image': 'app/a'}, 'app-b': {'image': 'app/b'},
+                          'app-c': {'image': 'app/c'}, 'app-d': {'image': 'app/a'}, 'app-e': {'build': '/e'}}
+        self.assertEqual(services_with_outdated_images(compose_config), ['app-b', 'app-c'])
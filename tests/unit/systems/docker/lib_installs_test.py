@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+
+from mock import Mock, patch
+
+from dusty.systems.docker.lib_installs import (repo_content_fingerprint, ensure_lib_installs_image,
+                                               ensure_lib_installs_images, _layer_keys)
+from ....testcases import DustyTestCase
+from ...utils import get_app_dusty_schema, get_lib_dusty_schema
+
+@patch('dusty.systems.docker.lib_installs.repo_content_fingerprint')
+class TestLibInstallsImage(DustyTestCase):
+    def setUp(self):
+        super(TestLibInstallsImage, self).setUp()
+        self.specs = {'apps': {'app-a': get_app_dusty_schema({'repo': '/app-a', 'mount': '/app-a', 'image': 'app/a',
+                                                              'depends': {'libs': ['lib-a']}}),
+                               'app-b': get_app_dusty_schema({'repo': '/app-b', 'mount': '/app-b', 'build': '/app-b',
+                                                              'depends': {'libs': ['lib-a']}})},
+                      'libs': {'lib-a': get_lib_dusty_schema({'repo': '/lib-a', 'mount': '/lib-a', 'install': 'make',
+                                                              'depends': {'libs': ['lib-b']}}),
+                               'lib-b': get_lib_dusty_schema({'repo': '/lib-b', 'mount': '/lib-b', 'install': 'pip install .'})},
+                      'services': {}}
+        self.fingerprints = {'/lib-a': 'a1', '/lib-b': 'b1'}
+        self.client = Mock()
+        self.client.inspect_image.return_value = {'Id': 'base-id'}
+        self.client.create_container.return_value = {'Id': 'container-id'}
+        self.client.wait.return_value = 0
+        self.client.images.return_value = []
+
+    def _keys(self):
+        return [key for _, key in _layer_keys('base-id', 'app-a', self.specs)]
+
+    def _ensure(self, fake_fingerprint):
+        fake_fingerprint.side_effect = lambda path: self.fingerprints['/' + os.path.basename(path)]
+        return ensure_lib_installs_image(self.client, 'app-a', self.specs)
+
+    def test_builds_a_layer_per_lib_in_install_order(self, fake_fingerprint):
+        image = self._ensure(fake_fingerprint)
+        keys = self._keys()
+        self.assertEqual([call[1]['image'] for call in self.client.create_container.call_args_list],
+                         ['app/a', 'dusty/lib_installs_app-a:{}'.format(keys[0])])
+        self.assertIn('cd /lib-b && pip install .', self.client.create_container.call_args_list[0][1]['command'])
+        self.assertEqual([call[1]['tag'] for call in self.client.commit.call_args_list], keys)
+        self.assertEqual(image, 'dusty/lib_installs_app-a:{}'.format(keys[1]))
+
+    def test_rebuilds_only_layers_from_changed_lib(self, fake_fingerprint):
+        fake_fingerprint.side_effect = lambda path: self.fingerprints['/' + os.path.basename(path)]
+        old_keys = self._keys()
+        self.fingerprints['/lib-a'] = 'a2'
+        new_keys = self._keys()
+        self.assertEqual(old_keys[0], new_keys[0])
+        self.assertNotEqual(old_keys[1], new_keys[1])
+        self.client.images.return_value = [{'RepoTags': ['dusty/lib_installs_app-a:{}'.format(key) for key in old_keys]}]
+        self.assertEqual(self._ensure(fake_fingerprint), 'dusty/lib_installs_app-a:{}'.format(new_keys[1]))
+        self.assertEqual(self.client.create_container.call_count, 1)
+        self.assertEqual(self.client.create_container.call_args[1]['image'], 'dusty/lib_installs_app-a:{}'.format(old_keys[0]))
+        self.client.remove_image.assert_called_once_with(image='dusty/lib_installs_app-a:{}'.format(old_keys[1]))
+
+    def test_base_image_changes_every_key(self, fake_fingerprint):
+        fake_fingerprint.side_effect = lambda path: self.fingerprints['/' + os.path.basename(path)]
+        self.assertNotEqual(self._keys()[0], _layer_keys('other-base-id', 'app-a', self.specs)[0][1])
+
+    def test_failed_install_raises(self, fake_fingerprint):
+        self.client.wait.return_value = 1
+        with self.assertRaises(RuntimeError):
+            self._ensure(fake_fingerprint)
+        self.assertTrue(self.client.remove_container.called)
+        self.assertFalse(self.client.commit.called)
+
+    @patch('dusty.systems.docker.lib_installs.get_docker_client')
+    @patch('dusty.systems.docker.lib_installs.ensure_lib_installs_image')
+    def test_skips_apps_built_from_dockerfiles(self, fake_ensure, fake_get_client, fake_fingerprint):
+        self.assertEqual(ensure_lib_installs_images(self.specs), {'app-a': fake_ensure.return_value})
+        fake_ensure.assert_called_once_with(fake_get_client.return_value, 'app-a', self.specs)
+
+class TestRepoContentFingerprint(DustyTestCase):
+    def setUp(self):
+        super(TestRepoContentFingerprint, self).setUp()
+        self.repo_path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.repo_path, '.git'))
+        self._write('setup.py', 'setup()')
+
+    def tearDown(self):
+        super(TestRepoContentFingerprint, self).tearDown()
+        shutil.rmtree(self.repo_path)
+
+    def _write(self, path, contents):
+        with open(os.path.join(self.repo_path, path), 'w') as f:
+            f.write(contents)
+
+    def test_changes_with_files(self):
+        fingerprint = repo_content_fingerprint(self.repo_path)
+        self._write('setup.py', 'setup(name="lib")')
+        self.assertNotEqual(fingerprint, repo_content_fingerprint(self.repo_path))
+
+    def test_ignores_git_dir(self):
+        fingerprint = repo_content_fingerprint(self.repo_path)
+        self._write('.git/HEAD', 'ref: refs/heads/master')
+        self.assertEqual(fingerprint, repo_content_fingerprint(self.repo_path))
+
+    def test_ignores_dependency_dirs_and_compiled_files(self):
+        fingerprint = repo_content_fingerprint(self.repo_path)
+        os.makedirs(os.path.join(self.repo_path, 'web', 'node_modules', 'left-pad'))
+        self._write('web/node_modules/left-pad/index.js', 'module.exports = {}')
+        self._write('setup.pyc', 'compiled')
+        self.assertEqual(fingerprint, repo_content_fingerprint(self.repo_path))
@@ -15,8 +15,7 @@ nottest(ensure_test_image) # silly Nose, this isn't a test function
 class TestTestingImages(DustyTestCase):
     def setUp(self):
         super(TestTestingImages, self).setUp()
-        app = premade_app()
-        app['test'] = {'once': 'npm install'}
+        app = premade_app().evolve(test={'once': 'npm install'})
         self.specs = {'apps': {'fake-app': app}}
 
     def test_ensure_testing_spec_base_image_image(self):
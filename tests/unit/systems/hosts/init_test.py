@@ -1,10 +1,14 @@
 import os
+import shutil
 import tempfile
 import textwrap
 
+from mock import patch
+
 import dusty.constants
 from dusty.systems.hosts import (_remove_current_dusty_config, _dusty_hosts_config,
-                                update_hosts_file_from_port_spec, _read_hosts)
+                                update_hosts_file_from_port_spec, _read_hosts,
+                                hosts_file_matches_port_spec, remove_dusty_hosts_config)
 from ....testcases import DustyTestCase
 
 class TestHostsSystem(DustyTestCase):
@@ -43,3 +47,34 @@ class TestHostsSystem(DustyTestCase):
     def test_update_hosts_file_from_port_spec(self):
         update_hosts_file_from_port_spec({'hosts_file': self.test_spec})
         self.assertEqual(_read_hosts(dusty.constants.HOSTS_PATH), self.spec_output)
+
+    def test_hosts_file_matches_port_spec(self):
+        self.assertFalse(hosts_file_matches_port_spec({'hosts_file': self.test_spec}))
+        update_hosts_file_from_port_spec({'hosts_file': self.test_spec})
+        self.assertTrue(hosts_file_matches_port_spec({'hosts_file': self.test_spec}))
+        self.assertFalse(hosts_file_matches_port_spec({'hosts_file': self.test_spec[:1]}))
+
+    @patch('dusty.systems.hosts._write_hosts')
+    def test_update_hosts_file_skips_unchanged_hosts(self, fake_write_hosts):
+        with open(self.temp_hosts_path, 'w') as f:
+            f.write(self.non_spec_starter + self.spec_output)
+        update_hosts_file_from_port_spec({'hosts_file': self.test_spec})
+        self.assertFalse(fake_write_hosts.called)
+
+    def test_update_hosts_file_through_symlink(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            link_path = os.path.join(temp_dir, 'hosts')
+            os.symlink(self.temp_hosts_path, link_path)
+            dusty.constants.HOSTS_PATH = link_path
+            update_hosts_file_from_port_spec({'hosts_file': self.test_spec})
+            self.assertTrue(os.path.islink(link_path))
+            self.assertEqual(_read_hosts(self.temp_hosts_path), self.spec_output)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_remove_dusty_hosts_config(self):
+        with open(self.temp_hosts_path, 'w') as f:
+            f.write(self.non_spec_starter + self.spec_output)
+        remove_dusty_hosts_config()
+        self.assertEqual(_read_hosts(self.temp_hosts_path), self.non_spec_starter)
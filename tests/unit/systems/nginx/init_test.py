@@ -1,11 +1,14 @@
 import os
+import shutil
 import tempfile
 
 from mock import patch, call
 from nose.tools import nottest
 
 from dusty import constants
-from dusty.systems.nginx import _ensure_nginx_running_with_latest_config
+from dusty.config import save_config_value
+from dusty.systems.nginx import (_ensure_nginx_running_with_latest_config, _write_nginx_config, _read_nginx_config,
+                                 nginx_config_matches, update_nginx_from_config, ensure_nginx_running)
 from ....testcases import DustyTestCase
 
 class TestNginxSystem(DustyTestCase):
@@ -19,3 +22,84 @@ class TestNginxSystem(DustyTestCase):
         _ensure_nginx_running_with_latest_config()
         fake_check_call.side_effect = Exception("Boom!")
         fake_check_call.has_calls(call(['nginx', '-s', 'reload']), call(['nginx', 'start']))
+
+    def test_nginx_config_matches(self):
+        nginx_dir = tempfile.mkdtemp()
+        try:
+            save_config_value(constants.CONFIG_NGINX_DIR_KEY, nginx_dir)
+            self.assertFalse(nginx_config_matches('http {}'))
+            _write_nginx_config('http {}')
+            self.assertTrue(nginx_config_matches('http {}'))
+            self.assertFalse(nginx_config_matches('http { server {} }'))
+        finally:
+            shutil.rmtree(nginx_dir)
+
+    @patch('dusty.systems.nginx._start_nginx')
+    @patch('dusty.systems.nginx._nginx_is_running')
+    def test_ensure_nginx_running_leaves_running_nginx_alone(self, fake_is_running, fake_start):
+        fake_is_running.return_value = True
+        ensure_nginx_running()
+        self.assertFalse(fake_start.called)
+        fake_is_running.return_value = False
+        ensure_nginx_running()
+        fake_start.assert_called_once_with()
+
+@patch('dusty.systems.nginx.ensure_nginx_running')
+@patch('dusty.systems.nginx._ensure_nginx_running_with_latest_config')
+@patch('dusty.systems.nginx._test_nginx_config')
+class TestNginxConfigUpdates(DustyTestCase):
+    def setUp(self):
+        super(TestNginxConfigUpdates, self).setUp()
+        self.nginx_dir = tempfile.mkdtemp()
+        save_config_value(constants.CONFIG_NGINX_DIR_KEY, self.nginx_dir)
+
+    def tearDown(self):
+        super(TestNginxConfigUpdates, self).tearDown()
+        shutil.rmtree(self.nginx_dir)
+
+    def test_new_config_is_written_and_reloaded(self, fake_test, fake_reload, fake_ensure_running):
+        fake_test.return_value = None
+        update_nginx_from_config('http {}')
+        self.assertEqual(_read_nginx_config(), 'http {}')
+        fake_test.assert_called_once_with()
+        fake_reload.assert_called_once_with()
+
+    def test_unchanged_config_is_not_reloaded(self, fake_test, fake_reload, fake_ensure_running):
+        _write_nginx_config('http {}')
+        update_nginx_from_config('http {}')
+        self.assertFalse(fake_test.called)
+        self.assertFalse(fake_reload.called)
+        fake_ensure_running.assert_called_once_with()
+
+    def test_rejected_config_is_rolled_back(self, fake_test, fake_reload, fake_ensure_running):
+        _write_nginx_config('http {}')
+        fake_test.return_value = 'nginx: [emerg] unexpected end of file'
+        with self.assertRaises(RuntimeError):
+            update_nginx_from_config('http {')
+        self.assertEqual(_read_nginx_config(), 'http {}')
+        self.assertFalse(fake_reload.called)
+
+    def test_rejected_first_config_is_removed(self, fake_test, fake_reload, fake_ensure_running):
+        fake_test.return_value = 'nginx: [emerg] unexpected end of file'
+        with self.assertRaises(RuntimeError):
+            update_nginx_from_config('http {')
+        self.assertIsNone(_read_nginx_config())
+        self.assertFalse(fake_reload.called)
+
+    @patch('dusty.systems.nginx.register_rollback')
+    def test_rollback_of_first_config_removes_it(self, fake_register_rollback, fake_test, fake_reload, fake_ensure_running):
+        fake_test.return_value = None
+        update_nginx_from_config('http {}')
+        rollback = fake_register_rollback.call_args[0][0]
+        fake_reload.reset_mock()
+        rollback()
+        self.assertIsNone(_read_nginx_config())
+        fake_reload.assert_called_once_with()
+
+    @patch('dusty.systems.nginx.register_rollback')
+    def test_rollback_restores_previous_config(self, fake_register_rollback, fake_test, fake_reload, fake_ensure_running):
+        _write_nginx_config('http {}')
+        fake_test.return_value = None
+        update_nginx_from_config('http { server {} }')
+        fake_register_rollback.call_args[0][0]()
+        self.assertEqual(_read_nginx_config(), 'http {}')
@@ -41,6 +41,7 @@ class TestRysnc(DustyTestCase):
         fake_get_specs.return_value = self.make_test_specs(specs)
         sync_repos_by_specs([specs['apps'][name] for name in ['app-a', 'app-b']])
         fake_sync_repos.assert_has_calls([call(set([Repo('github.com/app/a'), Repo('github.com/app/b'), Repo('github.com/lib/a'), Repo('github.com/lib/b')]))])
+        self.assertEqual(fake_get_specs.call_count, 1)
 
 
     @patch('dusty.systems.rsync.sync_repos')
@@ -98,7 +99,7 @@ class TestRysnc(DustyTestCase):
         apply_required_keys(specs)
         fake_get_specs.return_value = self.make_test_specs(specs)
         sync_repos_by_specs([specs['libs'][name] for name in ['lib-a']])
-        fake_sync_repos.assert_has_calls([call(set([Repo('github.com/lib/a'), Repo('github.com/lib/b')]))])
+        fake_sync_repos.assert_has_calls([call(set([Repo('github.com/lib/a'), Repo('github.com/lib/b'), Repo('github.com/lib/c')]))])
 
 
     @patch('dusty.systems.rsync.sync_repos')